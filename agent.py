@@ -1,20 +1,71 @@
 """
 Custom Heuristic description:
-If opponent has no more moves prioritize pieces you can gain.
-Else: Use a mobility heuristic + focus on corners. Deduct C,X moves if
-    board is large enough. Assign positive value to other edge spots.
+Pattern tables (othello_patterns): the edges, the 3x3 corner blocks and the
+    diagonals are looked up in weight tables, loaded from a file or built
+    from static square values (corners good, squares next to corners bad,
+    other edge squares fairly good). Values are in discs.
 """
 
 """
 An AI player for Othello.
 """
+import atexit
+import math
+import multiprocessing
 import random
 import sys
+import threading
 import time
+from concurrent.futures import ProcessPoolExecutor
 
 # You can use the functions in othello_shared to write your AI
-from othello_shared import find_lines, get_possible_moves, get_score, play_move
-cached_moves = dict()
+from othello_bitboard import find_lines, get_possible_moves, get_score, play_move, to_bitboard, popcount, SearchBoard
+from othello_protocol import intro, BoardReader
+from opening_book import OpeningBook, book_signature
+import othello_endgame
+from othello_endgame import solve
+from othello_patterns import get_evaluator, PatternState, RESOLUTION
+from othello_telemetry import SearchStats, emit
+from othello_symmetry import canonical_zobrist, to_canonical, from_canonical
+from othello_cache import load_cache, save_cache, signature, DEFAULT_ENTRIES
+from transposition import TranspositionTable, SharedTranspositionTable, node_key, bound_flag, EXACT, LOWER, UPPER, NO_MOVE, ENTRY_BYTES
+transposition_table = TranspositionTable()
+search_deadline = None  # time.perf_counter() value at which a search gives up
+heuristic = 0           # 1: depth-limited leaves are scored by compute_heuristic
+weights_file = None     # pattern weights for compute_heuristic (None: default weights)
+stats = None            # SearchStats of the current move when telemetry is ON
+symmetry = 0            # cache positions with up to this many discs under their canonical symmetry
+
+NULL_WINDOW = 1         # utilities are whole numbers of discs (see null_window)
+ASPIRATION_WINDOW = 4   # half-width of the root window around the last score
+
+
+class SearchTimeout(Exception):
+    pass
+
+
+def null_window():
+    """
+    Return the width of a null window: the smallest difference between two
+    leaf values. Disc differences are whole numbers, heuristic values are
+    multiples of othello_patterns.RESOLUTION.
+    """
+    return RESOLUTION if heuristic else NULL_WINDOW
+
+
+# Move ordering state (-o), see order_moves
+killer_moves = dict()   # empty-square count (i.e. ply) -> last two moves that caused a cutoff there
+history_scores = dict() # (player, dimension) -> cutoff score per square
+square_priority_tables = dict()
+
+# Parallel root search (workers > 1), see parallel_root_search
+worker_pool = None
+worker_settings = None  # (workers, caching) the pool was started with
+shared_alpha = None     # multiprocessing.Value holding the best root score found so far
+search_generation = None    # shared counter of parallel root searches; tasks of older ones are dropped
+
+ponder_thread = None
+ponder_result = None    # (predicted board, (depth, move, value) of the deepest finished ponder search or None)
 
 
 def eprint(*args, **kwargs): #you can use this for debugging, as it will print to sterr and not stdout
@@ -23,101 +74,178 @@ def eprint(*args, **kwargs): #you can use this for debugging, as it will print t
 
 # Method to compute utility value of terminal state
 def compute_utility(board, color):
-    dark_score, light_score = get_score(board)
+    state = getattr(board, "state", None)
+    if state is not None:   # counts kept up to date by the search (see new_search_board)
+        dark_score, light_score = state.dark_count, state.light_count
+    else:
+        dark_score, light_score = get_score(board)
     return [dark_score - light_score, light_score - dark_score][color == 2]
 
 
-# Better heuristic value of board
+# Better heuristic value of board: pattern tables (see othello_patterns)
 def compute_heuristic(board, color):
-    opposite_color = [1, 2][color == 1]
-    opposite = get_possible_moves(board, opposite_color)
-
-    # Opponent no longer has moves; prioritize coin gain
-    if not opposite:
-        dark_score, light_score = get_score(board)
-        if color == 1 and dark_score >= light_score:
-            return 25000
-        elif color == 2 and light_score >= dark_score:
-            return 25000
-    player = get_possible_moves(board, color)
-
-    # mobility calculation
-    moves = len(player) + len(opposite)
-    if moves != 0:
-        score = 100 * (len(player) - len(opposite)) / moves
-    else:
-        score = 0
-
-    # corners
-    b_length = len(board)
-    for corner in [board[0][0], board[0][b_length-1], board[b_length-1][0],
-                   board[b_length-1][b_length-1]]:
-        if corner == color:
-            score += 100
-
-    # deduct C and X moves if sufficient board size.
-    # edge pieces are somewhat attractive
-    if b_length >= 4:
-        x_moves = [(0, 1), (0, b_length - 2), (1, 0),
-                   (1, b_length - 1), (b_length - 2, 0),
-                   (b_length - 2, b_length - 1), (b_length - 1, 1),
-                   (b_length - 1, b_length - 2)]
-        c_moves = [(1, 1), (1, b_length - 2), (b_length - 2, 1),
-                   (b_length - 2, b_length - 2)]
-        for x in range(b_length):
-            for y in range(b_length):
-                if (x, y) in x_moves or (x, y) in c_moves:
-                    if board[x][y] == color:
-                        score -= 10
-                elif x == 0 or x == b_length - 1 or y == 0 or y == b_length - 1: # edge pieces
-                    if board[x][y] == color:
-                        score += 25
+    state = getattr(board, "state", None)
+    if state is not None:
+        value = state.value
     else:
-        for x in range(b_length):
-            for y in range(b_length):
-                if x == 0 or x == b_length - 1 or y == 0 or y == b_length - 1:
-                    if board[x][y] == color:
-                        score += 30
-    return score
+        board = to_bitboard(board)
+        value = get_evaluator(board.dimension, weights_file).evaluate(board.dark, board.light)
+    return [value, -value][color == 2]
+
+
+# Value of a leaf of the search: the disc difference if the game is over
+# (game_over) or the heuristic is OFF, otherwise the heuristic. With the
+# heuristic ON, a finished game also gets win_offset added for a win and
+# taken off for a loss, so the search never trades a won game for a
+# position the heuristic merely likes.
+def evaluate_leaf(board, color, game_over):
+    if not heuristic:
+        return compute_utility(board, color)
+    if not game_over:
+        return compute_heuristic(board, color)
+    value = compute_utility(board, color)
+    if value > 0:
+        return value + win_offset(board.dimension)
+    if value < 0:
+        return value - win_offset(board.dimension)
+    return value
+
+
+def win_offset(n):
+    """
+    Return a whole number of discs larger than any heuristic value on an n x
+    n board, so won games score above and lost games below every heuristic
+    leaf.
+    """
+    return n * n + math.ceil(get_evaluator(n, weights_file).bound)
+
+
+def disc_value(value, n):
+    """
+    Return a search value as evaluate_leaf's callers understand it: the disc
+    difference for a won or lost game (value beyond win_offset), the value
+    itself otherwise.
+    """
+    if heuristic:
+        offset = win_offset(n)
+        if value > offset:
+            return value - offset
+        if value < -offset:
+            return value + offset
+    return value
+
+
+############ CACHING ###############################
+def probe_cache(board, to_move, color, alpha, beta, limit):
+    """
+    Look up the node in the transposition table. Returns (key, result, hash_move):
+    result is a (move, value) pair if the stored entry is deep enough and its
+    bound settles the node for the (alpha, beta) window, otherwise None.
+    hash_move is the best move stored for the position, if any. key is only
+    for store_cache; with symmetry ON it is a (key, transform) pair.
+    """
+    zobrist, transform = board.zobrist, 0
+    if symmetry and popcount(board.dark | board.light) <= symmetry:
+        zobrist, transform = canonical_zobrist(board)
+    key = node_key(zobrist, to_move, color)
+    entry = transposition_table.probe(key)
+    result, move = None, None
+    if entry is not None:
+        value, depth, flag, index = entry
+        if index != NO_MOVE:
+            if transform:
+                index = from_canonical(board.dimension, transform, index)
+            move = divmod(index, board.dimension)
+        if depth >= limit and (flag == EXACT or (flag == LOWER and value >= beta)
+                               or (flag == UPPER and value <= alpha)):
+            result = move, value
+    if stats is not None:
+        stats.probe(entry, result is not None)
+    if symmetry:
+        return (key, transform), result, move
+    return key, result, move
+
+
+def store_cache(board, key, limit, alpha, beta, move, value):
+    if stats is not None:
+        stats.stores += 1
+    index = move[0] * board.dimension + move[1]
+    if symmetry:
+        key, transform = key
+        if transform:
+            index = to_canonical(board.dimension, transform, index)
+    transposition_table.store(key, limit, bound_flag(value, alpha, beta), value, index)
 
 
 ############ MINIMAX ###############################
+# The search functions below work on a SearchBoard: each child is visited by
+# applying the move in place with make_move and taking it back with undo_move.
+def new_search_board(board):
+    """
+    Return a SearchBoard for board. With the heuristic ON, it carries a
+    PatternState, so disc counts and the heuristic value are updated move
+    by move instead of being recomputed at every leaf.
+    """
+    board = SearchBoard.from_board(board)
+    if heuristic:
+        board.state = PatternState(get_evaluator(board.dimension, weights_file), board.dark, board.light)
+    return board
+
+
 def minimax_min_node(board, color, limit, caching = 0):
-    if caching and (board, color) in cached_moves:
-        return cached_moves[(board, color)]
-    best_move = None
     opposite_color = [1, 2][color == 1]
-    moves = get_possible_moves(board, opposite_color)
+    if stats is not None:
+        stats.nodes += 1
+    if caching:
+        key, cached, _ = probe_cache(board, opposite_color, color, float("-inf"), float("inf"), limit)
+        if cached is not None:
+            return cached
+    best_move = None
+    moves = board.get_possible_moves(opposite_color)
     if not moves or limit == 0:
-        result = best_move, compute_utility(board, color)
+        if stats is not None:
+            stats.leaves += 1
+        result = best_move, evaluate_leaf(board, color, not moves)
         return result
+    if stats is not None:
+        stats.expand(board.count_empty(), len(moves))
     best_move, best_value = moves[0], float("inf")
     for move in moves:
-        new_board = play_move(board, opposite_color, move[0], move[1])
-        new_value = minimax_max_node(new_board, color, limit - 1, caching)[1]
+        flips = board.make_move(opposite_color, move[0], move[1])
+        new_value = minimax_max_node(board, color, limit - 1, caching)[1]
+        board.undo_move(opposite_color, move[0], move[1], flips)
         if new_value < best_value:
             best_move, best_value = move, new_value
     if caching:     # cache unknown moves
-        cached_moves[(board, color)] = (best_move, best_value)
+        store_cache(board, key, limit, float("-inf"), float("inf"), best_move, best_value)
     return best_move, best_value
 
 
 def minimax_max_node(board, color, limit, caching = 0):
-    if caching and (board, color) in cached_moves:
-        return cached_moves[(board, color)]
+    if stats is not None:
+        stats.nodes += 1
+    if caching:
+        key, cached, _ = probe_cache(board, color, color, float("-inf"), float("inf"), limit)
+        if cached is not None:
+            return cached
     best_move = None
-    moves = get_possible_moves(board, color)
+    moves = board.get_possible_moves(color)
     if not moves or limit == 0:
-        result = best_move, compute_utility(board, color)
+        if stats is not None:
+            stats.leaves += 1
+        result = best_move, evaluate_leaf(board, color, not moves)
         return result
+    if stats is not None:
+        stats.expand(board.count_empty(), len(moves))
     best_move, best_value = moves[0], float("-inf")
     for move in moves:
-        new_board = play_move(board, color, move[0], move[1])
-        new_value = minimax_min_node(new_board, color, limit - 1, caching)[1]
+        flips = board.make_move(color, move[0], move[1])
+        new_value = minimax_min_node(board, color, limit - 1, caching)[1]
+        board.undo_move(color, move[0], move[1], flips)
         if new_value > best_value:
             best_move, best_value = move, new_value
     if caching:     # cache unknown moves
-        cached_moves[(board, color)] = (best_move, best_value)
+        store_cache(board, key, limit, float("-inf"), float("inf"), best_move, best_value)
     return best_move, best_value
 
 
@@ -134,71 +262,188 @@ def select_move_minimax(board, color, limit, caching = 0):
     If caching is ON (i.e. 1), use state caching to reduce the number of state evaluations.
     If caching is OFF (i.e. 0), do NOT use state caching to reduce the number of state evaluations.
     """
+    board = new_search_board(board)
+    if limit < 0:   # no depth limit: the game ends within count_empty() plies
+        limit = board.count_empty()
+    transposition_table.new_search()
     move = minimax_max_node(board, color, limit, caching)[0]
     return move
 
 
 ############ ALPHA-BETA PRUNING #####################
-def alphabeta_min_node(board, color, alpha, beta, limit, caching = 0, ordering = 0):
-    if caching and (board, color) in cached_moves:
-        return cached_moves[(board, color)]
-    best_move = None
+def square_priorities(n):
+    """
+    Static move-ordering score of every square of an n x n board, indexed
+    by bit index (i * n + j). Corners first, then edges, then the inside;
+    squares next to an empty corner come last.
+    """
+    if n not in square_priority_tables:
+        table = []
+        for i in range(n):
+            for j in range(n):
+                on_edge_i = i in (0, n - 1)
+                on_edge_j = j in (0, n - 1)
+                near_i = i in (1, n - 2)
+                near_j = j in (1, n - 2)
+                if on_edge_i and on_edge_j:
+                    table.append(4)     # corner
+                elif (on_edge_i and near_j) or (near_i and on_edge_j):
+                    table.append(-1)    # edge square next to a corner
+                elif near_i and near_j:
+                    table.append(-2)    # diagonal neighbour of a corner
+                elif on_edge_i or on_edge_j:
+                    table.append(2)     # other edge squares
+                else:
+                    table.append(0)
+        square_priority_tables[n] = table
+    return square_priority_tables[n]
+
+
+def reset_move_ordering():
+    """
+    Called at the start of every root search: forget the killer moves and
+    halve the history scores, so recent cutoffs count for more.
+    """
+    killer_moves.clear()
+    for scores in history_scores.values():
+        for index in range(len(scores)):
+            scores[index] >>= 1
+
+
+def order_moves(board, player, moves):
+    """
+    Sort moves (for player) without playing them: killer moves of this ply
+    first, then by static square priority, with the history score breaking
+    ties between squares of the same kind.
+    """
+    n = board.dimension
+    killers = killer_moves.get(board.count_empty(), ())
+    history = history_scores.get((player, n))
+    if history is None:
+        history = history_scores[(player, n)] = [0] * (n * n)
+    priority = square_priorities(n)
+    moves.sort(key=lambda move: (move in killers, priority[move[0] * n + move[1]],
+                                 history[move[0] * n + move[1]]), reverse=True)
+
+
+def record_cutoff(board, player, move, limit):
+    # move (for player) caused a cutoff with limit plies left
+    killers = killer_moves.setdefault(board.count_empty(), [])
+    if move not in killers:
+        killers.insert(0, move)
+        del killers[2:]
+    n = board.dimension
+    history_scores[(player, n)][move[0] * n + move[1]] += limit * limit
+
+
+def promote(moves, move):
+    # search move first, if it is legal here
+    if move in moves:
+        moves.remove(move)
+        moves.insert(0, move)
+
+
+def alphabeta_min_node(board, color, alpha, beta, limit, caching = 0, ordering = 0, pvs = 0):
     opposite_color = [1, 2][color == 1]
-    moves = get_possible_moves(board, opposite_color)
+    if stats is not None:
+        stats.nodes += 1
+    hash_move = None
+    if caching:
+        key, cached, hash_move = probe_cache(board, opposite_color, color, alpha, beta, limit)
+        if cached is not None:
+            return cached
+    best_move = None
+    moves = board.get_possible_moves(opposite_color)
     if not moves or limit == 0:
-        result = best_move, compute_utility(board, color)
+        if stats is not None:
+            stats.leaves += 1
+        result = best_move, evaluate_leaf(board, color, not moves)
         return result
+    if search_deadline is not None and time.perf_counter() > search_deadline:
+        raise SearchTimeout
+    if stats is not None:
+        stats.expand(board.count_empty(), len(moves))
+    beta_orig = beta
     best_value = float("inf")
     if ordering:
-        new_moves = dict()
-        for move in moves:
-            new_board = play_move(board, opposite_color, move[0], move[1])
-            new_moves[move] = compute_utility(new_board, color)
-        moves.sort(key=new_moves.get)
+        order_moves(board, opposite_color, moves)
+    promote(moves, hash_move)   # best move of an earlier search goes first
     best_move = moves[0]
     for move in moves:
-        new_board = play_move(board, opposite_color, move[0], move[1])
-        new_value = alphabeta_max_node(new_board, color,alpha, beta, limit-1, caching, ordering)[1]
+        flips = board.make_move(opposite_color, move[0], move[1])
+        if pvs and move is not moves[0]:
+            # scout: can this move get below beta at all?
+            new_value = alphabeta_max_node(board, color, beta - null_window(), beta, limit-1, caching, ordering, pvs)[1]
+            if alpha < new_value < beta:
+                new_value = alphabeta_max_node(board, color, alpha, beta, limit-1, caching, ordering, pvs)[1]
+        else:
+            new_value = alphabeta_max_node(board, color,alpha, beta, limit-1, caching, ordering, pvs)[1]
+        board.undo_move(opposite_color, move[0], move[1], flips)
         if new_value < best_value:
             best_move, best_value = move, new_value
         beta = min(beta, best_value)
         if beta <= alpha:
+            if ordering:
+                record_cutoff(board, opposite_color, move, limit)
+            if stats is not None:
+                stats.cutoff(move is moves[0])
             break
     if caching:     # cache unknown moves
-        cached_moves[(board, color)] = (best_move, best_value)
+        store_cache(board, key, limit, alpha, beta_orig, best_move, best_value)
     return best_move, best_value
 
 
-def alphabeta_max_node(board, color, alpha, beta, limit, caching = 0, ordering = 0):
-    if caching and (board, color) in cached_moves:
-        return cached_moves[(board, color)]
+def alphabeta_max_node(board, color, alpha, beta, limit, caching = 0, ordering = 0, pvs = 0, first_move = None):
+    if stats is not None:
+        stats.nodes += 1
+    hash_move = None
+    if caching:
+        key, cached, hash_move = probe_cache(board, color, color, alpha, beta, limit)
+        if cached is not None:
+            return cached
     best_move = None
-    moves = get_possible_moves(board, color)
+    moves = board.get_possible_moves(color)
     if not moves or limit == 0:
-        result = best_move, compute_utility(board, color)
+        if stats is not None:
+            stats.leaves += 1
+        result = best_move, evaluate_leaf(board, color, not moves)
         return result
+    if search_deadline is not None and time.perf_counter() > search_deadline:
+        raise SearchTimeout
+    if stats is not None:
+        stats.expand(board.count_empty(), len(moves))
+    alpha_orig = alpha
     best_value = float("-inf")
     if ordering:
-        new_moves = dict()
-        for move in moves:
-            new_board = play_move(board, color, move[0], move[1])
-            new_moves[move] = compute_utility(new_board, color)
-        moves.sort(key=new_moves.get, reverse=True)
+        order_moves(board, color, moves)
+    promote(moves, hash_move)   # best move of an earlier search goes first
+    promote(moves, first_move)
     best_move = moves[0]
     for move in moves:
-        new_board = play_move(board, color, move[0], move[1])
-        new_value = alphabeta_min_node(new_board, color, alpha, beta, limit - 1, caching, ordering)[1]
+        flips = board.make_move(color, move[0], move[1])
+        if pvs and move is not moves[0]:
+            # scout: can this move get above alpha at all?
+            new_value = alphabeta_min_node(board, color, alpha, alpha + null_window(), limit - 1, caching, ordering, pvs)[1]
+            if alpha < new_value < beta:
+                new_value = alphabeta_min_node(board, color, alpha, beta, limit - 1, caching, ordering, pvs)[1]
+        else:
+            new_value = alphabeta_min_node(board, color, alpha, beta, limit - 1, caching, ordering, pvs)[1]
+        board.undo_move(color, move[0], move[1], flips)
         if new_value > best_value:
             best_move, best_value = move, new_value
         alpha = max(alpha, best_value)
         if beta <= alpha:
+            if ordering:
+                record_cutoff(board, color, move, limit)
+            if stats is not None:
+                stats.cutoff(move is moves[0])
             break
     if caching:     # cache unknown moves
-        cached_moves[(board, color)] = (best_move, best_value)
+        store_cache(board, key, limit, alpha_orig, beta, best_move, best_value)
     return best_move, best_value
 
 
-def select_move_alphabeta(board, color, limit, caching = 0, ordering = 0):
+def select_move_alphabeta(board, color, limit, caching = 0, ordering = 0, pvs = 0, workers = 1):
     """
     Given a board and a player color, decide on a move.
     The return value is a tuple of integers (i,j), where
@@ -212,11 +457,369 @@ def select_move_alphabeta(board, color, limit, caching = 0, ordering = 0):
     If caching is OFF (i.e. 0), do NOT use state caching to reduce the number of state evaluations.
     If ordering is ON (i.e. 1), use node ordering to expedite pruning and reduce the number of state evaluations.
     If ordering is OFF (i.e. 0), do NOT use node ordering to expedite pruning and reduce the number of state evaluations.
+    If pvs is ON (i.e. 1), use principal variation search: only the first move at each node gets the full window,
+    the others are first searched with a null window and only searched again if they turn out better.
+    If workers is more than 1, the moves at the root are searched in that many processes (see parallel_root_search).
     """
+    board = new_search_board(board)
+    if limit < 0:   # no depth limit: the game ends within count_empty() plies
+        limit = board.count_empty()
+    if workers > 1:
+        get_worker_pool(workers, caching)
+    transposition_table.new_search()
+    reset_move_ordering()
+    if workers > 1 and limit > 1:
+        return parallel_root_search(board, color, limit, caching, ordering, pvs, workers)[0]
     move = alphabeta_max_node(board, color, float("-inf"), float("inf"),
-                              limit, caching, ordering)[0]
+                              limit, caching, ordering, pvs)[0]
+    return move
+
+
+def aspiration_search(board, color, limit, guess, caching = 0, ordering = 0, pvs = 0, first_move = None):
+    """
+    Search the root with a narrow window around guess, the score of the
+    previous iteration. If the score falls outside the window, search again
+    with that side of the window opened up. Returns (move, value).
+    """
+    alpha, beta = guess - ASPIRATION_WINDOW, guess + ASPIRATION_WINDOW
+    while True:
+        move, value = alphabeta_max_node(board, color, alpha, beta, limit, caching, ordering, pvs, first_move)
+        if value <= alpha:
+            alpha = float("-inf")
+        elif value >= beta:
+            beta = float("inf")
+        else:
+            return move, value
+
+
+def mtdf_search(board, color, limit, guess, caching = 0, ordering = 0, pvs = 0, first_move = None):
+    """
+    MTD(f): find the root score with a sequence of null-window searches that
+    start at guess and close in on the score from both sides. This relies on
+    the transposition table (caching) to avoid repeating work between the
+    searches. Returns (move, value).
+    """
+    lower, upper = float("-inf"), float("inf")
+    value, move = guess, first_move
+    step = null_window()
+    while lower < upper:
+        beta = value + step if value == lower else value
+        result, value = alphabeta_max_node(board, color, beta - step, beta, limit, caching, ordering, pvs, move)
+        if value < beta:
+            upper = value
+        else:   # only a fail-high search proves that its move reaches value
+            lower = value
+            move = result
+    return move, value
+
+
+############ ITERATIVE DEEPENING ###################
+def select_move_iterative(board, color, budget, limit = -1, caching = 0, ordering = 0, pvs = 0, mtdf = 0, workers = 1,
+                          resume = None):
+    """
+    Given a board and a player color, decide on a move within budget seconds.
+
+    Runs alpha-beta to depth 1, 2, 3, ... and returns the best move of the
+    deepest search that finished before the budget ran out. Each search tries
+    the previous search's best move first. If limit is a positive integer, it
+    caps the depth. caching, ordering and pvs work as in select_move_alphabeta.
+    With pvs ON, each search after the first uses an aspiration window around
+    the previous score. With mtdf ON, it uses MTD(f) instead. If workers is
+    more than 1, every iteration after the first is a parallel_root_search
+    (with a full window). resume is a (depth, move, value) result already
+    found for this board (by pondering); the search continues from there.
+    """
+    global search_deadline
+    start = time.perf_counter()
+    board = new_search_board(board)
+    if limit < 0:   # no depth limit: the game ends within count_empty() plies
+        limit = board.count_empty()
+    if workers > 1:
+        get_worker_pool(workers, caching)
+    transposition_table.new_search()
+    reset_move_ordering()
+    search_deadline = start + budget
+    try:
+        depth, move, value = deepen(board, color, limit, caching, ordering, pvs, mtdf, workers, resume)
+    finally:
+        search_deadline = None
+    eprint("Searched to depth", depth, "in {:.2f}s".format(time.perf_counter() - start))
     return move
 
+
+def deepen(board, color, limit, caching = 0, ordering = 0, pvs = 0, mtdf = 0, workers = 1, resume = None,
+           progress = None):
+    """
+    The iterative deepening loop of select_move_iterative, on a SearchBoard.
+    Searches until limit or until search_deadline, and returns (depth, move,
+    value) of the deepest search that finished. If given, progress(depth,
+    move, value) is called after every finished search.
+    """
+    depth, move, value = resume or (0, board.get_possible_moves(color)[0], None)
+    try:
+        while depth < limit:
+            iteration_start = time.perf_counter()
+            if value is not None and workers > 1:
+                move, value = parallel_root_search(board, color, depth + 1, caching, ordering, pvs, workers, move)
+            elif value is not None and mtdf:
+                move, value = mtdf_search(board, color, depth + 1, value, caching, ordering, pvs, move)
+            elif value is not None and pvs:
+                move, value = aspiration_search(board, color, depth + 1, value, caching, ordering, pvs, move)
+            else:
+                move, value = alphabeta_max_node(board, color, float("-inf"), float("inf"),
+                                                 depth + 1, caching, ordering, pvs, move)
+            depth += 1
+            if stats is not None:
+                stats.depth_done(depth, time.perf_counter() - iteration_start)
+            if progress is not None:
+                progress(depth, move, value)
+            # the next search takes at least as long as this one did
+            now = time.perf_counter()
+            if now + (now - iteration_start) > search_deadline:
+                break
+    except SearchTimeout:
+        pass
+    return depth, move, value
+
+
+############ ENDGAME ###############################
+def select_move_endgame(board, color, budget = 0, wld = 0):
+    """
+    Given a board and a player color, decide on a move by searching to the
+    end of the game with the endgame solver (othello_endgame). With wld ON,
+    only find a move that wins (or else draws), not the best score. budget,
+    if given, is the time limit in seconds.
+    """
+    start = time.perf_counter()
+    move, value = solve(board, color, wld, start + budget if budget > 0 else None)
+    if value is None:
+        eprint("Endgame solver ran out of time")
+    else:
+        eprint("Solved", "win/loss/draw" if wld else "endgame", "with value", value,
+               "in {:.2f}s".format(time.perf_counter() - start))
+    if stats is not None:
+        stats.nodes += othello_endgame.solver_nodes
+    return move
+
+
+############ PONDERING #############################
+# While the opponent thinks, run_ai is blocked in input(), which releases the
+# interpreter lock, so a background thread can use the whole CPU. It plays
+# the reply we expect and searches the resulting position with no deadline.
+# The thread shares the transposition table and the move ordering tables with
+# the main search, so stop_pondering must return before the next search starts.
+def predict_reply(board, color):
+    """
+    Return the move we expect the opponent of color to play on board (where
+    it is the opponent's turn): the best move stored in the transposition
+    table, else the first one in move ordering. None if it has no move.
+    """
+    opposite_color = [1, 2][color == 1]
+    board = SearchBoard.from_board(board)
+    moves = board.get_possible_moves(opposite_color)
+    if not moves:
+        return None
+    move = probe_cache(board, opposite_color, color, 0, 0, float("inf"))[2]
+    if move in moves:
+        return move
+    order_moves(board, opposite_color, moves)
+    return moves[0]
+
+
+def start_pondering(board, color, move, limit = -1, caching = 0, ordering = 0, pvs = 0, mtdf = 0):
+    """
+    Called after color has sent move for board: guess the opponent's reply
+    and start searching the position after it in the background.
+    """
+    global ponder_thread, ponder_result, search_deadline
+    board = play_move(board, color, move[0], move[1])
+    reply = predict_reply(board, color)
+    if reply is None:
+        return
+    board = play_move(board, [1, 2][color == 1], reply[0], reply[1])
+    if not get_possible_moves(board, color):
+        return
+    search = new_search_board(board)
+    if limit < 0:
+        limit = search.count_empty()
+    ponder_result = (board, None)
+
+    def progress(depth, move, value):
+        global ponder_result
+        ponder_result = (board, (depth, move, value))
+
+    transposition_table.new_search()
+    reset_move_ordering()
+    search_deadline = float("inf")  # until stop_pondering
+    ponder_thread = threading.Thread(target=deepen, args=(search, color, limit, caching, ordering, pvs, mtdf),
+                                     kwargs={"progress": progress}, daemon=True)
+    ponder_thread.start()
+
+
+def stop_pondering(board):
+    """
+    Stop the background search. Returns its (depth, move, value) if it was
+    searching board (the reply was predicted correctly) and finished at least
+    one depth, otherwise None. board is None when the game is over.
+    """
+    global ponder_thread, search_deadline
+    if ponder_thread is None:
+        return None
+    search_deadline = 0     # the next deadline check raises SearchTimeout
+    ponder_thread.join()
+    ponder_thread = None
+    search_deadline = None
+    predicted, result = ponder_result
+    if board is None:
+        return None
+    if predicted != to_bitboard(board):
+        eprint("Ponder miss")
+        return None
+    if result is not None:
+        eprint("Ponder hit, already searched to depth", result[0])
+    return result
+
+
+############ PARALLEL ROOT SEARCH ##################
+def init_worker(alpha, generation, table_name, evaluation, symmetric_discs):
+    global shared_alpha, search_generation, transposition_table, heuristic, weights_file, symmetry
+    shared_alpha = alpha
+    search_generation = generation
+    heuristic, weights_file = evaluation
+    symmetry = symmetric_discs
+    if table_name is not None:
+        transposition_table = SharedTranspositionTable(name=table_name)
+
+
+def get_worker_pool(workers, caching = 0):
+    """
+    Return a pool of worker processes, started on first use and kept for the
+    rest of the game. With caching, the agent's transposition table is first
+    moved into shared memory (with the same memory limit), and the agent and
+    all workers probe and store into that one table.
+    """
+    global worker_pool, worker_settings, shared_alpha, search_generation, transposition_table
+    if worker_pool is None or worker_settings != (workers, caching):
+        if worker_pool is not None:
+            worker_pool.shutdown(cancel_futures=True)
+        shared_alpha = multiprocessing.Value("d", float("-inf"))
+        search_generation = multiprocessing.RawValue("q", 0)   # written under shared_alpha's lock
+        table_name = None
+        if caching:
+            if not isinstance(transposition_table, SharedTranspositionTable):
+                table = SharedTranspositionTable(transposition_table.size * ENTRY_BYTES)
+                atexit.register(table.close)
+                for key, depth, flag, value, move in transposition_table.entries():
+                    table.store(key, depth, flag, value, move)
+                transposition_table = table
+            table_name = transposition_table.name
+        worker_pool = ProcessPoolExecutor(max_workers=workers, initializer=init_worker,
+                                          initargs=(shared_alpha, search_generation, table_name,
+                                                    (heuristic, weights_file), symmetry))
+        worker_settings = (workers, caching)
+    return worker_pool
+
+
+def search_root_move(dimension, dark, light, color, move, limit, caching, ordering, pvs, deadline, generation):
+    """
+    Worker task: score the root move for color with limit - 1 plies left
+    after it. The opponent's replies are searched one by one, and before
+    each one the best root score found so far by any process is read from
+    shared_alpha. Once the move cannot beat that score, the remaining replies
+    are skipped. Returns (move, value, exact), where exact is False if value
+    is only an upper bound because the move did not beat shared_alpha.
+
+    deadline is a time.time() value (or None), so it is the same for a task
+    that waited in the pool queue. generation is the root search the task
+    belongs to: once search_generation has moved on, the task stops with
+    SearchTimeout and its score is not written to shared_alpha.
+    """
+    global search_deadline
+    if deadline is not None:
+        search_deadline = time.perf_counter() + (deadline - time.time())
+    try:
+        if search_generation.value != generation or \
+                (search_deadline is not None and time.perf_counter() > search_deadline):
+            raise SearchTimeout
+        board = new_search_board(SearchBoard(dimension, dark, light))
+        board.make_move(color, move[0], move[1])
+        opposite_color = [1, 2][color == 1]
+        reset_move_ordering()
+        replies = board.get_possible_moves(opposite_color)
+        if not replies or limit == 1:
+            return move, evaluate_leaf(board, color, not replies), True
+        if ordering:
+            order_moves(board, opposite_color, replies)
+        best_value = float("inf")
+        alpha = float("-inf")
+        for reply in replies:
+            if search_generation.value != generation:
+                raise SearchTimeout
+            alpha = shared_alpha.value
+            if best_value <= alpha:     # a sibling already does at least as well
+                break
+            flips = board.make_move(opposite_color, reply[0], reply[1])
+            value = alphabeta_max_node(board, color, alpha, best_value, limit - 2, caching, ordering, pvs)[1]
+            board.undo_move(opposite_color, reply[0], reply[1], flips)
+            best_value = min(best_value, value)
+        with shared_alpha.get_lock():
+            if search_generation.value == generation and best_value > shared_alpha.value:
+                shared_alpha.value = best_value
+        return move, best_value, best_value > alpha
+    finally:
+        search_deadline = None
+
+
+def next_generation(value = None):
+    """
+    Start a new root search generation: tasks of earlier ones are dropped.
+    With value, shared_alpha is reset to it at the same time. Returns the
+    new generation.
+    """
+    with shared_alpha.get_lock():
+        search_generation.value += 1
+        if value is not None:
+            shared_alpha.value = value
+        return search_generation.value
+
+
+def parallel_root_search(board, color, limit, caching = 0, ordering = 0, pvs = 0, workers = 2, first_move = None):
+    """
+    Young Brothers Wait at the root: search the first move here to get a
+    score to beat, then hand every other root move to a pool of worker
+    processes (search_root_move). Workers share the best score found so far
+    through shared_alpha and, with caching, one shared transposition table.
+    Returns (move, value) like alphabeta_max_node.
+    """
+    moves = board.get_possible_moves(color)
+    if ordering:
+        order_moves(board, color, moves)
+    promote(moves, first_move)
+    flips = board.make_move(color, moves[0][0], moves[0][1])
+    best_value = alphabeta_min_node(board, color, float("-inf"), float("inf"), limit - 1, caching, ordering, pvs)[1]
+    board.undo_move(color, moves[0][0], moves[0][1], flips)
+    best_move = moves[0]
+    if len(moves) == 1:
+        return best_move, best_value
+
+    pool = get_worker_pool(workers, caching)
+    generation = next_generation(best_value)
+    deadline = None
+    if search_deadline is not None:
+        deadline = time.time() + (search_deadline - time.perf_counter())
+    futures = [pool.submit(search_root_move, board.dimension, board.dark, board.light, color, move,
+                           limit, caching, ordering, pvs, deadline, generation) for move in moves[1:]]
+    try:
+        for future in futures:
+            move, value, exact = future.result()
+            if exact and value > best_value:
+                best_move, best_value = move, value
+    finally:
+        for future in futures:
+            future.cancel()
+        next_generation()   # tasks still queued or running stop and leave shared_alpha alone
+    return best_move, best_value
+
 ####################################################
 def run_ai():
     """
@@ -225,7 +828,8 @@ def run_ai():
     Then it repeatedly receives the current score and current board state
     until the game is over.
     """
-    print("Othello AI") # First line is the name of this AI
+    global heuristic, weights_file, stats, symmetry
+    print(intro("Othello AI")) # First line is the name of this AI (and the protocols it reads)
     arguments = input().split(",")
 
     color = int(arguments[0]) #Player color: 1 for dark (goes first), 2 for light.
@@ -233,6 +837,33 @@ def run_ai():
     minimax = int(arguments[2]) #Minimax or alpha beta
     caching = int(arguments[3]) #Caching
     ordering = int(arguments[4]) #Node-ordering (for alpha-beta only)
+    options = dict(arg.split("=", 1) for arg in arguments[5:]) #Extra key=value settings
+    reader = BoardReader(options) #Board protocol agreed on the handshake
+    budget = float(options.get("time", 0)) #Seconds per move for iterative deepening
+    pvs = int(options.get("pvs", 0)) #Principal variation search (for alpha-beta only)
+    mtdf = int(options.get("mtdf", 0)) #MTD(f) root searches (with iterative deepening only)
+    workers = int(options.get("workers", 1)) #Processes for the root search (for alpha-beta only)
+    ponder = int(options.get("ponder", 0)) #Search on the opponent's time (for alpha-beta only)
+    endgame = int(options.get("endgame", 0)) #Solve exactly from this many empty squares on
+    wld = int(options.get("wld", 0)) #Solve for win/loss/draw from this many empty squares on
+    weights_file = options.get("weights") #Pattern weights file (see othello_patterns.py)
+    heuristic = int(options.get("heuristic", weights_file is not None)) #Score depth-limited leaves with compute_heuristic
+    book = None
+    if "book" in options: #Opening book file (see opening_book.py), used if searched with the same evaluation
+        book = OpeningBook(options["book"], book_signature(heuristic, weights_file))
+    telemetry = int(options.get("telemetry", 0)) #Write search counters for every move to stderr
+    symmetry = int(options.get("symmetry", 0)) #Cache positions with up to this many discs under one key per symmetry class
+    cache_file = options.get("cache_file") #Keep the cache in this file from game to game (see othello_cache.py)
+    cache_entries = int(options.get("cache_entries", DEFAULT_ENTRIES)) #Most entries kept in the cache file
+    if cache_file is not None: #values are only comparable with the same evaluation
+        weights = None
+        if heuristic and weights_file is not None:
+            with open(weights_file, "rb") as f:
+                weights = f.read()
+        cache_settings = signature("agent.py", heuristic, weights)
+
+    if "tt_mb" in options: #Transposition table size in megabytes
+        transposition_table.resize(int(float(options["tt_mb"]) * 1024 * 1024))
 
     if (minimax == 1): eprint("Running MINIMAX")
     else: eprint("Running ALPHA-BETA")
@@ -243,11 +874,40 @@ def run_ai():
     if (ordering == 1): eprint("Node Ordering is ON")
     else: eprint("Node Ordering is OFF")
 
+    if (caching == 1): eprint("Cache holds", transposition_table.size, "entries")
+
     if (limit == -1): eprint("Depth Limit is OFF")
     else: eprint("Depth Limit is ", limit)
 
+    if (heuristic == 1): eprint("Pattern heuristic is ON with", weights_file or "default weights")
+
+    if (budget > 0 and minimax == 0): eprint("Iterative Deepening with", budget, "seconds per move")
+
+    if (pvs == 1 and minimax == 0): eprint("Principal Variation Search is ON")
+
+    if (mtdf == 1 and budget > 0 and minimax == 0): eprint("MTD(f) is ON")
+
+    if (workers > 1 and minimax == 0): eprint("Parallel root search with", workers, "workers")
+
+    if (ponder == 1 and minimax == 0): eprint("Pondering is ON")
+
+    if (book is not None and book.matches): eprint("Opening book holds", book.count, "positions")
+
+    if (book is not None and not book.matches): eprint("Opening book was searched with other heuristic settings, not using it")
+
+    if (endgame > 0): eprint("Endgame solver from", endgame, "empty squares")
+
+    if (wld > endgame): eprint("Win/loss/draw solver from", wld, "empty squares")
+
+    if (telemetry == 1): eprint("Telemetry is ON")
+
+    if (symmetry > 0 and caching == 1): eprint("Symmetric positions share cache entries up to", symmetry, "discs")
+
+    if (cache_file is not None and caching == 1): eprint("Cache file is", cache_file, "with up to", cache_entries, "entries")
+
     if (minimax == 1 and ordering == 1): eprint("Node Ordering should have no impact on Minimax")
 
+    dimension = None
     while True: # This is the main loop
         # Read in the current game status, for example:
         # "SCORE 2 2" or "FINAL 33 31" if the game is over.
@@ -258,22 +918,63 @@ def run_ai():
         light_score = int(light_score_s)
 
         if status == "FINAL": # Game is over.
-            print
+            stop_pondering(None)
+            if cache_file is not None and caching == 1 and dimension is not None:
+                eprint("Saved", save_cache(transposition_table, cache_file, dimension, cache_settings, cache_entries),
+                       "entries to", cache_file)
+            break
         else:
-            board = eval(input()) # Read in the input and turn it into a Python
-                                  # object. The format is a list of rows. The
-                                  # squares in each row are represented by
-                                  # 0 : empty square
-                                  # 1 : dark disk (player 1)
-                                  # 2 : light disk (player 2)
-            board = tuple(tuple(row) for row in board)
+            board = reader.read(input()) # Read in the board. With the text protocol
+                                         # it is a list of rows, the squares in
+                                         # each row are represented by
+                                         # 0 : empty square
+                                         # 1 : dark disk (player 1)
+                                         # 2 : light disk (player 2)
+                                         # See othello_protocol for the packed one.
+            if dimension is None: #first board: warm the cache up with the entries of earlier games
+                dimension = len(board)
+                if cache_file is not None and caching == 1:
+                    eprint("Loaded", load_cache(transposition_table, cache_file, dimension, cache_settings),
+                           "entries from", cache_file)
+            resume = stop_pondering(board) #result of the search on the opponent's time, if it guessed right
+            book_move = book.lookup(board, color) if book is not None else None
+
+            empties = SearchBoard.from_board(board).count_empty()
+            if (telemetry == 1):
+                stats = SearchStats(empties)
+
             # Select the move and send it to the manager
-            if (minimax == 1): #run this if the minimax flag is given
+            if book_move is not None: #play from the opening book without searching
+                movei, movej = book_move
+                mode = "book"
+            elif empties <= endgame: #solve the rest of the game exactly
+                movei, movej = select_move_endgame(board, color, budget)
+                mode = "endgame"
+            elif empties <= wld: #find a winning move
+                movei, movej = select_move_endgame(board, color, budget, wld=1)
+                mode = "wld"
+            elif (minimax == 1): #run this if the minimax flag is given
                 movei, movej = select_move_minimax(board, color, limit, caching)
+                mode = "minimax"
+            elif budget > 0: #alphabeta with a time budget
+                movei, movej = select_move_iterative(board, color, budget, limit, caching, ordering, pvs, mtdf, workers,
+                                                     resume)
+                mode = "iterative"
+            elif resume is not None and resume[0] >= (limit if limit >= 0 else empties):
+                movei, movej = resume[1] #pondering already searched to the depth limit
+                mode = "ponder"
             else: #else run alphabeta
-                movei, movej = select_move_alphabeta(board, color, limit, caching, ordering)
+                movei, movej = select_move_alphabeta(board, color, limit, caching, ordering, pvs, workers)
+                mode = "alphabeta"
 
+            if stats is not None: #one JSON line on stderr, before the move so the manager has it in time
+                emit(stats, color=color, empties=empties, mode=mode, move=[movei, movej],
+                     resumed=resume[0] if resume is not None else 0)
+                stats = None #the search on the opponent's time is not counted
             print("{} {}".format(movei, movej))
+            if (ponder == 1 and minimax == 0):
+                sys.stdout.flush() #send the move before pondering starts
+                start_pondering(board, color, (movei, movej), limit, caching, ordering, pvs, mtdf)
 
 if __name__ == "__main__":
     run_ai()
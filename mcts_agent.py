@@ -0,0 +1,321 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*
+"""
+A Monte Carlo Tree Search player for Othello.
+
+Instead of searching to a depth limit and scoring the leaves with a
+heuristic, it plays random games (playouts) from the position and grows a
+tree of the moves that did well:
+  - selection: from the root, follow the child with the best UCT score
+    (win rate plus EXPLORATION * sqrt(ln parent visits / child visits))
+    until a node with untried moves;
+  - expansion: add the node for one untried move;
+  - playout: play random moves from there to the end of the game;
+  - backup: count the result (1 win, 0.5 draw, 0 loss) for the player who
+    moved into each node on the way.
+It does this until the time for the move is up and plays the root move
+visited most. The depth limit and the caching and ordering settings do not
+apply.
+
+Options (the key=value settings of the handshake):
+  - time: seconds per move (DEFAULT_TIME if not given);
+  - heuristic / weights: start every new node with PRIOR_VISITS virtual
+    playouts at the win rate the pattern evaluator (othello_patterns)
+    predicts for it, so good-looking moves are tried more from the start;
+  - workers: root parallelization. That many processes (this one
+    included) each grow their own tree from the same position, and the
+    visit counts of the root moves are added up.
+  - telemetry: one record per move on stderr (see othello_telemetry), with
+    playouts as nodes.
+Between turns the tree is kept: the node of the position after our move and
+the opponent's reply (two levels below the old root) becomes the new root,
+with the playouts already done under it.
+
+Playouts work on the two bitmasks of othello_bitboard, without building
+boards.
+"""
+import math
+import multiprocessing
+import random
+import sys
+import time
+
+from othello_bitboard import moves_mask, flips_mask, iter_bits, popcount, to_bitboard
+from othello_protocol import intro, BoardReader
+from othello_patterns import get_evaluator
+from othello_telemetry import SearchStats, emit
+
+DEFAULT_TIME = 1.0      # seconds per move
+EXPLORATION = 1.4       # UCT exploration constant
+PRIOR_VISITS = 10       # virtual playouts of the heuristic prior
+PRIOR_SCALE = 8.0       # discs of heuristic value for a logit of 1
+
+
+def eprint(*args, **kwargs): #you can use this for debugging, as it will print to sterr and not stdout
+    print(*args, file=sys.stderr, **kwargs)
+
+
+class Node(object):
+    """
+    A position in the tree. wins and visits count the playouts through it,
+    wins for the player who moved into it (the opponent of to_move).
+    """
+
+    __slots__ = ("move", "dark", "light", "to_move", "untried", "children", "visits", "wins")
+
+    def __init__(self, n, move, dark, light, to_move, rng):
+        self.move = move    # bit index of the move that led here, None at the root
+        self.dark = dark
+        self.light = light
+        self.to_move = to_move
+        if to_move == 1:
+            self.untried = list(iter_bits(moves_mask(n, dark, light)))
+        else:
+            self.untried = list(iter_bits(moves_mask(n, light, dark)))
+        rng.shuffle(self.untried)
+        self.children = []
+        self.visits = 0
+        self.wins = 0.0
+
+
+class MonteCarloSearch(object):
+    """
+    The search tree of one process, kept from move to move.
+    """
+
+    def __init__(self, n, seed = None, evaluator = None):
+        self.dimension = n
+        self.rng = random.Random(seed)
+        self.evaluator = evaluator  # PatternEvaluator for the priors, or None
+        self.root = None
+        self.playouts = 0           # playouts of the last search
+
+    def set_root(self, dark, light, color):
+        """
+        Make the position the root, reusing the subtree of the old root if
+        the position is the old root itself or one of its grandchildren.
+        Returns the number of playouts kept.
+        """
+        old = self.root
+        self.root = None
+        if old is not None:
+            candidates = [old] + [grandchild for child in old.children for grandchild in child.children]
+            for node in candidates:
+                if node.dark == dark and node.light == light and node.to_move == color:
+                    self.root = node
+                    break
+        if self.root is None:
+            self.root = Node(self.dimension, None, dark, light, color, self.rng)
+        return self.root.visits
+
+    def search(self, budget):
+        """
+        Run playouts from the root for budget seconds.
+        """
+        deadline = time.perf_counter() + budget
+        self.playouts = 0
+        root = self.root
+        if len(root.untried) + len(root.children) <= 1:   # nothing to choose
+            return
+        while True:
+            for _ in range(16):     # look at the clock every few playouts
+                self.iterate(root)
+            self.playouts += 16
+            if time.perf_counter() >= deadline:
+                return
+
+    def iterate(self, root):
+        n = self.dimension
+        node = root
+        path = [root]
+        while not node.untried and node.children:
+            log_visits = EXPLORATION * math.sqrt(math.log(node.visits))
+            best, best_score = None, -1.0
+            for child in node.children:
+                score = child.wins / child.visits + log_visits / math.sqrt(child.visits)
+                if score > best_score:
+                    best, best_score = child, score
+            node = best
+            path.append(node)
+        if node.untried:
+            index = node.untried.pop()
+            if node.to_move == 1:
+                flips = flips_mask(n, node.dark, node.light, index)
+                dark, light = node.dark | (1 << index) | flips, node.light ^ flips
+            else:
+                flips = flips_mask(n, node.light, node.dark, index)
+                dark, light = node.dark ^ flips, node.light | (1 << index) | flips
+            child = Node(n, index, dark, light, 3 - node.to_move, self.rng)
+            if self.evaluator is not None:
+                p = 1 / (1 + math.exp(-self.evaluator.evaluate(dark, light) / PRIOR_SCALE))
+                child.visits = PRIOR_VISITS
+                child.wins = PRIOR_VISITS * (p if node.to_move == 1 else 1 - p)
+            node.children.append(child)
+            node = child
+            path.append(node)
+        result = self.playout(node.dark, node.light, node.to_move)
+        for node in path:
+            node.visits += 1
+            node.wins += result if node.to_move == 2 else 1 - result
+
+    def playout(self, dark, light, to_move):
+        """
+        Play random moves to the end of the game. Returns 1 if dark wins,
+        0.5 for a draw and 0 if light wins.
+        """
+        n = self.dimension
+        choice = self.rng.choice
+        own, opp = (dark, light) if to_move == 1 else (light, dark)
+        while True:
+            moves = moves_mask(n, own, opp)
+            if not moves:
+                break
+            index = choice(list(iter_bits(moves)))
+            flips = flips_mask(n, own, opp, index)
+            own, opp = opp ^ flips, own | (1 << index) | flips
+            to_move = 3 - to_move
+        dark, light = (own, opp) if to_move == 1 else (opp, own)
+        difference = popcount(dark) - popcount(light)
+        return 1.0 if difference > 0 else 0.0 if difference < 0 else 0.5
+
+    def root_visits(self):
+        """
+        Return {move index: [visits, wins]} for the root's children.
+        """
+        return {child.move: [child.visits, child.wins] for child in self.root.children}
+
+    def tree_size(self):
+        count = 0
+        stack = [self.root]
+        while stack:
+            node = stack.pop()
+            count += 1
+            stack.extend(node.children)
+        return count
+
+
+############ ROOT PARALLELIZATION ##################
+def worker_main(connection, n, seed, weights):
+    """
+    Worker process: keeps its own tree, and for every (dark, light, color,
+    budget) it receives, searches and sends back its root visits and
+    playout count. None stops it.
+    """
+    evaluator = get_evaluator(n, weights[1]) if weights[0] else None
+    tree = MonteCarloSearch(n, seed, evaluator)
+    while True:
+        task = connection.recv()
+        if task is None:
+            return
+        dark, light, color, budget = task
+        tree.set_root(dark, light, color)
+        tree.search(budget)
+        connection.send((tree.root_visits(), tree.playouts))
+
+
+def start_workers(count, n, seed, weights):
+    """
+    Start count worker processes, returning their pipe connections.
+    """
+    connections = []
+    for k in range(count):
+        ours, theirs = multiprocessing.Pipe()
+        process = multiprocessing.Process(target=worker_main, args=(theirs, n, seed + k + 1, weights), daemon=True)
+        process.start()
+        connections.append(ours)
+    return connections
+
+
+def select_move(tree, board, color, budget, workers = ()):
+    """
+    Search board for color for budget seconds (with the worker processes
+    too, if any) and return ((column, row), playouts, root visits).
+    """
+    for connection in workers:
+        connection.send((board.dark, board.light, color, budget))
+    tree.set_root(board.dark, board.light, color)
+    tree.search(budget)
+    visits = tree.root_visits()
+    playouts = tree.playouts
+    for connection in workers:
+        worker_visits, worker_playouts = connection.recv()
+        playouts += worker_playouts
+        for move, (count, wins) in worker_visits.items():
+            total = visits.setdefault(move, [0, 0.0])
+            total[0] += count
+            total[1] += wins
+    if visits:
+        move = max(visits, key=lambda move: visits[move][0])
+    else:   # single legal move, not searched
+        move = (tree.root.untried + [child.move for child in tree.root.children])[0]
+    return divmod(move, board.dimension), playouts, visits
+
+
+def run_ai():
+    """
+    This function establishes communication with the game manager.
+    It first introduces itself and receives its color.
+    Then it repeatedly receives the current score and current board state
+    until the game is over.
+    """
+    print(intro("Monte Carlo AI")) # First line is the name of this AI (and the protocols it reads)
+    arguments = input().split(",")
+
+    color = int(arguments[0]) #Player color: 1 for dark (goes first), 2 for light.
+    # arguments[1:5] (depth limit, minimax, caching, ordering) have no impact on this AI
+    options = dict(arg.split("=", 1) for arg in arguments[5:]) #Extra key=value settings
+    reader = BoardReader(options) #Board protocol agreed on the handshake
+    budget = float(options.get("time", 0)) or DEFAULT_TIME #Seconds per move
+    workers = int(options.get("workers", 1)) #Processes growing a tree each (root parallelization)
+    weights_file = options.get("weights") #Pattern weights file (see othello_patterns.py)
+    heuristic = int(options.get("heuristic", weights_file is not None)) #Heuristic priors for new nodes
+    telemetry = int(options.get("telemetry", 0)) #Write search counters for every move to stderr
+    seed = int(options.get("seed", random.randrange(1 << 30))) #Random seed of the playouts
+
+    eprint("Running MONTE CARLO TREE SEARCH with", budget, "seconds per move")
+
+    if (workers > 1): eprint("Root parallelization with", workers, "processes")
+
+    if (heuristic == 1): eprint("Heuristic priors are ON with", weights_file or "default weights")
+
+    if (telemetry == 1): eprint("Telemetry is ON")
+
+    tree = None
+    connections = []
+    try:
+        while True: # This is the main loop
+            # Read in the current game status, for example:
+            # "SCORE 2 2" or "FINAL 33 31" if the game is over.
+            # The first number is the score for player 1 (dark), the second for player 2 (light)
+            next_input = input()
+            status, dark_score_s, light_score_s = next_input.strip().split()
+
+            if status == "FINAL": # Game is over.
+                break
+            board = to_bitboard(reader.read(input()))
+            if tree is None:    # the dimension is known from the first board on
+                n = board.dimension
+                tree = MonteCarloSearch(n, seed, get_evaluator(n, weights_file) if heuristic else None)
+                connections = start_workers(workers - 1, n, seed, (heuristic, weights_file))
+
+            start = time.perf_counter()
+            empties = board.dimension * board.dimension - popcount(board.dark | board.light)
+            move, playouts, visits = select_move(tree, board, color, budget, connections)
+            kept = tree.root.visits - tree.playouts    # playouts reused from the last move
+
+            if telemetry == 1: #one JSON line on stderr, before the move
+                stats = SearchStats(empties)
+                stats.start = start
+                stats.nodes = stats.leaves = playouts
+                index = move[0] * board.dimension + move[1]
+                emit(stats, color=color, empties=empties, mode="mcts", move=list(move), reused=kept,
+                     tree=tree.tree_size(), visits=visits.get(index, [0])[0],
+                     win_rate=round(visits[index][1] / visits[index][0], 3) if index in visits else None)
+            print("{} {}".format(move[0], move[1]))
+    finally:
+        for connection in connections:
+            connection.send(None)
+
+
+if __name__ == "__main__":
+    run_ai()
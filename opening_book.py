@@ -0,0 +1,207 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Opening book: the moves agent.py plays in the first plies of a game,
+searched once offline instead of at every game.
+
+A book file holds a header and fixed-width records of (position key, move)
+sorted by key. The header also holds a signature of the evaluation the book
+was searched with (book_signature): an agent scoring positions another way
+would not have chosen those moves, so it does not use the book. The key is the Zobrist hash of the discs combined with the
+player to move (transposition.node_key), so it is the same in every process
+and transpositions share one record. The agent memory-maps the file and
+finds a position with a binary search, without reading the whole file.
+
+To generate a book, every position the book's player can reach in the first
+<plies> plies is searched with select_move_alphabeta at depth <depth>.
+For each color, that covers every reply of the opponent but only the book
+move of the player itself:
+
+$python3 opening_book.py -d <dimension> -p <plies> -l <depth> [-j <jobs>] [-o <book file>]
+        [--heuristic --weights <file>]
+
+Then play with it using --book <book file> (and the same --heuristic and
+--weights).
+"""
+import sys, getopt
+import mmap
+import struct
+from concurrent.futures import ProcessPoolExecutor
+
+from othello_bitboard import BitBoard, get_possible_moves, play_move
+from othello_cache import signature
+from transposition import node_key
+
+MAGIC = b"OTHBOOK2"
+HEADER = struct.Struct("<8sHIQ")    # magic, dimension, number of records, evaluation signature
+RECORD = struct.Struct("<QH")       # position key, move (i * dimension + j)
+
+
+def start_position(dimension):
+    i = dimension // 2 - 1
+    n = dimension
+    dark = (1 << ((i + 1) * n + i)) | (1 << (i * n + i + 1))
+    light = (1 << (i * n + i)) | (1 << ((i + 1) * n + i + 1))
+    return BitBoard(n, dark, light)
+
+
+def position_key(board, player):
+    return node_key(board.zobrist, player, player)
+
+
+def book_signature(heuristic, weights_file = None):
+    """
+    Return the signature (see othello_cache.signature) of agent.py's
+    evaluation settings: the heuristic flag and the contents of the weights
+    file.
+    """
+    weights = None
+    if heuristic and weights_file is not None:
+        with open(weights_file, "rb") as f:
+            weights = f.read()
+    return signature("opening_book.py", heuristic, weights)
+
+
+class OpeningBook(object):
+    """
+    Read-only view of a book file. lookup(board, player) returns the book
+    move (i, j) for player on board, or None if the position is not in the
+    book. If settings (a book_signature) is given and the book was searched
+    with other settings, matches is False and lookup always returns None.
+    """
+
+    def __init__(self, filename, settings = None):
+        with open(filename, "rb") as f:
+            self.data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        if self.data[:len(MAGIC)] != MAGIC:
+            raise ValueError("{} is not an opening book (or was written by an older version)".format(filename))
+        magic, self.dimension, self.count, self.settings = HEADER.unpack_from(self.data, 0)
+        self.matches = settings is None or settings == self.settings
+
+    def lookup(self, board, player):
+        if not self.matches or len(board) != self.dimension:
+            return None
+        key = position_key(board, player)
+        low, high = 0, self.count
+        while low < high:
+            middle = (low + high) // 2
+            record_key, move = RECORD.unpack_from(self.data, HEADER.size + middle * RECORD.size)
+            if record_key < key:
+                low = middle + 1
+            elif record_key > key:
+                high = middle
+            else:
+                return divmod(move, self.dimension)
+        return None
+
+    def close(self):
+        self.data.close()
+
+
+def write_book(filename, dimension, entries, settings):
+    """
+    Write entries, a dict of position key -> (i, j) move, as a book file
+    searched with settings (a book_signature).
+    """
+    with open(filename, "wb") as f:
+        f.write(HEADER.pack(MAGIC, dimension, len(entries), settings))
+        for key in sorted(entries):
+            i, j = entries[key]
+            f.write(RECORD.pack(key, i * dimension + j))
+
+
+def search_position(task):
+    # Worker task: the book move for one position
+    import agent  # here, since agent imports this module
+    dimension, dark, light, player, depth, evaluation = task
+    agent.heuristic, agent.weights_file = evaluation
+    board = BitBoard(dimension, dark, light)
+    return agent.select_move_alphabeta(board, player, depth, caching=1, ordering=1, pvs=1)
+
+
+def generate_book(dimension, plies, depth, jobs = None, heuristic = 0, weights_file = None):
+    """
+    Search every position of the first plies plies that a book player can
+    meet and return a dict of position key -> move. The positions of each
+    ply are searched in parallel, up to jobs at a time, with agent.py's
+    heuristic setting and weights file.
+    """
+    entries = {}
+    # (board, player to move, color of the book player) for each ply
+    level = [(start_position(dimension), 1, 1), (start_position(dimension), 1, 2)]
+    with ProcessPoolExecutor(max_workers=jobs) as pool:
+        for ply in range(plies):
+            to_search = {}
+            for board, player, color in level:
+                key = position_key(board, player)
+                if player == color and key not in entries and get_possible_moves(board, player):
+                    to_search[key] = board, player
+            keys = list(to_search)
+            tasks = [(dimension, to_search[key][0].dark, to_search[key][0].light, to_search[key][1], depth,
+                      (heuristic, weights_file)) for key in keys]
+            for key, move in zip(keys, pool.map(search_position, tasks)):
+                entries[key] = move
+            print("Ply {}: {} positions searched, {} in book".format(ply + 1, len(keys), len(entries)))
+
+            next_level = {}
+            for board, player, color in level:
+                opponent = [1, 2][player == 1]
+                if player == color:
+                    moves = [entries.get(position_key(board, player))]
+                    if moves[0] is None:
+                        continue
+                else:
+                    moves = get_possible_moves(board, player)
+                for i, j in moves:
+                    child = play_move(board, player, i, j)
+                    next_level[(position_key(child, opponent), color)] = (child, opponent, color)
+            level = list(next_level.values())
+    return entries
+
+
+def main(argv):
+    usage = 'opening_book.py -d <dimension> -p <plies> -l <depth> [-j <jobs>] [-o <book file>] [--heuristic --weights <file>]'
+    dimension = 0
+    plies = 6
+    depth = 6
+    jobs = None
+    output = None
+    heuristic = 0
+    weights_file = None
+    try:
+        opts, args = getopt.getopt(argv, "hd:p:l:j:o:", ["heuristic", "weights="])
+    except getopt.GetoptError:
+        print(usage)
+        sys.exit(2)
+    for opt, arg in opts:
+        if opt == '-h':
+            print(usage)
+            sys.exit()
+        elif opt == "-d":
+            dimension = int(arg)
+        elif opt == "-p":
+            plies = int(arg)
+        elif opt == "-l":
+            depth = int(arg)
+        elif opt == "-j":
+            jobs = int(arg)
+        elif opt == "-o":
+            output = arg
+        elif opt == "--heuristic":
+            heuristic = 1
+        elif opt == "--weights":
+            weights_file = arg
+            heuristic = 1
+    if dimension <= 0:
+        print(usage)
+        sys.exit(2)
+    if output is None:
+        output = "book_{}.bin".format(dimension)
+
+    entries = generate_book(dimension, plies, depth, jobs, heuristic, weights_file)
+    write_book(output, dimension, entries, book_signature(heuristic, weights_file))
+    print("Wrote {} positions to {}".format(len(entries), output))
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -0,0 +1,240 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Benchmark suite for the board functions and the agent's search.
+
+  - perft: the number of move sequences of each length from the start
+    position, counted with othello_shared and othello_bitboard. The counts
+    must agree with each other (and, on 8x8, with the known values), so they
+    also check move generation.
+  - micro: time per call of find_lines, get_possible_moves, play_move and
+    get_score in both modules, on fixed positions.
+  - search: time of select_move_minimax and select_move_alphabeta in agent.py
+    on fixed positions, for each combination of caching and ordering.
+
+Results can be written as JSON (-o) and compared against an earlier result
+file (-b). A timing more than the threshold (-t, default 10%) slower than
+the baseline is reported as a regression, and a perft count that differs is
+an error; either makes the exit status 1.
+
+$python3 othello_benchmark.py [-d <dimensions, e.g. 4,6,8> -p <perft depth> -l <search depth>
+        -n <positions> -o <results.json> -b <baseline.json> -t <threshold>]
+"""
+import sys, getopt
+import json
+import platform
+import random
+import time
+
+import othello_shared
+import othello_bitboard
+import agent
+from opening_book import start_position
+
+BACKENDS = (("othello_shared", othello_shared), ("othello_bitboard", othello_bitboard))
+
+# Sequences of each length from the 8x8 start position. No game ends and no
+# side is out of moves this early, so they are the same with or without passes.
+KNOWN_PERFT_8 = [4, 12, 56, 244, 1396, 8200, 55092, 390216]
+
+
+def start_board(dimension):
+    return start_position(dimension).to_rows()
+
+
+def fixed_positions(dimension, count, seed = 0):
+    """
+    Return count (board, player) pairs from seeded random games, after about
+    a third of the squares are filled. The same seed gives the same positions.
+    """
+    rng = random.Random(seed * 100 + dimension)
+    positions = []
+    while len(positions) < count:
+        board, player = start_board(dimension), 1
+        for ply in range(dimension * dimension // 3):
+            moves = othello_bitboard.get_possible_moves(board, player)
+            if not moves:
+                break
+            board = othello_bitboard.play_move(board, player, *rng.choice(moves)).to_rows()
+            player = [1, 2][player == 1]
+        if othello_bitboard.get_possible_moves(board, player):
+            positions.append((board, player))
+    return positions
+
+
+def best_time(function, repeats):
+    best = float("inf")
+    for _ in range(repeats):
+        start = time.perf_counter()
+        function()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def perft(module, board, player, depth):
+    """
+    Count the move sequences of depth plies from board, with player to move.
+    A game that ends earlier counts as one sequence.
+    """
+    if depth == 0:
+        return 1
+    moves = module.get_possible_moves(board, player)
+    if not moves:
+        return 1
+    opponent = [1, 2][player == 1]
+    return sum(perft(module, module.play_move(board, player, i, j), opponent, depth - 1) for i, j in moves)
+
+
+def run_perft(dimensions, depth, repeats, results):
+    for dimension in dimensions:
+        board = start_board(dimension)
+        counts = {}
+        for name, module in BACKENDS:
+            counts[name] = [perft(module, board, 1, d) for d in range(1, depth + 1)]
+            results["timings"]["perft {}x{} depth {} {}".format(dimension, dimension, depth, name)] = \
+                best_time(lambda: perft(module, board, 1, depth), repeats)
+        results["perft"][str(dimension)] = counts["othello_bitboard"]
+        print("perft {}x{}: {}".format(dimension, dimension, counts["othello_bitboard"]))
+        if counts["othello_shared"] != counts["othello_bitboard"]:
+            results["errors"].append("perft {}x{}: othello_shared {} != othello_bitboard {}".format(
+                dimension, dimension, counts["othello_shared"], counts["othello_bitboard"]))
+        if dimension == 8 and counts["othello_bitboard"] != KNOWN_PERFT_8[:depth]:
+            results["errors"].append("perft 8x8: {} != known {}".format(counts["othello_bitboard"],
+                                                                        KNOWN_PERFT_8[:depth]))
+
+
+def run_micro(dimensions, count, repeats, results):
+    for dimension in dimensions:
+        positions = fixed_positions(dimension, count)
+        moves = [othello_shared.get_possible_moves(board, player)[0] for board, player in positions]
+        for name, module in BACKENDS:
+            # each module is timed on its own board type
+            cases = [(board if module is othello_shared else othello_bitboard.to_bitboard(board), player, move)
+                     for (board, player), move in zip(positions, moves)]
+            calls = {
+                "find_lines": lambda: [module.find_lines(board, i, j, player) for board, player, (i, j) in cases],
+                "get_possible_moves": lambda: [module.get_possible_moves(board, player) for board, player, _ in cases],
+                "play_move": lambda: [module.play_move(board, player, i, j) for board, player, (i, j) in cases],
+                "get_score": lambda: [module.get_score(board) for board, _, _ in cases]}
+            for function, call in calls.items():
+                key = "{}x{} {}.{} (us/call)".format(dimension, dimension, name, function)
+                results["timings"][key] = best_time(call, repeats) / len(cases) * 1e6
+                print("{}: {:.2f}".format(key, results["timings"][key]))
+
+
+def reset_agent():
+    # every search starts from an empty cache and no move ordering history
+    agent.transposition_table.clear()
+    agent.killer_moves.clear()
+    agent.history_scores.clear()
+
+
+def run_search(dimensions, depth, count, results):
+    for dimension in dimensions:
+        positions = fixed_positions(dimension, count, seed=1)
+        searches = [("minimax c{}".format(c), lambda board, player, c=c: agent.select_move_minimax(
+                        board, player, depth, c)) for c in (0, 1)]
+        searches += [("alphabeta c{} o{}".format(c, o), lambda board, player, c=c, o=o: agent.select_move_alphabeta(
+                         board, player, depth, c, o)) for c in (0, 1) for o in (0, 1)]
+        for name, search in searches:
+            if name.startswith("minimax") and depth > 4:
+                continue    # minimax at larger depths takes minutes
+            total = 0
+            for board, player in positions:
+                reset_agent()
+                start = time.perf_counter()
+                search(board, player)
+                total += time.perf_counter() - start
+            key = "search {}x{} depth {} {} (s)".format(dimension, dimension, depth, name)
+            results["timings"][key] = total
+            print("{}: {:.3f}".format(key, total))
+
+
+def compare(results, baseline, threshold):
+    """
+    Print the change of every timing against baseline and return the list
+    of regressions (timings more than threshold slower) and errors.
+    """
+    problems = list(results["errors"])
+    for dimension, counts in results["perft"].items():
+        expected = baseline.get("perft", {}).get(dimension)
+        if expected is not None:
+            length = min(len(counts), len(expected))
+            if counts[:length] != expected[:length]:
+                problems.append("perft {0}x{0}: {1} != baseline {2}".format(dimension, counts, expected))
+    for key, value in results["timings"].items():
+        old = baseline.get("timings", {}).get(key)
+        if not old:
+            continue
+        change = value / old - 1
+        flag = ""
+        if change > threshold:
+            flag = "  REGRESSION"
+            problems.append("{}: {:+.1%}".format(key, change))
+        print("{:<70} {:>10.4f} {:>10.4f} {:>+8.1%}{}".format(key, old, value, change, flag))
+    return problems
+
+
+def main(argv):
+    usage = ('othello_benchmark.py [-d <dimensions, e.g. 4,6,8> -p <perft depth> -l <search depth> '
+             '-n <positions> -o <results.json> -b <baseline.json> -t <threshold>]')
+    dimensions = [4, 6, 8]
+    perft_depth = 5
+    search_depth = 4
+    count = 20
+    repeats = 3
+    output = None
+    baseline_file = None
+    threshold = 0.10
+    try:
+        opts, args = getopt.getopt(argv, "hd:p:l:n:o:b:t:")
+    except getopt.GetoptError:
+        print(usage)
+        sys.exit(2)
+    for opt, arg in opts:
+        if opt == '-h':
+            print(usage)
+            sys.exit()
+        elif opt == "-d":
+            dimensions = [int(x) for x in arg.split(",")]
+        elif opt == "-p":
+            perft_depth = int(arg)
+        elif opt == "-l":
+            search_depth = int(arg)
+        elif opt == "-n":
+            count = int(arg)
+        elif opt == "-o":
+            output = arg
+        elif opt == "-b":
+            baseline_file = arg
+        elif opt == "-t":
+            threshold = float(arg)
+
+    results = {"python": platform.python_version(), "machine": platform.machine(),
+               "settings": {"dimensions": dimensions, "perft_depth": perft_depth,
+                            "search_depth": search_depth, "positions": count},
+               "perft": {}, "timings": {}, "errors": []}
+    run_perft(dimensions, perft_depth, repeats, results)
+    run_micro(dimensions, count, repeats, results)
+    run_search(dimensions, search_depth, max(1, count // 4), results)
+
+    if output:
+        with open(output, "w") as f:
+            json.dump(results, f, indent=1)
+    problems = results["errors"]
+    if baseline_file:
+        with open(baseline_file) as f:
+            baseline = json.load(f)
+        if baseline.get("settings") != results["settings"]:
+            print("Warning: the baseline was run with different settings: {}".format(baseline.get("settings")))
+        print()
+        print("{:<70} {:>10} {:>10} {:>8}".format("", "baseline", "now", "change"))
+        problems = compare(results, baseline, threshold)
+    for problem in problems:
+        print(problem)
+    if problems:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -0,0 +1,373 @@
+"""
+Bitboard backend for the functions in othello_shared.
+
+Each color is stored as a single integer mask with one bit per square, so
+legal moves and flips are computed with shifts and masks instead of walking
+the board cell by cell. Python integers are unbounded, so any dimension
+works without special cases.
+
+The functions below have the same names and signatures as the ones in
+othello_shared, and accept a tuple/list board, a BitBoard or a SearchBoard.
+Agents can switch backends by changing their import line only.
+
+Square (i, j) -- column i, row j, i.e. board[j][i] -- is stored at bit
+i * n + j. With this layout, visiting the set bits of a mask from the lowest
+to the highest gives the same (column, row) order as othello_shared.
+
+Both board classes also carry a Zobrist hash of their discs, which is
+updated incrementally as moves are played and is used as the key of the
+transposition table.
+"""
+import random
+
+ZOBRIST_SEED = 0x0DDBA11
+
+_geometry_cache = {}
+_zobrist_cache = {}
+
+
+def get_geometry(n):
+    """
+    Return the precomputed masks for an n x n board as a tuple
+    (full, directions), where directions is a list of (shift, mask) pairs in
+    the same order as the directions in othello_shared.find_lines.
+    A positive shift moves bits up, a negative one moves them down. The mask
+    clears the bits that wrapped around to the next column.
+    """
+    if n not in _geometry_cache:
+        full = (1 << (n * n)) - 1
+        first_row = 0    # j == 0 in every column
+        last_row = 0     # j == n - 1 in every column
+        for i in range(n):
+            first_row |= 1 << (i * n)
+            last_row |= 1 << (i * n + n - 1)
+        not_first = full & ~first_row
+        not_last = full & ~last_row
+        directions = [(1, not_first),          # j + 1
+                      (n + 1, not_first),      # i + 1, j + 1
+                      (n, full),               # i + 1
+                      (n - 1, not_last),       # i + 1, j - 1
+                      (-1, not_last),          # j - 1
+                      (-(n + 1), not_last),    # i - 1, j - 1
+                      (-n, full),              # i - 1
+                      (-(n - 1), not_first)]   # i - 1, j + 1
+        _geometry_cache[n] = (full, directions)
+    return _geometry_cache[n]
+
+
+def zobrist_keys(n):
+    """
+    Return the Zobrist keys for an n x n board as (dark, light, flip), three
+    lists indexed by bit index. flip[k] is dark[k] ^ light[k], i.e. the
+    change in hash when the disc on square k changes color. The keys are
+    63-bit and drawn from a fixed seed, so hashes are the same in every
+    process.
+    """
+    if n not in _zobrist_cache:
+        rng = random.Random(ZOBRIST_SEED * 1000 + n)
+        dark = [rng.getrandbits(63) for _ in range(n * n)]
+        light = [rng.getrandbits(63) for _ in range(n * n)]
+        flip = [d ^ l for d, l in zip(dark, light)]
+        _zobrist_cache[n] = (dark, light, flip)
+    return _zobrist_cache[n]
+
+
+def compute_zobrist(n, dark, light):
+    dark_keys, light_keys, _ = zobrist_keys(n)
+    h = 0
+    for index in iter_bits(dark):
+        h ^= dark_keys[index]
+    for index in iter_bits(light):
+        h ^= light_keys[index]
+    return h
+
+
+def update_zobrist(n, h, player, index, flips):
+    """
+    Return hash h after player places a disc on index and flips the discs
+    in the flips mask.
+    """
+    dark_keys, light_keys, flip_keys = zobrist_keys(n)
+    h ^= dark_keys[index] if player == 1 else light_keys[index]
+    while flips:
+        low = flips & -flips
+        h ^= flip_keys[low.bit_length() - 1]
+        flips ^= low
+    return h
+
+
+def shift(x, amount, mask):
+    if amount > 0:
+        return (x << amount) & mask
+    return (x >> -amount) & mask
+
+
+def popcount(x):
+    return bin(x).count("1")
+
+
+def iter_bits(mask):
+    """
+    Yield the index of every set bit of mask, lowest first.
+    """
+    while mask:
+        low = mask & -mask
+        yield low.bit_length() - 1
+        mask ^= low
+
+
+def moves_mask(n, own, opp):
+    """
+    Return the mask of empty squares where the owner of own can play.
+    """
+    full, directions = get_geometry(n)
+    empty = full & ~(own | opp)
+    moves = 0
+    for amount, mask in directions:
+        x = shift(own, amount, mask) & opp
+        while x:
+            step = shift(x, amount, mask)
+            moves |= step & empty
+            x = step & opp
+    return moves
+
+
+def flips_mask(n, own, opp, index):
+    """
+    Return the mask of discs captured when the owner of own plays on the
+    square with bit index. The result is 0 if the move is not legal.
+    """
+    _, directions = get_geometry(n)
+    move = 1 << index
+    flips = 0
+    for amount, mask in directions:
+        line = 0
+        x = shift(move, amount, mask)
+        while x & opp:
+            line |= x
+            x = shift(x, amount, mask)
+        if x & own:
+            flips |= line
+    return flips
+
+
+class BitBoard(object):
+    """
+    Immutable board stored as one mask per color.
+
+    A BitBoard can be indexed like the tuple of tuples used elsewhere
+    (len(board), board[j][i]), so heuristics written for tuple boards keep
+    working. Rows are only built the first time they are needed. Hashing and
+    equality use the two masks, which is much cheaper than hashing nested
+    tuples.
+    """
+
+    __slots__ = ("dimension", "dark", "light", "zobrist", "_rows")
+
+    def __init__(self, dimension, dark, light, zobrist = None):
+        self.dimension = dimension
+        self.dark = dark
+        self.light = light
+        if zobrist is None:
+            zobrist = compute_zobrist(dimension, dark, light)
+        self.zobrist = zobrist
+        self._rows = None
+
+    @classmethod
+    def from_rows(cls, board):
+        n = len(board)
+        dark = 0
+        light = 0
+        for j, row in enumerate(board):
+            for i, square in enumerate(row):
+                if square == 1:
+                    dark |= 1 << (i * n + j)
+                elif square == 2:
+                    light |= 1 << (i * n + j)
+        return cls(n, dark, light)
+
+    def masks(self, player):
+        """
+        Return (own, opp) masks for player (1 for dark, 2 for light).
+        """
+        if player == 1:
+            return self.dark, self.light
+        return self.light, self.dark
+
+    def to_rows(self):
+        if self._rows is None:
+            n = self.dimension
+            rows = []
+            for j in range(n):
+                row = []
+                for i in range(n):
+                    bit = 1 << (i * n + j)
+                    if self.dark & bit:
+                        row.append(1)
+                    elif self.light & bit:
+                        row.append(2)
+                    else:
+                        row.append(0)
+                rows.append(tuple(row))
+            self._rows = tuple(rows)
+        return self._rows
+
+    def __len__(self):
+        return self.dimension
+
+    def __getitem__(self, j):
+        return self.to_rows()[j]
+
+    def __iter__(self):
+        return iter(self.to_rows())
+
+    def __eq__(self, other):
+        if isinstance(other, BitBoard):
+            return (self.dimension == other.dimension and
+                    self.dark == other.dark and self.light == other.light)
+        return NotImplemented
+
+    def __hash__(self):
+        return self.zobrist
+
+    def __repr__(self):
+        return repr(self.to_rows())
+
+
+def to_bitboard(board):
+    if isinstance(board, (BitBoard, SearchBoard)):
+        return board
+    return BitBoard.from_rows(board)
+
+
+def find_lines(board, i, j, player):
+    """
+    Find all the uninterupted lines of stones that would be captured if player
+    plays column i and row j.
+    """
+    board = to_bitboard(board)
+    n = board.dimension
+    own, opp = board.masks(player)
+    _, directions = get_geometry(n)
+    lines = []
+    for amount, mask in directions:
+        line = []
+        x = shift(1 << (i * n + j), amount, mask)
+        while x & opp:
+            index = x.bit_length() - 1
+            line.append((index // n, index % n))
+            x = shift(x, amount, mask)
+        if x & own and line:
+            lines.append(line)
+    return lines
+
+
+def get_possible_moves(board, player):
+    """
+    Return a list of all possible (column,row) tuples that player can play on
+    the current board.
+    """
+    board = to_bitboard(board)
+    n = board.dimension
+    own, opp = board.masks(player)
+    return [divmod(index, n) for index in iter_bits(moves_mask(n, own, opp))]
+
+
+def play_move(board, player, i, j):
+    board = to_bitboard(board)
+    n = board.dimension
+    own, opp = board.masks(player)
+    move = 1 << (i * n + j)
+    flips = flips_mask(n, own, opp, i * n + j)
+    own |= move | flips
+    opp &= ~flips
+    zobrist = update_zobrist(n, board.zobrist, player, i * n + j, flips)
+    if player == 1:
+        return BitBoard(n, own, opp, zobrist)
+    return BitBoard(n, opp, own, zobrist)
+
+
+def get_score(board):
+    board = to_bitboard(board)
+    return popcount(board.dark), popcount(board.light)
+
+
+class SearchBoard(object):
+    """
+    Mutable board for search. make_move applies a move in place and returns
+    the mask of flipped discs; undo_move takes that mask back and restores
+    exactly the squares that changed, so a search can walk the tree without
+    allocating a new board at every node. The Zobrist hash is kept up to
+    date by both.
+
+    state, if set, is an object with play(player, index, flips) and
+    undo(player, index, flips) methods (e.g. othello_patterns.PatternState),
+    which make_move and undo_move call to keep it up to date as well.
+    """
+
+    __slots__ = ("dimension", "dark", "light", "zobrist", "state")
+
+    def __init__(self, dimension, dark, light, zobrist = None):
+        self.dimension = dimension
+        self.dark = dark
+        self.light = light
+        if zobrist is None:
+            zobrist = compute_zobrist(dimension, dark, light)
+        self.zobrist = zobrist
+        self.state = None
+
+    @classmethod
+    def from_board(cls, board):
+        board = to_bitboard(board)
+        return cls(board.dimension, board.dark, board.light, board.zobrist)
+
+    def masks(self, player):
+        if player == 1:
+            return self.dark, self.light
+        return self.light, self.dark
+
+    def to_bitboard(self):
+        return BitBoard(self.dimension, self.dark, self.light, self.zobrist)
+
+    def count_empty(self):
+        return self.dimension * self.dimension - popcount(self.dark | self.light)
+
+    def get_possible_moves(self, player):
+        n = self.dimension
+        if player == 1:
+            moves = moves_mask(n, self.dark, self.light)
+        else:
+            moves = moves_mask(n, self.light, self.dark)
+        return [divmod(index, n) for index in iter_bits(moves)]
+
+    def make_move(self, player, i, j):
+        n = self.dimension
+        index = i * n + j
+        if player == 1:
+            flips = flips_mask(n, self.dark, self.light, index)
+            self.dark |= (1 << index) | flips
+            self.light ^= flips
+        else:
+            flips = flips_mask(n, self.light, self.dark, index)
+            self.light |= (1 << index) | flips
+            self.dark ^= flips
+        self.zobrist = update_zobrist(n, self.zobrist, player, index, flips)
+        if self.state is not None:
+            self.state.play(player, index, flips)
+        return flips
+
+    def undo_move(self, player, i, j, flips):
+        index = i * self.dimension + j
+        move = 1 << index
+        if player == 1:
+            self.dark ^= move | flips
+            self.light |= flips
+        else:
+            self.light ^= move | flips
+            self.dark |= flips
+        self.zobrist = update_zobrist(self.dimension, self.zobrist, player, index, flips)
+        if self.state is not None:
+            self.state.undo(player, index, flips)
+
+    def get_score(self):
+        return popcount(self.dark), popcount(self.light)
@@ -0,0 +1,171 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Persistent search cache: transposition table entries kept in a file from
+one game to the next, so an agent does not search the same opening and
+middle game positions again in every game of a tournament.
+
+A cache file holds a header and fixed-width records of (key, value, depth,
+flag, move), the fields of a transposition table entry (see
+transposition.py), deepest first. The header records the board dimension
+and a signature of the agent's evaluation settings (see signature): values
+found with another heuristic or other weights are not comparable, so a file
+written with other settings is ignored when loading and replaced when
+saving.
+
+An agent calls load_cache when it gets its first board: the file is
+memory-mapped and its entries are stored into the table. At the end of the
+game (FINAL) it calls save_cache, which merges the table's entries searched
+to at least MIN_DEPTH into the file and keeps the deepest ones up to a
+maximum number of entries. The merge holds a lock on <file>.lock (flock, or
+msvcrt.locking on Windows), so agents playing at the same time (both
+colors, or parallel tournament games) can share a file, and the new file is
+renamed into place, so a reader never sees half of it.
+
+$python3 othello_cache.py <cache file>
+prints the number of entries per depth.
+"""
+import sys, getopt
+import collections
+import hashlib
+import heapq
+import mmap
+import os
+import struct
+
+try:
+    import fcntl
+except ImportError:     # Windows
+    fcntl = None
+    import msvcrt
+
+MAGIC = b"OTHCACH1"
+HEADER = struct.Struct("<8sHIQ")    # magic, dimension, number of records, settings signature
+RECORD = struct.Struct("<qdhbh")    # key, value, depth, flag, move
+DEFAULT_ENTRIES = 200000
+MIN_DEPTH = 2   # shallower entries are cheap to search again and not worth the space
+
+
+def signature(*settings):
+    """
+    Return a 64-bit signature of the evaluation settings (any values with a
+    stable repr, e.g. the heuristic flag and the weights file contents).
+    """
+    return int.from_bytes(hashlib.blake2b(repr(settings).encode(), digest_size=8).digest(), "little")
+
+
+def lock_file(f):
+    """
+    Wait for an exclusive lock on the open file f, released by unlock_file
+    (or when f is closed).
+    """
+    if fcntl is not None:
+        fcntl.flock(f, fcntl.LOCK_EX)
+        return
+    f.seek(0)
+    while True:
+        try:
+            msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)   # first byte; the file may be empty
+            return
+        except OSError:     # LK_LOCK gives up after 10 tries, one second apart
+            pass
+
+
+def unlock_file(f):
+    if fcntl is not None:
+        fcntl.flock(f, fcntl.LOCK_UN)
+    else:
+        f.seek(0)
+        msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+
+
+def read_cache(filename, dimension = None, settings = None):
+    """
+    Return (dimension, signature, entries) of a cache file, entries a list
+    of (key, depth, flag, value, move). If the file does not exist or was
+    written for another dimension or settings signature (when given), the
+    list is empty.
+    """
+    if not os.path.exists(filename) or os.path.getsize(filename) < HEADER.size:
+        return dimension, settings, []
+    with open(filename, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+        magic, file_dimension, count, file_signature = HEADER.unpack_from(data, 0)
+        if magic != MAGIC:
+            raise ValueError("{} is not a cache file".format(filename))
+        if (dimension is not None and file_dimension != dimension) or \
+                (settings is not None and file_signature != settings):
+            return dimension, settings, []
+        count = min(count, (len(data) - HEADER.size) // RECORD.size)
+        entries = [(key, depth, flag, value, move) for key, value, depth, flag, move in
+                   (RECORD.unpack_from(data, HEADER.size + k * RECORD.size) for k in range(count))]
+    return file_dimension, file_signature, entries
+
+
+def load_cache(table, filename, dimension, settings):
+    """
+    Store the entries of the cache file into table (a TranspositionTable
+    or SharedTranspositionTable). Returns the number of entries read, 0 if
+    there is no file for this dimension and settings signature.
+    """
+    with open(filename + ".lock", "w") as lock:  # Windows cannot replace a file another process has open
+        lock_file(lock)
+        try:
+            entries = read_cache(filename, dimension, settings)[2]
+        finally:
+            unlock_file(lock)
+    for key, depth, flag, value, move in entries:   # deepest first, so they win the slots they share
+        table.store(key, depth, flag, value, move)
+    return len(entries)
+
+
+def save_cache(table, filename, dimension, settings, max_entries = DEFAULT_ENTRIES, min_depth = MIN_DEPTH):
+    """
+    Merge the entries of table searched to at least min_depth into the
+    cache file, keeping the deeper entry for a key found in both and the
+    max_entries deepest entries overall. Returns the number of entries
+    written.
+    """
+    with open(filename + ".lock", "w") as lock:
+        lock_file(lock)
+        try:
+            merged = {}     # key -> (depth, flag, value, move)
+            for key, depth, flag, value, move in read_cache(filename, dimension, settings)[2]:
+                merged[key] = (depth, flag, value, move)
+            for key, depth, flag, value, move in table.entries(min_depth):
+                old = merged.get(key)
+                if old is None or depth >= old[0]:
+                    merged[key] = (depth, flag, value, move)
+            kept = heapq.nlargest(max_entries, merged.items(), key=lambda item: item[1][0])
+            with open(filename + ".tmp", "wb") as f:
+                f.write(HEADER.pack(MAGIC, dimension, len(kept), settings))
+                f.write(b"".join(RECORD.pack(key, value, depth, flag, move)
+                                 for key, (depth, flag, value, move) in kept))
+            os.replace(filename + ".tmp", filename)
+        finally:
+            unlock_file(lock)
+    return len(kept)
+
+
+def main(argv):
+    usage = 'othello_cache.py <cache file>'
+    try:
+        opts, args = getopt.getopt(argv, "h")
+    except getopt.GetoptError:
+        print(usage)
+        sys.exit(2)
+    for opt, arg in opts:
+        if opt == '-h':
+            print(usage)
+            sys.exit()
+    if len(args) != 1:
+        print(usage)
+        sys.exit(2)
+    dimension, settings, entries = read_cache(args[0])
+    print("{}x{} cache, settings {:016x}, {} entries".format(dimension, dimension, settings or 0, len(entries)))
+    depths = collections.Counter(depth for key, depth, flag, value, move in entries)
+    for depth in sorted(depths):
+        print("depth {}: {}".format(depth, depths[depth]))
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
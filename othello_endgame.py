@@ -0,0 +1,195 @@
+"""
+Exact endgame solver for the last empty squares.
+
+The solver searches to the end of the game and scores positions by the
+final disc differential, like compute_utility in the agents. As everywhere
+in this project there are no passes: the game ends as soon as the player to
+move has no legal move.
+
+It works directly on the two bit masks of othello_bitboard (negamax over
+(own, opp) pairs, no board objects), and orders moves by
+  - fastest first: moves that leave the opponent the fewest replies, while
+    more than FASTEST_FIRST_EMPTIES squares are empty;
+  - parity: moves in a region (board quadrant) with an odd number of empty
+    squares first, so we tend to get the last move in each region.
+Positions with more than TABLE_EMPTIES empty squares keep their bounds and
+best move in a table for the duration of one solve.
+
+With wld=True, the solver only finds out whether the game is won, lost or
+drawn (a null-window search around 0), which is much faster than the exact
+score.
+"""
+import time
+
+from othello_bitboard import get_geometry, moves_mask, flips_mask, iter_bits, popcount, to_bitboard
+
+FASTEST_FIRST_EMPTIES = 5
+TABLE_EMPTIES = 5
+
+solver_deadline = None  # time.perf_counter() value at which a solve gives up
+solver_nodes = 0
+_region_cache = {}
+
+
+class SolverTimeout(Exception):
+    pass
+
+
+def get_regions(n):
+    """
+    Return the parity regions of an n x n board: the masks of its four
+    quadrants.
+    """
+    if n not in _region_cache:
+        half = n // 2
+        regions = [0, 0, 0, 0]
+        for i in range(n):
+            for j in range(n):
+                regions[(i >= half) * 2 + (j >= half)] |= 1 << (i * n + j)
+        _region_cache[n] = [region for region in regions if region]
+    return _region_cache[n]
+
+
+def order_moves(n, own, opp, moves, empty, empties, hash_move):
+    """
+    Return the bit indices of moves in search order: hash_move, then fastest
+    first (while more than FASTEST_FIRST_EMPTIES squares are empty, near
+    the root, where counting the replies pays off), then odd parity regions
+    first (the only key closer to the leaves).
+    """
+    odd = 0
+    for region in get_regions(n):
+        if popcount(empty & region) & 1:
+            odd |= region
+    if empties <= FASTEST_FIRST_EMPTIES:
+        ordered = list(iter_bits(moves & odd)) + list(iter_bits(moves & ~odd))
+    else:
+        keyed = []
+        for index in iter_bits(moves):
+            flips = flips_mask(n, own, opp, index)
+            replies = popcount(moves_mask(n, opp & ~flips, own | flips | (1 << index)))
+            keyed.append((replies, not (odd >> index) & 1, index))
+        keyed.sort()
+        ordered = [index for _, _, index in keyed]
+    if hash_move is not None and hash_move in ordered:
+        ordered.remove(hash_move)
+        ordered.insert(0, hash_move)
+    return ordered
+
+
+def solve_node(n, own, opp, alpha, beta, empties, table):
+    """
+    Negamax value (final disc differential for the player to move, whose
+    discs are own) of the position, fail-soft within (alpha, beta).
+    """
+    global solver_nodes
+    moves = moves_mask(n, own, opp)
+    if not moves:   # no passes: the game is over
+        return popcount(own) - popcount(opp)
+    solver_nodes += 1
+    if solver_deadline is not None and solver_nodes & 1023 == 0 and time.perf_counter() > solver_deadline:
+        raise SolverTimeout
+
+    if empties == 1:    # the only empty square is the move
+        flips = flips_mask(n, own, opp, moves.bit_length() - 1)
+        return -(popcount(opp & ~flips) - popcount(own | flips) - 1)
+
+    hash_move = None
+    if empties > TABLE_EMPTIES:
+        entry = table.get((own, opp))
+        if entry is not None:
+            lower, upper, hash_move = entry
+            if lower >= beta:
+                return lower
+            if upper <= alpha:
+                return upper
+            alpha = max(alpha, lower)
+            beta = min(beta, upper)
+
+    full, _ = get_geometry(n)
+    empty = full & ~(own | opp)
+    alpha_orig = alpha
+    best_value = -n * n - 1
+    best_move = None
+    for index in order_moves(n, own, opp, moves, empty, empties, hash_move):
+        flips = flips_mask(n, own, opp, index)
+        new_own = opp & ~flips
+        new_opp = own | flips | (1 << index)
+        if best_move is None:
+            value = -solve_node(n, new_own, new_opp, -beta, -alpha, empties - 1, table)
+        else:
+            # null window first: does this move beat the best one so far?
+            value = -solve_node(n, new_own, new_opp, -alpha - 1, -alpha, empties - 1, table)
+            if alpha < value < beta:
+                value = -solve_node(n, new_own, new_opp, -beta, -value, empties - 1, table)
+        if value > best_value:
+            best_value, best_move = value, index
+            if value > alpha:
+                alpha = value
+                if alpha >= beta:
+                    break
+
+    if empties > TABLE_EMPTIES:
+        lower, upper = -n * n, n * n
+        if best_value > alpha_orig:
+            lower = best_value
+        if best_value < beta:
+            upper = best_value
+        table[(own, opp)] = (lower, upper, best_move)
+    return best_value
+
+
+def solve(board, color, wld = False, deadline = None):
+    """
+    Solve board for color (who is to move). Returns (move, value): the best
+    move and the final disc differential for color with perfect play. With
+    wld, value is only 1, 0 or -1 for a win, draw or loss, and move is a
+    move that achieves it.
+
+    If deadline (a time.perf_counter() value) passes, returns the best move
+    among the ones solved so far, or (first move in search order, None) if
+    none was.
+    """
+    global solver_deadline, solver_nodes
+    board = to_bitboard(board)
+    n = board.dimension
+    own, opp = board.masks(color)
+    moves = moves_mask(n, own, opp)
+    if not moves:
+        return None, popcount(own) - popcount(opp)
+    full, _ = get_geometry(n)
+    empty = full & ~(own | opp)
+    empties = popcount(empty)
+    if wld:
+        alpha, beta = -1, 1
+    else:
+        alpha, beta = -n * n - 1, n * n + 1
+    table = {}
+    best_move, best_value = None, -n * n - 1
+    ordered = order_moves(n, own, opp, moves, empty, empties, None)
+    solver_deadline = deadline
+    solver_nodes = 0
+    try:
+        for index in ordered:
+            flips = flips_mask(n, own, opp, index)
+            new_own = opp & ~flips
+            new_opp = own | flips | (1 << index)
+            if best_move is None:
+                value = -solve_node(n, new_own, new_opp, -beta, -alpha, empties - 1, table)
+            else:
+                value = -solve_node(n, new_own, new_opp, -alpha - 1, -alpha, empties - 1, table)
+                if alpha < value < beta:
+                    value = -solve_node(n, new_own, new_opp, -beta, -value, empties - 1, table)
+            if value > best_value:
+                best_value, best_move = value, index
+                alpha = max(alpha, value)
+                if alpha >= beta:
+                    break
+    except SolverTimeout:
+        if best_move is None:
+            return divmod(ordered[0], n), None
+    finally:
+        solver_deadline = None
+    if wld:
+        best_value = (best_value > 0) - (best_value < 0)
+    return divmod(best_move, n), best_value
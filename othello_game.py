@@ -6,10 +6,14 @@ players.
 
 Thanks to original author Daniel Bauer, Columbia University
 """
+import os
 import sys
 import subprocess
-from threading import Timer
+import time
+from threading import Thread, Timer
 from othello_shared import find_lines, get_possible_moves, play_move, get_score
+import othello_protocol
+import othello_telemetry
 
 class InvalidMoveError(RuntimeError):
     pass
@@ -19,6 +23,18 @@ class AiTimeoutError(RuntimeError):
     pass
 
 
+def check_options(options):
+    """
+    Raise ValueError if an option would not survive the handshake line,
+    which separates the options with commas and the key from the value
+    with the first "=" (e.g. a file path with a comma in it).
+    """
+    for key, value in (options or {}).items():
+        if any(c in str(key) for c in ",=\n") or any(c in str(value) for c in ",\n"):
+            raise ValueError("option {}={!r}: keys cannot contain ',', '=' or newlines, "
+                             "values cannot contain ',' or newlines".format(key, value))
+
+
 class Player(object):
     def __init__(self, color, name="Human"):
         self.name = name
@@ -30,8 +46,14 @@ class Player(object):
 class AiPlayerInterface(Player):
 
     TIMEOUT = 10
+    EXIT_TIMEOUT = 5 # Seconds an agent gets to exit after FINAL before it is killed
+    PROFILE_SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "othello_profile.py")
+
+    def __init__(self, filename, color, limit, minimax = False, caching = False, ordering = False, options = None,
+                 interpreter = "py", stderr = None, protocol = None, delta = True,
+                 profiler = None, profile_file = None, profile_threshold = 0):
 
-    def __init__(self, filename, color, limit, minimax = False, caching = False, ordering = False):
+        check_options(options)
 
         #convert params to numbers
         m = 0
@@ -42,17 +64,66 @@ class AiPlayerInterface(Player):
         if ordering == True: o = 1
 
         self.color = color
-        # Change py to python3 or python
-        self.process = subprocess.Popen(['py',filename], stdin=subprocess.PIPE, stdout=subprocess.PIPE)
-        name = self.process.stdout.readline().decode("ASCII").strip()
+        # With the telemetry option, the agent writes a record of its search
+        # for every move to stderr. They are collected in self.telemetry and
+        # its other stderr output goes where stderr says.
+        self.telemetry = None
+        self.stderr_reader = None
+        if options and options.get("telemetry"):
+            self.telemetry = []
+            self.stderr_target = stderr
+            stderr = subprocess.PIPE
+        # With a profiler ("cprofile" or "sample"), the agent runs under
+        # othello_profile.py, which writes the profile to profile_file
+        self.profiler = profiler
+        command = [interpreter, filename]
+        if profiler is not None:
+            command = [interpreter, self.PROFILE_SCRIPT, "-p", profiler, "-t", str(profile_threshold),
+                       "-o", profile_file, filename]
+        # Change py to python3 or python (or pass interpreter, e.g. sys.executable)
+        self.process = subprocess.Popen(command, stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=stderr)
+        if self.telemetry is not None:
+            self.stderr_reader = Thread(target=self.read_stderr, daemon=True)
+            self.stderr_reader.start()
+        name, protocols = othello_protocol.parse_intro(self.process.stdout.readline().decode("ASCII"))
         print("AI introduced itself as: {}".format(name))
         self.name = name
-        self.process.stdin.write((str(color) + "," + str(limit) + "," + str(m) + "," + str(c) + "," + str(o) + "\n").encode("ASCII"))
+        # Use the newest board protocol both sides know, unless one is forced
+        if protocol is None:
+            # text if the agent only lists protocols the manager does not know
+            protocol = max(set(protocols) & set(othello_protocol.SUPPORTED), default=othello_protocol.TEXT)
+        self.protocol = protocol
+        self.delta = delta and protocol == othello_protocol.PACKED
+        self.sent_moves = None # Length of manager.moves when the last board was sent
+        options = dict(options or {})
+        if protocol != othello_protocol.TEXT:
+            options["protocol"] = protocol
+            if self.delta: options["delta"] = 1
+        # Extra settings are sent after the five standard fields as key=value
+        # pairs. Agents that do not know about them only read the first five.
+        extra = ""
+        if options:
+            extra = "".join(",{}={}".format(k, v) for k, v in sorted(options.items()))
+        self.process.stdin.write((str(color) + "," + str(limit) + "," + str(m) + "," + str(c) + "," + str(o) + extra + "\n").encode("ASCII"))
         self.process.stdin.flush()
 
+    def read_stderr(self):
+        for line in self.process.stderr:
+            line = line.decode("utf-8", "replace")
+            record = othello_telemetry.parse_line(line)
+            if record is not None:
+                self.telemetry.append(record)
+            elif self.stderr_target is None:
+                sys.stderr.write(line)
+            elif self.stderr_target != subprocess.DEVNULL:
+                self.stderr_target.write(line)
+
     def timeout(self):
         sys.stderr.write("{} timed out.".format(self.name))
-        self.process.kill()
+        if self.profiler is not None:
+            self.process.terminate() # lets the profiler write out the slow move
+        else:
+            self.process.kill()
         self.timed_out = True
 
     def get_move(self, manager):
@@ -60,7 +131,7 @@ class AiPlayerInterface(Player):
         print((white_score, dark_score))
         self.process.stdin.write("SCORE {} {}\n".format(white_score, dark_score).encode("ASCII"))
         self.process.stdin.flush()
-        self.process.stdin.write("{}\n".format(str(manager.board)).encode("ASCII"))
+        self.process.stdin.write("{}\n".format(self.encode_board(manager)).encode("ASCII"))
         self.process.stdin.flush()
 
         timer = Timer(AiPlayerInterface.TIMEOUT, lambda: self.timeout())
@@ -77,10 +148,37 @@ class AiPlayerInterface(Player):
         j = int(j_s)
         return i,j
 
+    def encode_board(self, manager):
+        """
+        Return the board line for this turn in the negotiated protocol. With
+        deltas, the full board is sent on the first turn only; after that the
+        player gets the moves made since its previous turn.
+        """
+        if self.protocol == othello_protocol.TEXT:
+            return str(manager.board)
+        moves = manager.moves
+        if self.delta and self.sent_moves is not None:
+            line = othello_protocol.encode_moves(moves[self.sent_moves:])
+        else:
+            line = othello_protocol.encode_board(manager.board)
+        self.sent_moves = len(moves)
+        return line
+
     def kill(self,manager):
         white_score, dark_score = get_score(manager.board)
-        self.process.stdin.write("FINAL {} {}\n".format(white_score, dark_score).encode("ASCII"))
-        self.process.kill()
+        # Agents exit after FINAL (a profiled one writes its profile first);
+        # one that does not is killed after EXIT_TIMEOUT seconds
+        try:
+            self.process.stdin.write("FINAL {} {}\n".format(white_score, dark_score).encode("ASCII"))
+            self.process.stdin.close()
+        except OSError: # it has already exited
+            pass
+        try:
+            self.process.wait(self.EXIT_TIMEOUT)
+        except subprocess.TimeoutExpired:
+            self.process.kill()
+        if self.stderr_reader is not None:
+            self.stderr_reader.join(1) # the records already written are still in the pipe
 
 
 class OthelloGameManager(object):
@@ -90,6 +188,7 @@ class OthelloGameManager(object):
         self.dimension = dimension
         self.board = self.create_initial_board()
         self.current_player = 1
+        self.moves = [] # (player, i, j) of every move played so far
 
     def create_initial_board(self):
         board = []
@@ -122,12 +221,19 @@ class OthelloGameManager(object):
            raise InvalidMoveError("Invalid Move.")
 
         self.board = play_move(self.board, self.current_player, i, j)
+        self.moves.append((self.current_player, i, j))
         self.current_player = 1 if self.current_player == 2 else 2
 
     def get_possible_moves(self):
         return get_possible_moves(self.board, self.current_player)
 
-def play_game(game, player1, player2):
+def play_game(game, player1, player2, on_move = None):
+    """
+    Play game to the end. Returns (dark score, light score, timed_out), where
+    timed_out is the color of the player that timed out (and lost), or None.
+    If given, on_move(color, (i, j), seconds) is called after every move
+    with the time the player took to choose it.
+    """
 
     players = [None, player1, player2]
 
@@ -139,18 +245,20 @@ def play_game(game, player1, player2):
             print("FINAL: {} (dark) {}:{} {} (light)".format(player1.name, p1score, p2score, player2.name))
             player1.kill(game)
             player2.kill(game)
-            break
+            return p1score, p2score, None
         else:
             color = "dark" if game.current_player == 1 else "light"
             try:
+                start = time.perf_counter()
                 i, j = player_obj.get_move(game)
+                if on_move is not None:
+                    on_move(game.current_player, (i, j), time.perf_counter() - start)
                 print("{} ({}) plays {},{}".format(player_obj.name, color, i,j))
                 game.play(i,j)
             except AiTimeoutError:
+                p1score, p2score = get_score(game.board)
                 print("{} ({}) timed out!".format(player_obj.name, color))
-                print("FINAL: {} (dark) {}:{} {} (light)".format(player_obj.name, p1score, p2score, player2.name))
+                print("FINAL: {} (dark) {}:{} {} (light)".format(player1.name, p1score, p2score, player2.name))
                 player1.kill(game)
                 player2.kill(game)
-                break
-
-
+                return p1score, p2score, game.current_player
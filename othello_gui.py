@@ -6,19 +6,26 @@ This module contains a simple graphical user interface for Othello.
 Thanks to original author Daniel Bauer, Columbia University
 """
 import sys, getopt
+import os
+import time
 
 from tkinter import *
 from tkinter import scrolledtext
 
-from othello_game import OthelloGameManager, AiPlayerInterface, Player, InvalidMoveError, AiTimeoutError
+from othello_game import OthelloGameManager, AiPlayerInterface, Player, InvalidMoveError, AiTimeoutError, check_options
 from othello_shared import get_possible_moves, get_score
+from othello_telemetry import summarize_game, format_report
+from othello_records import GameWriter, MAX_DIMENSION
 
 class OthelloGui(object):
 
-    def __init__(self, game_manager, player1, player2):
+    def __init__(self, game_manager, player1, player2, record = None, settings = None):
 
         self.game = game_manager
         self.players = [None, player1, player2]
+        self.record = record        # game record file to append the game to (see othello_records)
+        self.settings = settings
+        self.times = []             # seconds per move, NaN for human moves
         self.height = self.game.dimension
         self.width = self.game.dimension 
         
@@ -52,6 +59,7 @@ class OthelloGui(object):
             player = "Dark" if self.game.current_player == 1 else "Light"
             self.log("{}: {},{}".format(player, i,j))
             self.game.play(i, j)
+            self.times.append(float("nan"))
             self.draw_board()
             if not get_possible_moves(self.game.board, self.game.current_player):
                 self.shutdown("Game Over")
@@ -61,22 +69,33 @@ class OthelloGui(object):
         except InvalidMoveError:
             self.log("Invalid move. {},{}".format(i,j))
 
-    def shutdown(self, text):
+    def shutdown(self, text, loser = 0):
         self.move_label["text"] = text 
         self.root.unbind("<Button-1>")
+        if self.record is not None:
+            with GameWriter(self.record) as writer:
+                writer.write(self.game.dimension, self.players[1].name, self.players[2].name,
+                             [(i, j) for player, i, j in self.game.moves], get_score(self.game.board),
+                             self.settings, self.times, loser=loser)
         if isinstance(self.players[1], AiPlayerInterface): 
             self.players[1].kill(self.game)
         if isinstance(self.players[2], AiPlayerInterface): 
             self.players[2].kill(self.game)
+        for player in self.players[1:]:
+            if isinstance(player, AiPlayerInterface) and player.telemetry is not None:
+                self.log(format_report(player.name, summarize_game(player.telemetry)))
  
     def ai_move(self):
         player_obj = self.players[self.game.current_player]
         try:
+            start = time.perf_counter()
             i,j = player_obj.get_move(self.game)
+            seconds = time.perf_counter() - start
             player = "Dark" if self.game.current_player == 1 else "Light"
             player = "{} {}".format(player_obj.name, player)
             self.log("{}: {},{}".format(player, i,j))
             self.game.play(i,j)
+            self.times.append(seconds)
             self.draw_board()
             if not get_possible_moves(self.game.board, self.game.current_player):
                 self.shutdown("Game Over")
@@ -85,7 +104,7 @@ class OthelloGui(object):
             else: 
                 self.root.bind("<Button-1>",lambda e: self.mouse_pressed(e))        
         except AiTimeoutError:
-            self.shutdown("Game Over, {} lost (timeout)".format(player_obj.name))
+            self.shutdown("Game Over, {} lost (timeout)".format(player_obj.name), self.game.current_player)
 
     def run(self):
         if isinstance(self.players[1], AiPlayerInterface):
@@ -134,9 +153,15 @@ def main(argv):
     minimax = False        
     agent1 = None
     agent2 = None
+    options = {}
+    profiling = {} # profiler, profile_threshold and profile_file for AiPlayerInterface
+    profile_dir = "."
+    record = None
+    cache_dir = None
 
     try:
-        opts, args = getopt.getopt(argv,"hcmol:d:a:b:",["limit=","dimension=","agent1=","agent2="])
+        opts, args = getopt.getopt(argv,"hcmol:d:a:b:",["limit=","dimension=","agent1=","agent2=","tt-mb=","time=","pvs","mtdf","workers=","ponder","book=","endgame=","wld=","heuristic","weights=","telemetry","symmetry=",
+                                                           "profile=","profile-threshold=","profile-dir=","record=","cache-dir=","cache-entries="])
     except getopt.GetoptError:
         print('othello_gui.py -d <dimension> [-a <agentA> -b <agentB> -l <depth-limit> -c -o -m]')
         sys.exit(2)
@@ -158,24 +183,87 @@ def main(argv):
             ordering = True   
         elif opt in ("-l", "--limit"):
             limit = int(arg)  
+        elif opt == "--tt-mb":
+            options["tt_mb"] = float(arg)
+        elif opt == "--time":
+            options["time"] = float(arg)
+        elif opt == "--pvs":
+            options["pvs"] = 1
+        elif opt == "--mtdf":
+            options["mtdf"] = 1
+        elif opt == "--workers":
+            options["workers"] = int(arg)
+        elif opt == "--ponder":
+            options["ponder"] = 1
+        elif opt == "--book":
+            options["book"] = arg
+        elif opt == "--endgame":
+            options["endgame"] = int(arg)
+        elif opt == "--wld":
+            options["wld"] = int(arg)
+        elif opt == "--heuristic":
+            options["heuristic"] = 1
+        elif opt == "--weights":
+            options["weights"] = arg
+        elif opt == "--telemetry":
+            options["telemetry"] = 1
+        elif opt == "--symmetry":
+            options["symmetry"] = int(arg)
+        elif opt == "--profile":
+            profiling["profiler"] = arg
+        elif opt == "--profile-threshold":
+            profiling["profile_threshold"] = float(arg)
+        elif opt == "--profile-dir":
+            profile_dir = arg
+        elif opt == "--record":
+            record = arg
+        elif opt == "--cache-dir":
+            cache_dir = arg
+        elif opt == "--cache-entries":
+            options["cache_entries"] = int(arg)
 
     if size <= 0: #if no dimension provided
         print('Please provide a board size.')
         print('othello_gui.py -d <dimension> [-a <agentA> -b <agentB> -l <depth-limit> -c -o]')
         sys.exit(2)  
 
+    try:
+        check_options(dict(options, cache_file=os.path.join(cache_dir, "cache.bin")) if cache_dir else options)
+    except ValueError as error:
+        print(error)
+        sys.exit(2)
+
+    if record is not None and size > MAX_DIMENSION:
+        print("Game records hold boards of up to {0}x{0}, not recording".format(MAX_DIMENSION))
+        record = None
+
+    def profile(agent, color):
+        # one profile file per agent, e.g. profile_agent_dark.prof
+        if "profiler" not in profiling:
+            return {}
+        name = "profile_{}_{}.prof".format(os.path.splitext(os.path.basename(agent))[0], ["dark", "light"][color - 1])
+        return dict(profiling, profile_file=os.path.join(profile_dir, name))
+
+    def agent_options(agent):
+        # one cache file per agent and board size, e.g. cache_agent_8.bin
+        if cache_dir is None:
+            return options
+        name = "cache_{}_{}.bin".format(os.path.splitext(os.path.basename(agent))[0], size)
+        return dict(options, cache_file=os.path.join(cache_dir, name))
+
     if agent1 != None and agent2 != None and size > 0:
-        p1 = AiPlayerInterface(agent1,1,limit,minimax,caching,ordering)
-        p2 = AiPlayerInterface(agent2,2,limit,minimax,caching,ordering)        
+        p1 = AiPlayerInterface(agent1,1,limit,minimax,caching,ordering,agent_options(agent1),**profile(agent1,1))
+        p2 = AiPlayerInterface(agent2,2,limit,minimax,caching,ordering,agent_options(agent2),**profile(agent2,2))
     elif agent1 != None and size > 0:
         p1 = Player(1)
-        p2 = AiPlayerInterface(agent1,2,limit,minimax,caching,ordering)
+        p2 = AiPlayerInterface(agent1,2,limit,minimax,caching,ordering,agent_options(agent1),**profile(agent1,2))
     else: 
         p1 = Player(1)
         p2 = Player(2)
         
     game = OthelloGameManager(size)
-    gui = OthelloGui(game, p1, p2) 
+    settings = {"limit": limit, "minimax": minimax, "caching": caching, "ordering": ordering, "options": options}
+    gui = OthelloGui(game, p1, p2, record, settings)
     gui.run()
 
 if __name__ == "__main__":
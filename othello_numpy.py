@@ -0,0 +1,218 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Batched versions of the functions in othello_shared, for workloads that
+handle many boards at once (self-play, analysis, move ordering).
+
+Boards are stacked in a (B, n, n) int8 array indexed like the tuple boards,
+boards[b, j, i] for column i and row j, with 0 for empty, 1 for dark and 2
+for light. Every function works on all B boards at once: a step along one
+of the 8 directions is a shift of the whole stack, so the Python loops run
+over directions and line lengths, never over boards or squares. Results are
+the same as othello_shared's for every board.
+
+players can be a single color for all boards or a (B,) array with one color
+per board. Moves are a (B, 2) array of (column, row) pairs.
+
+This module needs NumPy, which the rest of the project does not. Run it to
+measure throughput:
+
+$python3 othello_numpy.py -d <dimension> [-b <boards>]
+"""
+import sys, getopt
+import random
+import time
+
+import numpy as np
+
+# (column step, row step), in the same order as othello_shared.find_lines
+DIRECTIONS = [(0, 1), (1, 1), (1, 0), (1, -1), (0, -1), (-1, -1), (-1, 0), (-1, 1)]
+
+
+def to_array(boards):
+    """
+    Stack a list of tuple (or list) boards into a (B, n, n) int8 array.
+    """
+    return np.array(boards, dtype=np.int8).reshape(len(boards), len(boards[0]), len(boards[0]))
+
+
+def shift(x, di, dj):
+    """
+    Move every square of the (B, n, n) array x by di columns and dj rows.
+    Squares shifted off the board are dropped and the ones shifted in are 0.
+    """
+    n = x.shape[1]
+    result = np.zeros_like(x)
+    result[:, max(dj, 0):n + min(dj, 0), max(di, 0):n + min(di, 0)] = \
+        x[:, max(-dj, 0):n + min(-dj, 0), max(-di, 0):n + min(-di, 0)]
+    return result
+
+
+def player_masks(boards, players):
+    """
+    Return (own, opp) boolean arrays: the discs of each board's player and
+    of its opponent.
+    """
+    players = np.broadcast_to(np.asarray(players, dtype=np.int8), boards.shape[:1])[:, None, None]
+    own = boards == players
+    opp = (boards != 0) & ~own
+    return own, opp
+
+
+def get_move_masks(boards, players):
+    """
+    Return a (B, n, n) boolean array of the squares where each board's
+    player can play.
+    """
+    own, opp = player_masks(boards, players)
+    empty = boards == 0
+    moves = np.zeros_like(own)
+    for di, dj in DIRECTIONS:
+        x = shift(own, di, dj) & opp
+        while x.any():
+            x = shift(x, di, dj)
+            moves |= x & empty
+            x &= opp
+    return moves
+
+
+def get_possible_moves(boards, players):
+    """
+    Return, for each board, the list of (column, row) moves in the same order
+    as othello_shared.get_possible_moves.
+    """
+    moves = [[] for _ in range(boards.shape[0])]
+    # transposed to (B, i, j), argwhere lists moves by column, then row
+    for b, i, j in np.argwhere(get_move_masks(boards, players).transpose(0, 2, 1)):
+        moves[b].append((int(i), int(j)))
+    return moves
+
+
+def get_flip_masks(boards, players, moves):
+    """
+    Return a (B, n, n) boolean array of the discs that each board's move
+    (a (B, 2) array of (column, row)) captures.
+    """
+    own, opp = player_masks(boards, players)
+    moves = np.asarray(moves)
+    placed = np.zeros_like(own)
+    placed[np.arange(boards.shape[0]), moves[:, 1], moves[:, 0]] = True
+    flips = np.zeros_like(own)
+    for di, dj in DIRECTIONS:
+        run = shift(placed, di, dj) & opp
+        line = run.copy()
+        closed = np.zeros(boards.shape[0], dtype=bool)
+        while run.any():
+            x = shift(run, di, dj)
+            closed |= (x & own).any(axis=(1, 2))
+            run = x & opp
+            line |= run
+        flips |= line & closed[:, None, None]
+    return flips
+
+
+def play_moves(boards, players, moves):
+    """
+    Return the (B, n, n) array of boards after each board's player plays its
+    move. Like othello_shared.play_move, moves are not checked for legality.
+    """
+    players_b = np.broadcast_to(np.asarray(players, dtype=np.int8), boards.shape[:1])
+    moves = np.asarray(moves)
+    flips = get_flip_masks(boards, players_b, moves)
+    result = np.where(flips, players_b[:, None, None], boards).astype(np.int8)
+    result[np.arange(boards.shape[0]), moves[:, 1], moves[:, 0]] = players_b
+    return result
+
+
+def get_scores(boards):
+    """
+    Return a (B, 2) array with the (dark, light) disc counts of each board.
+    """
+    return np.stack([(boards == 1).sum(axis=(1, 2)), (boards == 2).sum(axis=(1, 2))], axis=1)
+
+
+def random_boards(dimension, count, seed = 0):
+    """
+    Return count boards from random games, with the player to move and one
+    legal move for each, as arrays (boards, players, moves).
+    """
+    from othello_bitboard import get_possible_moves as board_moves, play_move
+    from opening_book import start_position
+    rng = random.Random(seed)
+    n = dimension
+    start = start_position(n)
+    boards, players, moves = [], [], []
+    while len(boards) < count:
+        board, player = start, 1
+        for ply in range(rng.randrange(n * n - 4)):
+            possible = board_moves(board, player)
+            if not possible:
+                break
+            board = play_move(board, player, *rng.choice(possible))
+            player = [1, 2][player == 1]
+        possible = board_moves(board, player)
+        if possible:
+            boards.append(board.to_rows())
+            players.append(player)
+            moves.append(rng.choice(possible))
+    return to_array(boards), np.array(players, dtype=np.int8), np.array(moves)
+
+
+def benchmark(dimension, count):
+    """
+    Print boards per second for move generation, playing a move and scoring,
+    batched here and one board at a time with othello_shared and
+    othello_bitboard.
+    """
+    import othello_shared
+    import othello_bitboard
+    boards, players, moves = random_boards(dimension, count)
+    tuples = [tuple(tuple(int(x) for x in row) for row in board) for board in boards]
+    bitboards = [othello_bitboard.to_bitboard(board) for board in tuples]
+
+    def rate(function):
+        start = time.perf_counter()
+        function()
+        return count / (time.perf_counter() - start)
+
+    def one_by_one(module, boards):
+        return {"moves": lambda: [module.get_possible_moves(board, int(player))
+                                  for board, player in zip(boards, players)],
+                "play": lambda: [module.play_move(board, int(player), int(move[0]), int(move[1]))
+                                 for board, player, move in zip(boards, players, moves)],
+                "score": lambda: [module.get_score(board) for board in boards]}
+
+    results = {"numpy": {"moves": lambda: get_move_masks(boards, players),
+                         "play": lambda: play_moves(boards, players, moves),
+                         "score": lambda: get_scores(boards)},
+               "othello_shared": one_by_one(othello_shared, tuples),
+               "othello_bitboard": one_by_one(othello_bitboard, bitboards)}
+    print("{} boards of {}x{}, boards/second:".format(count, dimension, dimension))
+    print("".ljust(18) + "".join(name.rjust(12) for name in ("moves", "play", "score")))
+    for backend, functions in results.items():
+        print(backend.ljust(18) + "".join("{:12.0f}".format(rate(functions[name]))
+                                          for name in ("moves", "play", "score")))
+
+
+def main(argv):
+    usage = 'othello_numpy.py -d <dimension> [-b <boards>]'
+    dimension = 8
+    count = 10000
+    try:
+        opts, args = getopt.getopt(argv, "hd:b:")
+    except getopt.GetoptError:
+        print(usage)
+        sys.exit(2)
+    for opt, arg in opts:
+        if opt == '-h':
+            print(usage)
+            sys.exit()
+        elif opt == "-d":
+            dimension = int(arg)
+        elif opt == "-b":
+            count = int(arg)
+    benchmark(dimension, count)
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
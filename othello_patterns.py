@@ -0,0 +1,265 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Pattern-table evaluation.
+
+The board is scored by looking up a few lines of squares in precomputed
+tables instead of scanning every square:
+  - edge: the first EDGE_LENGTH squares of an edge, read from a corner
+    (8 per board: two from each corner);
+  - corner: the 3 x 3 block in a corner (4 per board);
+  - diagonal: the first DIAGONAL_LENGTH squares of a main diagonal, read
+    from a corner (4 per board).
+Each line is read from its corner outward, so the same shape in any corner
+shares one table. The contents of a line are a base-3 number (digit 0 for
+an empty square, 1 for dark, 2 for light), which is the index into the
+table of its kind. Table values are in discs, from dark's point of view,
+like compute_utility's disc difference. The evaluator rounds them to
+multiples of RESOLUTION, a power of two, so sums of them are exact and
+multiples of RESOLUTION too: that is the search's null window with the
+heuristic ON (see agent.py).
+
+Weights are stored as JSON: {"dimension": n, "tables": {"edge": [...],
+"corner": [...], "diagonal": [...]}}. Without a file, default_weights(n)
+builds tables from a static value per square (corners good, squares next to
+corners bad, edges fairly good). To write those to a file, as a starting
+point for tuning:
+
+$python3 othello_patterns.py -d <dimension> [-o <weights file>]
+"""
+import sys, getopt
+import json
+
+EDGE_LENGTH = 8
+DIAGONAL_LENGTH = 8
+RESOLUTION = 1 / 16     # values are whole multiples of this many discs
+KINDS = ("edge", "corner", "diagonal")
+
+_evaluator_cache = {}
+
+
+def pattern_squares(n):
+    """
+    Return a dict of kind -> list of instances on an n x n board. Each
+    instance is a list of (i, j) squares, starting at a corner.
+    """
+    patterns = {kind: [] for kind in KINDS}
+    for ci in (0, n - 1):
+        for cj in (0, n - 1):
+            di = 1 if ci == 0 else -1
+            dj = 1 if cj == 0 else -1
+            edge = min(n, EDGE_LENGTH)
+            patterns["edge"].append([(ci + di * k, cj) for k in range(edge)])
+            patterns["edge"].append([(ci, cj + dj * k) for k in range(edge)])
+            patterns["corner"].append([(ci + di * a, cj + dj * b) for a in range(3) for b in range(3)])
+            patterns["diagonal"].append([(ci + di * k, cj + dj * k) for k in range(min(n, DIAGONAL_LENGTH))])
+    return patterns
+
+
+def square_value(n, i, j):
+    # Static value of a dark disc on (i, j), in discs
+    on_edge_i = i in (0, n - 1)
+    on_edge_j = j in (0, n - 1)
+    near_i = i in (1, n - 2)
+    near_j = j in (1, n - 2)
+    if on_edge_i and on_edge_j:
+        return 4.0      # corner
+    if (on_edge_i and near_j) or (near_i and on_edge_j):
+        return -1.0     # edge square next to a corner
+    if near_i and near_j:
+        return -2.0     # diagonal neighbour of a corner
+    if on_edge_i or on_edge_j:
+        return 1.0
+    return 0.0
+
+
+def default_weights(n):
+    """
+    Return the default tables for an n x n board as a dict of kind -> list:
+    each entry is the sum of square_value over the dark discs minus the
+    light discs in the line. A square read by several lines has its value
+    split between them, so the total is the same as summing square_value
+    over the board.
+    """
+    patterns = pattern_squares(n)
+    coverage = {}
+    for instances in patterns.values():
+        for instance in instances:
+            for square in instance:
+                coverage[square] = coverage.get(square, 0) + 1
+    tables = {}
+    for kind, instances in patterns.items():
+        values = [square_value(n, i, j) / coverage[(i, j)] for i, j in instances[0]]
+        table = [0.0]
+        for value in values:
+            # appending a digit: index + 3^k * digit for digit 0, 1, 2
+            table = table + [x + value for x in table] + [x - value for x in table]
+        tables[kind] = table
+    return tables
+
+
+def load_weights(filename):
+    with open(filename) as f:
+        data = json.load(f)
+    return data["dimension"], data["tables"]
+
+
+def save_weights(filename, n, tables):
+    with open(filename, "w") as f:
+        json.dump({"dimension": n, "tables": tables}, f)
+
+
+class PatternEvaluator(object):
+    """
+    Scores boards of one dimension with the given tables (a dict of kind ->
+    list of values, see default_weights), rounded to multiples of
+    RESOLUTION.
+    """
+
+    def __init__(self, n, tables):
+        self.dimension = n
+        self.instances = []     # (table, [(bit, power of 3), ...]) for every line on the board
+        self.square_lines = [[] for _ in range(n * n)]  # bit index -> [(line number, power of 3), ...]
+        for kind, instances in pattern_squares(n).items():
+            table = [round(value / RESOLUTION) * RESOLUTION for value in tables[kind]]
+            for instance in instances:
+                if len(table) != 3 ** len(instance):
+                    raise ValueError("{} table has {} entries, expected {}".format(
+                        kind, len(table), 3 ** len(instance)))
+                for k, (i, j) in enumerate(instance):
+                    self.square_lines[i * n + j].append((len(self.instances), 3 ** k))
+                self.instances.append((table, [(1 << (i * n + j), 3 ** k) for k, (i, j) in enumerate(instance)]))
+        # no position scores more than this, in absolute value
+        self.bound = sum(max(map(abs, table)) for table, squares in self.instances)
+
+    def indices(self, dark, light):
+        """
+        Return the table index of every line, in the order of self.instances.
+        """
+        result = []
+        for table, squares in self.instances:
+            index = 0
+            for bit, power in squares:
+                if dark & bit:
+                    index += power
+                elif light & bit:
+                    index += power + power
+            result.append(index)
+        return result
+
+    def evaluate(self, dark, light):
+        """
+        Return the value of the position for dark, in discs.
+        """
+        total = 0.0
+        for table, squares in self.instances:
+            index = 0
+            for bit, power in squares:
+                if dark & bit:
+                    index += power
+                elif light & bit:
+                    index += power + power
+            total += table[index]
+        return total
+
+
+class PatternState(object):
+    """
+    Evaluation state carried along by a SearchBoard (its state attribute):
+    the disc counts and the table index of every line. make_move and
+    undo_move call play and undo with the squares that changed, and only the
+    lines through those squares are updated. Reading value at a leaf is then
+    one table lookup per line instead of reading every square.
+    """
+
+    __slots__ = ("tables", "square_lines", "lines", "dark_count", "light_count")
+
+    def __init__(self, evaluator, dark, light):
+        self.tables = [table for table, squares in evaluator.instances]
+        self.square_lines = evaluator.square_lines
+        self.lines = evaluator.indices(dark, light)
+        self.dark_count = bin(dark).count("1")
+        self.light_count = bin(light).count("1")
+
+    @property
+    def value(self):
+        """
+        The evaluator's value of the position, for dark.
+        """
+        return sum(map(list.__getitem__, self.tables, self.lines))
+
+    def play(self, player, index, flips, sign = 1):
+        """
+        Update for player placing a disc on bit index and flipping the discs
+        in the flips mask. With sign -1, take that move back instead.
+        """
+        lines = self.lines
+        square_lines = self.square_lines
+        # digit 1 is dark, 2 is light: placing adds the digit, flipping
+        # dark to light adds 1 per power of 3 and light to dark removes 1
+        placed = sign if player == 1 else sign + sign
+        for line, power in square_lines[index]:
+            lines[line] += placed * power
+        flipped = -sign if player == 1 else sign
+        count = 0
+        while flips:
+            low = flips & -flips
+            flips ^= low
+            count += 1
+            for line, power in square_lines[low.bit_length() - 1]:
+                lines[line] += flipped * power
+        if player == 1:
+            self.dark_count += sign * (count + 1)
+            self.light_count -= sign * count
+        else:
+            self.light_count += sign * (count + 1)
+            self.dark_count -= sign * count
+
+    def undo(self, player, index, flips):
+        self.play(player, index, flips, -1)
+
+
+def get_evaluator(n, filename = None):
+    """
+    Return the evaluator for n x n boards, with the weights in filename or
+    the default weights. Evaluators are built once per (n, filename).
+    """
+    if (n, filename) not in _evaluator_cache:
+        if filename is None:
+            tables = default_weights(n)
+        else:
+            dimension, tables = load_weights(filename)
+            if dimension != n:
+                raise ValueError("{} holds weights for {}x{} boards".format(filename, dimension, dimension))
+        _evaluator_cache[(n, filename)] = PatternEvaluator(n, tables)
+    return _evaluator_cache[(n, filename)]
+
+
+def main(argv):
+    usage = 'othello_patterns.py -d <dimension> [-o <weights file>]'
+    dimension = 0
+    output = None
+    try:
+        opts, args = getopt.getopt(argv, "hd:o:")
+    except getopt.GetoptError:
+        print(usage)
+        sys.exit(2)
+    for opt, arg in opts:
+        if opt == '-h':
+            print(usage)
+            sys.exit()
+        elif opt == "-d":
+            dimension = int(arg)
+        elif opt == "-o":
+            output = arg
+    if dimension <= 0:
+        print(usage)
+        sys.exit(2)
+    if output is None:
+        output = "weights_{}.json".format(dimension)
+    save_weights(output, dimension, default_weights(dimension))
+    print("Wrote default weights for {}x{} to {}".format(dimension, dimension, output))
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -0,0 +1,220 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Runs an agent under a profiler. The game manager starts agents through this
+module when profiling is on (--profile in the GUI and the tournament runner);
+the agent itself does not change.
+
+Profilers:
+  - cprofile: the standard deterministic profiler. Exact call counts, but
+    every function call costs extra, so searches run a lot slower.
+  - sample: a thread looks at the agent's stack every INTERVAL seconds.
+    Much less overhead; times are estimates and there are no call counts
+    (the sample counts stand in for them).
+Both write a pstats file (snakeviz <file>, or python3 -m pstats <file>).
+
+The agent's time is split into moves at its input() calls: a move runs from
+reading the board to asking for the next line, so the time spent waiting for
+the opponent is left out. With a threshold, only moves that took at least
+that many seconds are kept in the profile. Only the agent's main thread is
+profiled (not the pondering thread or worker processes).
+
+The profile is written when the agent exits (after FINAL) or is stopped with
+SIGTERM (when it runs out of time).
+
+$python3 othello_profile.py [-p <cprofile|sample> -t <seconds>] -o <profile file> agent.py
+"""
+import sys, getopt
+import builtins
+import cProfile
+import marshal
+import os
+import pstats
+import runpy
+import signal
+import threading
+import time
+
+PROFILERS = ("cprofile", "sample")
+INTERVAL = 0.001
+
+
+class CProfileRecorder(object):
+
+    def __init__(self):
+        self.stats = None
+        self.profile = None
+
+    def begin(self):
+        self.profile = cProfile.Profile()
+        self.profile.enable()
+
+    def end(self, keep):
+        self.profile.disable()
+        if keep:
+            if self.stats is None:
+                self.stats = pstats.Stats(self.profile)
+            else:
+                self.stats.add(self.profile)
+        self.profile = None
+
+    def dump(self, filename):
+        if self.stats is not None:
+            self.stats.dump_stats(filename)
+        return self.stats is not None
+
+
+class SamplingRecorder(object):
+    """
+    Collects the stacks of the thread that created it, as a dict of stack ->
+    [samples, seconds]. A stack is a tuple of (file, line, function) from
+    the outermost call in.
+    """
+
+    def __init__(self, interval = INTERVAL):
+        self.interval = interval
+        self.thread_id = threading.get_ident()
+        self.samples = {}
+        self.current = None     # samples of the move being profiled, None in between
+        sys.setswitchinterval(interval) # otherwise the agent keeps the interpreter lock for 5ms at a time
+        threading.Thread(target=self.run, daemon=True).start()
+
+    def run(self):
+        last = time.perf_counter()
+        while True:
+            time.sleep(self.interval)
+            now = time.perf_counter()
+            current = self.current
+            frame = sys._current_frames().get(self.thread_id)
+            if current is not None and frame is not None:
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append((code.co_filename, code.co_firstlineno, code.co_name))
+                    frame = frame.f_back
+                counts = current.setdefault(tuple(reversed(stack)), [0, 0.0])
+                counts[0] += 1
+                counts[1] += now - last
+            last = now
+
+    def begin(self):
+        self.current = {}
+
+    def end(self, keep):
+        current, self.current = self.current, None
+        if keep:
+            for stack, (count, seconds) in current.items():
+                counts = self.samples.setdefault(stack, [0, 0.0])
+                counts[0] += count
+                counts[1] += seconds
+
+    def dump(self, filename):
+        if not self.samples:
+            return False
+        with open(filename, "wb") as f:
+            marshal.dump(sampled_stats(self.samples), f)
+        return True
+
+
+def sampled_stats(samples):
+    """
+    Return samples (stack -> [samples, seconds]) in the format of pstats
+    files: function -> (calls, primitive calls, own time, total time,
+    {caller: (calls, primitive calls, own time, total time)}). Calls are
+    sample counts.
+    """
+    stats = {}
+    for stack, (count, seconds) in samples.items():
+        seen = set()
+        for depth, function in enumerate(stack):
+            entry = stats.setdefault(function, [0, 0, 0.0, 0.0, {}])
+            leaf = depth == len(stack) - 1
+            if function not in seen:    # recursive calls count once per sample
+                seen.add(function)
+                entry[0] += count
+                entry[1] += count
+                entry[3] += seconds
+            if leaf:
+                entry[2] += seconds
+            if depth > 0:
+                caller = entry[4].setdefault(stack[depth - 1], [0, 0, 0.0, 0.0])
+                caller[0] += count
+                caller[1] += count
+                caller[2] += seconds if leaf else 0.0
+                caller[3] += seconds
+    return {function: (cc, nc, tt, ct, {caller: tuple(value) for caller, value in callers.items()})
+            for function, (cc, nc, tt, ct, callers) in stats.items()}
+
+
+def run_agent(agent, output, profiler = "cprofile", threshold = 0.0):
+    """
+    Run the agent script under profiler and write the profile of its moves
+    that took at least threshold seconds to output.
+    """
+    recorder = CProfileRecorder() if profiler == "cprofile" else SamplingRecorder()
+    read_line = builtins.input
+    started = [time.perf_counter()]
+
+    def end_move():
+        recorder.end(time.perf_counter() - started[0] >= threshold)
+
+    def profiled_input(*args):
+        end_move()
+        try:
+            return read_line(*args)
+        finally:
+            started[0] = time.perf_counter()
+            recorder.begin()
+
+    def finish():
+        end_move()
+        if not recorder.dump(output):
+            sys.stderr.write("No move took {}s or more, no profile written\n".format(threshold))
+
+    def terminated(signum, frame):
+        finish()
+        sys.stdout.flush()
+        os._exit(1)
+
+    builtins.input = profiled_input
+    signal.signal(signal.SIGTERM, terminated)
+    sys.argv = [agent]
+    sys.path.insert(0, os.path.dirname(os.path.abspath(agent)))
+    recorder.begin()
+    try:
+        runpy.run_path(agent, run_name="__main__")
+    except EOFError:    # the manager closed the pipe without FINAL
+        pass
+    finally:
+        signal.signal(signal.SIGTERM, signal.SIG_DFL)
+        finish()
+
+
+def main(argv):
+    usage = 'othello_profile.py [-p <cprofile|sample> -t <seconds>] -o <profile file> agent.py'
+    profiler = "cprofile"
+    threshold = 0.0
+    output = None
+    try:
+        opts, args = getopt.getopt(argv, "hp:t:o:")
+    except getopt.GetoptError:
+        print(usage)
+        sys.exit(2)
+    for opt, arg in opts:
+        if opt == '-h':
+            print(usage)
+            sys.exit()
+        elif opt == "-p":
+            profiler = arg
+        elif opt == "-t":
+            threshold = float(arg)
+        elif opt == "-o":
+            output = arg
+    if output is None or len(args) != 1 or profiler not in PROFILERS:
+        print(usage)
+        sys.exit(2)
+    run_agent(args[0], output, profiler, threshold)
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -0,0 +1,85 @@
+"""
+Board encodings for the messages between the game manager and the AI
+players.
+
+Protocol 1 (text) is the original one: the board is sent as the Python text
+of a list of rows. Protocol 2 (packed) sends the board as two hexadecimal
+bitmasks, one per color, using the bit layout of othello_bitboard:
+
+    B <dimension> <dark mask> <light mask>
+
+In protocol 2 the manager can also send only the moves played since the
+player's previous turn (its own move included), and the player keeps its own
+copy of the board:
+
+    D <player>,<column>,<row> <player>,<column>,<row> ...
+
+Negotiation: a player that knows protocol 2 introduces itself with
+"<name>;protocols=1,2". The manager then adds protocol=2 (and delta=1 if it
+will send moves) to the key=value options of the handshake line. Players that
+introduce themselves with a plain name get protocol 1.
+"""
+import ast
+
+from othello_bitboard import BitBoard, to_bitboard, play_move
+
+TEXT = 1
+PACKED = 2
+SUPPORTED = (TEXT, PACKED)
+
+
+def intro(name):
+    """
+    Return the first line a player prints: its name and the protocols it reads.
+    """
+    return "{};protocols={}".format(name, ",".join(str(p) for p in SUPPORTED))
+
+
+def parse_intro(line):
+    """
+    Return (name, protocols) from a player's first line.
+    """
+    name, _, extra = line.strip().partition(";")
+    protocols = [TEXT]
+    for field in extra.split(";"):
+        key, _, value = field.partition("=")
+        if key == "protocols":
+            protocols = [int(p) for p in value.split(",")]
+    return name, protocols
+
+
+def encode_board(board):
+    board = to_bitboard(board)
+    return "B {} {:x} {:x}".format(board.dimension, board.dark, board.light)
+
+
+def encode_moves(moves):
+    return " ".join(["D"] + ["{},{},{}".format(player, i, j) for player, i, j in moves])
+
+
+class BoardReader(object):
+    """
+    Player side of the board message. Reads one board line in whichever
+    protocol was agreed on the handshake and returns the board as a BitBoard
+    (which can be indexed like the tuple boards of protocol 1).
+    """
+
+    def __init__(self, options):
+        self.protocol = int(options.get("protocol", TEXT))
+        self.board = None
+
+    def read(self, line):
+        if self.protocol == TEXT:
+            # literal_eval only accepts Python literals, never code
+            self.board = to_bitboard(ast.literal_eval(line))
+            return self.board
+        fields = line.split()
+        if fields[0] == "B":
+            self.board = BitBoard(int(fields[1]), int(fields[2], 16), int(fields[3], 16))
+        elif fields[0] == "D":
+            for move in fields[1:]:
+                player, i, j = (int(x) for x in move.split(","))
+                self.board = play_move(self.board, player, i, j)
+        else:
+            raise ValueError("Unknown board message: {}".format(line))
+        return self.board
@@ -0,0 +1,201 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Compact game records.
+
+A record file is MAGIC followed by a stream of records, each starting with a
+one-byte tag:
+  - b"H" header: uint32 length, then that many bytes of JSON
+    {"dimension": n, "agents": [...], "settings": {...}}. It applies to the
+    games after it, up to the next header.
+  - b"G" game: the GAME struct (flags, dark and light as indices into the
+    header's agents, the color that lost on time or by an invalid move or 0,
+    opening plies, number of moves, final dark and light disc counts), then
+    one byte per move (column * n + row; a uint16 if the WIDE flag is set,
+    for boards larger than 16x16), then, if the flags say so, a float32 per
+    move for the time it took (seconds) and for the mover's evaluation (NaN
+    where unknown).
+Moves alternate between dark and light, starting with dark (there are no
+passes), so a game's moves are all that is needed to replay it. The first
+opening plies were set by the tournament, not chosen by the agents.
+
+GameWriter appends games to a file as they finish, writing a header only
+when the settings change or a new agent shows up. read_games reads a file one
+game at a time, so files of millions of games never have to fit in memory:
+
+    for game in read_games("games.rec"):
+        print(game.dark, game.light, game.score)
+
+$python3 othello_records.py [-g] <games file>
+prints a summary of the file (with -g, also every game).
+"""
+import sys, getopt
+import array
+import collections
+import json
+import math
+import struct
+
+MAGIC = b"OTHGAME1"
+HEADER = struct.Struct("<cI")       # b"H", length of the JSON
+GAME = struct.Struct("<cBBBBBHHH")  # b"G", flags, dark, light, loser, opening, moves, dark discs, light discs
+TIMES = 1   # flags
+EVALS = 2
+WIDE = 4    # moves are uint16
+BYTE_DIMENSION = 16     # up to this size, a move fits in one byte
+MAX_DIMENSION = 255     # a move and the disc counts must fit in a uint16
+
+GameRecord = collections.namedtuple("GameRecord", ["dimension", "dark", "light", "settings", "moves", "score",
+                                                   "loser", "opening", "times", "evals"])
+
+
+class GameWriter(object):
+    """
+    Appends games to a record file (which is created if needed). Every game
+    is flushed when written, so a file is complete up to the last finished
+    game even if the program is stopped.
+    """
+
+    def __init__(self, filename):
+        self.file = open(filename, "ab")
+        if self.file.tell() == 0:
+            self.file.write(MAGIC)
+        self.header = None  # (dimension, settings JSON) of the last header written in this file
+        self.agents = []
+
+    def write(self, dimension, dark, light, moves, score, settings = None, times = None, evals = None,
+              loser = 0, opening = 0):
+        """
+        Append one game. moves is the list of (column, row) moves played,
+        score the final (dark, light) disc counts. times and evals, if
+        given, have one entry per move (None for unknown evals).
+        """
+        if dimension > MAX_DIMENSION:
+            raise ValueError("game records hold boards of up to {0}x{0}".format(MAX_DIMENSION))
+        key = (dimension, json.dumps(settings or {}, sort_keys=True))
+        if key != self.header or dark not in self.agents or light not in self.agents:
+            if key != self.header:
+                self.agents = []
+            self.agents += [agent for agent in (dark, light) if agent not in self.agents]
+            self.header = key
+            data = json.dumps({"dimension": dimension, "agents": self.agents, "settings": settings or {}}).encode()
+            self.file.write(HEADER.pack(b"H", len(data)) + data)
+        wide = dimension > BYTE_DIMENSION
+        flags = (TIMES if times is not None else 0) | (EVALS if evals is not None else 0) | (WIDE if wide else 0)
+        squares = [i * dimension + j for i, j in moves]
+        parts = [GAME.pack(b"G", flags, self.agents.index(dark), self.agents.index(light), loser or 0, opening,
+                           len(moves), score[0], score[1]),
+                 struct.pack("<{}H".format(len(squares)), *squares) if wide else bytes(squares)]
+        if times is not None:
+            parts.append(array.array("f", times).tobytes())
+        if evals is not None:
+            parts.append(array.array("f", [math.nan if value is None else value for value in evals]).tobytes())
+        self.file.write(b"".join(parts))
+        self.file.flush()
+
+    def close(self):
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def read_floats(f, count):
+    values = array.array("f")
+    values.frombytes(f.read(4 * count))
+    return values.tolist()
+
+
+def read_games(filename):
+    """
+    Generate the games in a record file as GameRecord tuples, in the order
+    they were written. A game or header cut off at the end of the file (the
+    writer was stopped while writing it) is skipped, and so is everything
+    after a header that is not valid JSON.
+    """
+    with open(filename, "rb") as f:
+        if f.read(len(MAGIC)) != MAGIC:
+            raise ValueError("{} is not a game record file".format(filename))
+        header = None
+        while True:
+            tag = f.read(1)
+            if not tag:
+                return
+            try:
+                if tag == b"H":
+                    length, = struct.unpack("<I", f.read(HEADER.size - 1))
+                    data = f.read(length)
+                    if len(data) < length:
+                        return
+                    header = json.loads(data.decode())
+                    continue
+                if tag != b"G":
+                    raise ValueError("{}: unknown record {!r} at byte {}".format(filename, tag, f.tell() - 1))
+                flags, dark, light, loser, opening, count, dark_discs, light_discs = \
+                    GAME.unpack(tag + f.read(GAME.size - 1))[1:]
+                n = header["dimension"]
+                width = 2 if flags & WIDE else 1
+                data = f.read(count * width)
+                if len(data) < count * width:
+                    return
+                if width == 2:
+                    data = struct.unpack("<{}H".format(count), data)
+                times = read_floats(f, count) if flags & TIMES else None
+                evals = read_floats(f, count) if flags & EVALS else None
+                if (times is not None and len(times) < count) or (evals is not None and len(evals) < count):
+                    return
+            except (struct.error, UnicodeDecodeError, json.JSONDecodeError):    # cut off or corrupt
+                return
+            if evals is not None:
+                evals = [None if math.isnan(value) else value for value in evals]
+            yield GameRecord(n, header["agents"][dark], header["agents"][light], header["settings"],
+                             [divmod(index, n) for index in data], (dark_discs, light_discs),
+                             loser, opening, times, evals)
+
+
+def summarize(filename, show_games = False):
+    games = 0
+    plies = 0
+    results = collections.Counter()     # (dark, light, winning color or 0) -> games
+    for game in read_games(filename):
+        games += 1
+        plies += len(game.moves)
+        if game.loser:
+            won = 3 - game.loser
+        else:
+            won = 0 if game.score[0] == game.score[1] else 1 if game.score[0] > game.score[1] else 2
+        results[(game.dark, game.light, won)] += 1
+        if show_games:
+            print("{} vs {}: {}-{} {}".format(game.dark, game.light, game.score[0], game.score[1],
+                                              " ".join("{},{}".format(i, j) for i, j in game.moves)))
+    print("{} games, {:.1f} moves per game".format(games, plies / games if games else 0))
+    for dark, light in sorted(set((dark, light) for dark, light, won in results)):
+        print("{} (dark) vs {} (light): {} dark wins, {} light wins, {} draws".format(
+            dark, light, results[(dark, light, 1)], results[(dark, light, 2)], results[(dark, light, 0)]))
+
+
+def main(argv):
+    usage = 'othello_records.py [-g] <games file>'
+    show_games = False
+    try:
+        opts, args = getopt.getopt(argv, "hg")
+    except getopt.GetoptError:
+        print(usage)
+        sys.exit(2)
+    for opt, arg in opts:
+        if opt == '-h':
+            print(usage)
+            sys.exit()
+        elif opt == "-g":
+            show_games = True
+    if len(args) != 1:
+        print(usage)
+        sys.exit(2)
+    summarize(args[0], show_games)
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
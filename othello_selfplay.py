@@ -0,0 +1,249 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Self-play data generation: plays games with agent.py's search and saves the
+positions, for fitting evaluation weights (see othello_tuner.py).
+
+Games are played in-process (the search functions of agent.py are called
+directly, no manager or pipes), either agent against agent or agent against
+a random player (Randy). Each game starts with a few random plies, and with
+probability epsilon the agent plays a random move instead of its best one,
+so the games differ from each other. Every position where the agent searched
+is saved with
+  - board: (n, n) int8, indexed like the tuple boards (board[row][column]),
+    0 empty, 1 dark, 2 light;
+  - player: the color to move;
+  - ply: the number of moves played before it (random ones included);
+  - score: the search value for the player to move (the final disc
+    differential if the search saw the game end, see agent.disc_value);
+  - result: the final disc differential for the player to move.
+
+Games are played in chunks of a fixed number of games, with a seed per chunk,
+and a pool of worker processes plays one chunk at a time each. A worker
+writes its chunk as one structured .npy file (chunk_<k>.npy in the output
+directory, renamed into place when complete), so memory use does not grow
+with the size of the dataset. Running the same command again skips the
+chunks that are already there, which resumes an interrupted run; the
+settings are kept in selfplay.json and must match.
+
+$python3 othello_selfplay.py -d <dimension> -g <games> -o <directory> [-l <depth> -j <jobs>
+        -c <games per chunk> -e <epsilon> -r <random plies> -s <seed> --randy --heuristic --weights <file>]
+
+load_dataset(directory) memory-maps the chunks again.
+"""
+import sys, getopt
+import glob
+import json
+import os
+import random
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from othello_bitboard import get_possible_moves, play_move, get_score
+from opening_book import start_position
+
+MANIFEST = "selfplay.json"
+
+
+def position_dtype(n):
+    return np.dtype([("board", np.int8, (n, n)), ("player", np.int8), ("ply", np.uint16),
+                     ("score", np.float32), ("result", np.int16)])
+
+
+def chunk_name(directory, chunk):
+    return os.path.join(directory, "chunk_{:05d}.npy".format(chunk))
+
+
+def init_worker(heuristic, weights_file):
+    import agent
+    agent.heuristic = heuristic
+    agent.weights_file = weights_file
+
+
+def reset_search():
+    """
+    Forget everything agent.py learned in earlier games (transposition
+    table, history scores), so a game depends only on its chunk's seed and
+    not on the chunks this worker played before.
+    """
+    import agent
+    agent.transposition_table.clear()
+    agent.history_scores.clear()
+
+
+def search(board, color, depth):
+    """
+    Search board for color with agent.py's alpha-beta (caching, ordering and
+    PVS on) and return (move, value).
+    """
+    import agent
+    search_board = agent.new_search_board(board)
+    agent.transposition_table.new_search()
+    agent.reset_move_ordering()
+    move, value = agent.alphabeta_max_node(search_board, color, float("-inf"), float("inf"), depth, 1, 1, 1)
+    return move, agent.disc_value(value, search_board.dimension)
+
+
+def play_game(settings, rng, agent_colors):
+    """
+    Play one game and return its positions as a list of (rows, player, ply,
+    score) and the final disc differential for dark.
+    """
+    reset_search()
+    board, player = start_position(settings["dimension"]), 1
+    positions = []
+    ply = 0
+    while True:
+        moves = get_possible_moves(board, player)
+        if not moves:
+            break
+        if ply < settings["random_plies"] or player not in agent_colors:
+            move = rng.choice(moves)
+        else:
+            move, value = search(board, player, settings["depth"])
+            positions.append((board.to_rows(), player, ply, value))
+            if rng.random() < settings["epsilon"]:
+                move = rng.choice(moves)
+        board = play_move(board, player, *move)
+        player = [1, 2][player == 1]
+        ply += 1
+    dark, light = get_score(board)
+    return positions, dark - light
+
+
+def play_chunk(task):
+    """
+    Worker task: play the games of one chunk and write them to its file.
+    Returns (chunk, games, positions).
+    """
+    settings, chunk = task
+    rng = random.Random(settings["seed"] * 1000003 + chunk)
+    rows = []
+    for game in range(settings["chunk_games"]):
+        if settings["randy"]:   # the agent takes each color in every other game
+            agent_colors = (1,) if game % 2 == 0 else (2,)
+        else:
+            agent_colors = (1, 2)
+        positions, difference = play_game(settings, rng, agent_colors)
+        for board, player, ply, value in positions:
+            rows.append((board, player, ply, value, difference if player == 1 else -difference))
+    data = np.array(rows, dtype=position_dtype(settings["dimension"]))
+    filename = chunk_name(settings["directory"], chunk)
+    with open(filename + ".tmp", "wb") as f:
+        np.save(f, data)
+    os.replace(filename + ".tmp", filename)
+    return chunk, settings["chunk_games"], len(data)
+
+
+def check_manifest(directory, settings):
+    """
+    Write the settings to the directory's manifest, or check that they
+    match the ones of the run that started it.
+    """
+    filename = os.path.join(directory, MANIFEST)
+    saved = {key: value for key, value in settings.items() if key not in ("directory", "games")}
+    if os.path.exists(filename):
+        with open(filename) as f:
+            old = json.load(f)
+        if old != saved:
+            raise ValueError("{} was started with other settings: {}".format(directory, old))
+    else:
+        with open(filename, "w") as f:
+            json.dump(saved, f, indent=1)
+
+
+def generate(directory, dimension, games, depth = 3, jobs = None, chunk_games = 100, epsilon = 0.05,
+             random_plies = 4, seed = 0, randy = False, heuristic = 0, weights_file = None):
+    """
+    Play games (rounded up to whole chunks) into directory, skipping the
+    chunks that already exist.
+    """
+    os.makedirs(directory, exist_ok=True)
+    settings = {"directory": directory, "dimension": dimension, "games": games, "depth": depth,
+                "chunk_games": chunk_games, "epsilon": epsilon, "random_plies": random_plies, "seed": seed,
+                "randy": randy, "heuristic": heuristic, "weights": weights_file}
+    check_manifest(directory, settings)
+    chunks = (games + chunk_games - 1) // chunk_games
+    tasks = [(settings, chunk) for chunk in range(chunks) if not os.path.exists(chunk_name(directory, chunk))]
+    print("{} of {} chunks to play".format(len(tasks), chunks))
+    start = time.perf_counter()
+    done = positions = 0
+    with ProcessPoolExecutor(max_workers=jobs, initializer=init_worker,
+                             initargs=(heuristic, weights_file)) as pool:
+        for chunk, chunk_games_done, count in pool.map(play_chunk, tasks):
+            done += chunk_games_done
+            positions += count
+            print("chunk {}: {} positions ({} games, {:.1f} games/s)".format(
+                chunk, count, done, done / (time.perf_counter() - start)))
+    return done, positions
+
+
+def load_dataset(directory):
+    """
+    Return the list of chunks in directory, each a memory-mapped structured
+    array (see position_dtype).
+    """
+    return [np.load(filename, mmap_mode="r") for filename in sorted(glob.glob(os.path.join(directory, "chunk_*.npy")))]
+
+
+def main(argv):
+    usage = ('othello_selfplay.py -d <dimension> -g <games> -o <directory> [-l <depth> -j <jobs> '
+             '-c <games per chunk> -e <epsilon> -r <random plies> -s <seed> --randy --heuristic --weights <file>]')
+    dimension = 0
+    games = 0
+    directory = None
+    depth = 3
+    jobs = None
+    chunk_games = 100
+    epsilon = 0.05
+    random_plies = 4
+    seed = 0
+    randy = False
+    heuristic = 0
+    weights_file = None
+    try:
+        opts, args = getopt.getopt(argv, "hd:g:o:l:j:c:e:r:s:", ["randy", "heuristic", "weights="])
+    except getopt.GetoptError:
+        print(usage)
+        sys.exit(2)
+    for opt, arg in opts:
+        if opt == '-h':
+            print(usage)
+            sys.exit()
+        elif opt == "-d":
+            dimension = int(arg)
+        elif opt == "-g":
+            games = int(arg)
+        elif opt == "-o":
+            directory = arg
+        elif opt == "-l":
+            depth = int(arg)
+        elif opt == "-j":
+            jobs = int(arg)
+        elif opt == "-c":
+            chunk_games = int(arg)
+        elif opt == "-e":
+            epsilon = float(arg)
+        elif opt == "-r":
+            random_plies = int(arg)
+        elif opt == "-s":
+            seed = int(arg)
+        elif opt == "--randy":
+            randy = True
+        elif opt == "--heuristic":
+            heuristic = 1
+        elif opt == "--weights":
+            weights_file = arg
+            heuristic = 1
+    if dimension <= 0 or games <= 0 or directory is None:
+        print(usage)
+        sys.exit(2)
+    done, positions = generate(directory, dimension, games, depth, jobs, chunk_games, epsilon, random_plies, seed,
+                               randy, heuristic, weights_file)
+    print("Played {} games, saved {} positions to {}".format(done, positions, directory))
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -0,0 +1,93 @@
+"""
+Symmetry-canonical cache keys.
+
+The rules of Othello do not change when the board is rotated or reflected,
+so the 8 symmetries of the square map every position to positions of the
+same value, and a best move of one to the corresponding move of the others.
+canonical_zobrist picks one of the 8 as the representative of all of them
+(the one with the lowest Zobrist hash), so a transposition table keyed by it
+finds a position searched in any orientation. Moves are stored in the
+representative's orientation (to_canonical) and mapped back on the way out
+(from_canonical).
+
+This matters most in the opening: the start position is symmetric, so the
+four first moves lead to the same position up to symmetry, and early
+positions often turn up again rotated or reflected. Later on such repeats
+are rare and the 7 extra hashes are not worth computing, so the agents only
+canonicalize positions with few discs (the symmetry option).
+"""
+from othello_bitboard import zobrist_keys, iter_bits
+
+_transform_cache = {}
+
+
+def transforms(n):
+    """
+    Return (forward, inverse, keys) for an n x n board, lists with one entry
+    per symmetry, the identity first. forward[t][k] is the bit index that
+    square k moves to under symmetry t, and inverse[t] undoes it. keys[t] is
+    (dark, light): the Zobrist keys indexed by the original square, so the
+    hash of the transformed position is the XOR of keys[t] over its discs.
+    """
+    if n not in _transform_cache:
+        m = n - 1
+        squares = [(i, j) for i in range(n) for j in range(n)]   # in bit index order
+        maps = (lambda i, j: (i, j),            # identity
+                lambda i, j: (j, m - i),        # quarter turn
+                lambda i, j: (m - i, m - j),    # half turn
+                lambda i, j: (m - j, i),        # three quarter turn
+                lambda i, j: (m - i, j),        # mirror columns
+                lambda i, j: (i, m - j),        # mirror rows
+                lambda i, j: (j, i),            # main diagonal
+                lambda i, j: (m - j, m - i))    # anti-diagonal
+        forward = []
+        for transform in maps:
+            forward.append([a * n + b for a, b in (transform(i, j) for i, j in squares)])
+        inverse = []
+        for permutation in forward:
+            undo = [0] * (n * n)
+            for k, target in enumerate(permutation):
+                undo[target] = k
+            inverse.append(undo)
+        dark_keys, light_keys, _ = zobrist_keys(n)
+        keys = [([dark_keys[k] for k in permutation], [light_keys[k] for k in permutation])
+                for permutation in forward]
+        _transform_cache[n] = (forward, inverse, keys)
+    return _transform_cache[n]
+
+
+def canonical_zobrist(board):
+    """
+    Return (zobrist, transform) for a board with dimension, dark, light and
+    zobrist attributes (BitBoard or SearchBoard): the lowest Zobrist hash
+    among its 8 symmetric positions, and the symmetry that gives it.
+    """
+    forward, inverse, keys = transforms(board.dimension)
+    dark = list(iter_bits(board.dark))
+    light = list(iter_bits(board.light))
+    best, best_transform = board.zobrist, 0
+    for transform in range(1, 8):
+        dark_keys, light_keys = keys[transform]
+        h = 0
+        for k in dark:
+            h ^= dark_keys[k]
+        for k in light:
+            h ^= light_keys[k]
+        if h < best:
+            best, best_transform = h, transform
+    return best, best_transform
+
+
+def to_canonical(n, transform, index):
+    """
+    Return the bit index of square index in the canonical orientation.
+    """
+    return transforms(n)[0][transform][index]
+
+
+def from_canonical(n, transform, index):
+    """
+    Return the bit index, on the board itself, of square index of the
+    canonical orientation.
+    """
+    return transforms(n)[1][transform][index]
@@ -0,0 +1,182 @@
+"""
+Search telemetry for the agents.
+
+With the telemetry option on (--telemetry in the GUI and the tournament
+runner), an agent counts what its search does for every move in a
+SearchStats object and writes it to stderr as one line: PREFIX followed by
+a JSON record (see SearchStats.record). With the option off, the search
+functions only test a module global against None at every node.
+
+The manager (AiPlayerInterface) picks these lines out of the agent's stderr
+and collects the records of a game, and summarize_game adds them up into a
+per-game report.
+
+Searches in worker processes (--workers) are not counted, only the ones in
+the agent itself. The endgame solver adds its node count to nodes.
+"""
+import json
+import sys
+import time
+
+PREFIX = "TELEMETRY "
+
+
+class SearchStats(object):
+    """
+    Counters for the search of one move. Plies are counted from the root,
+    by the number of squares filled since then.
+    """
+
+    __slots__ = ("start", "root_empties", "nodes", "leaves", "cutoffs", "first_cutoffs",
+                 "probes", "hits", "tt_cutoffs", "stores", "expanded", "children", "depths")
+
+    def __init__(self, empties):
+        self.start = time.perf_counter()
+        self.root_empties = empties
+        self.nodes = 0          # nodes visited, leaves included
+        self.leaves = 0         # leaves evaluated
+        self.cutoffs = 0        # nodes whose search stopped early on a beta cutoff
+        self.first_cutoffs = 0  # ... already after their first move
+        self.probes = 0         # cache lookups
+        self.hits = 0           # lookups that found the position
+        self.tt_cutoffs = 0     # hits that settled the node without searching it
+        self.stores = 0
+        self.expanded = []      # ply -> nodes whose moves were searched
+        self.children = []      # ply -> legal moves at those nodes
+        self.depths = []        # [depth, seconds, nodes] of every finished iteration
+
+    def expand(self, empties, moves):
+        """
+        Count a node at empties empty squares whose moves (a count) are searched.
+        """
+        ply = self.root_empties - empties
+        while len(self.expanded) <= ply:
+            self.expanded.append(0)
+            self.children.append(0)
+        self.expanded[ply] += 1
+        self.children[ply] += moves
+
+    def cutoff(self, first):
+        self.cutoffs += 1
+        if first:
+            self.first_cutoffs += 1
+
+    def probe(self, entry, settled):
+        self.probes += 1
+        if entry is not None:
+            self.hits += 1
+            if settled:
+                self.tt_cutoffs += 1
+
+    def depth_done(self, depth, seconds):
+        self.depths.append([depth, round(seconds, 4), self.nodes])
+
+    def record(self, **extra):
+        """
+        Return the counters as a dict for JSON, with extra's items added.
+        """
+        seconds = time.perf_counter() - self.start
+        record = {"time": round(seconds, 4),
+                  "nodes": self.nodes,
+                  "leaves": self.leaves,
+                  "nps": int(self.nodes / seconds) if seconds > 0 else 0,
+                  "cutoffs": self.cutoffs,
+                  "first_cutoffs": self.first_cutoffs,
+                  "first_cutoff_rate": ratio(self.first_cutoffs, self.cutoffs),
+                  "tt_probes": self.probes,
+                  "tt_hits": self.hits,
+                  "tt_cutoffs": self.tt_cutoffs,
+                  "tt_stores": self.stores,
+                  "tt_hit_rate": ratio(self.hits, self.probes),
+                  "expanded": self.expanded,
+                  "branching": [ratio(c, e) for c, e in zip(self.children, self.expanded)],
+                  "depths": self.depths}
+        record.update(extra)
+        return record
+
+
+def ratio(a, b):
+    return round(a / b, 3) if b else None
+
+
+def emit(stats, **extra):
+    """
+    Write the record of stats (with extra's items) to stderr as one line.
+    """
+    sys.stderr.write(PREFIX + json.dumps(stats.record(**extra)) + "\n")
+    sys.stderr.flush()
+
+
+def parse_line(line):
+    """
+    Return the record in a line of agent stderr, or None if it is not a
+    telemetry line.
+    """
+    if not line.startswith(PREFIX):
+        return None
+    try:
+        return json.loads(line[len(PREFIX):])
+    except ValueError:
+        return None
+
+
+def summarize_game(records):
+    """
+    Add up the per-move records of one player (a game, or several) into a
+    report dict: totals, rates, the branching factor per ply over all moves
+    and the slowest move.
+    """
+    totals = {key: sum(record.get(key, 0) for record in records)
+              for key in ("time", "nodes", "leaves", "cutoffs", "first_cutoffs",
+                          "tt_probes", "tt_hits", "tt_cutoffs", "tt_stores")}
+    expanded, children = [], []
+    for record in records:
+        for ply, (count, branching) in enumerate(zip(record.get("expanded", []), record.get("branching", []))):
+            if ply == len(expanded):
+                expanded.append(0)
+                children.append(0.0)
+            expanded[ply] += count
+            children[ply] += count * (branching or 0)
+    report = {"moves": len(records),
+              "modes": {},
+              "time": round(totals["time"], 3),
+              "nodes": totals["nodes"],
+              "leaves": totals["leaves"],
+              "nps": int(totals["nodes"] / totals["time"]) if totals["time"] > 0 else 0,
+              "cutoffs": totals["cutoffs"],
+              "first_cutoff_rate": ratio(totals["first_cutoffs"], totals["cutoffs"]),
+              "tt_probes": totals["tt_probes"],
+              "tt_hit_rate": ratio(totals["tt_hits"], totals["tt_probes"]),
+              "tt_cutoff_rate": ratio(totals["tt_cutoffs"], totals["tt_probes"]),
+              "tt_stores": totals["tt_stores"],
+              "branching": [ratio(c, e) for c, e in zip(children, expanded)],
+              "slowest": max(records, key=lambda record: record.get("time", 0)) if records else None}
+    for record in records:
+        mode = record.get("mode", "search")
+        report["modes"][mode] = report["modes"].get(mode, 0) + 1
+    return report
+
+
+def format_report(name, report):
+    """
+    Return report (see summarize_game) as a few lines of text.
+    """
+    lines = ["{}: {} moves in {:.2f}s ({})".format(
+                 name, report["moves"], report["time"],
+                 ", ".join("{} {}".format(count, mode) for mode, count in sorted(report["modes"].items()))),
+             "  nodes {} ({} leaves), {} nodes/s".format(report["nodes"], report["leaves"], report["nps"]),
+             "  cutoffs {}, first move {}".format(report["cutoffs"], percent(report["first_cutoff_rate"])),
+             "  cache probes {}, hits {}, settled {}, stores {}".format(
+                 report["tt_probes"], percent(report["tt_hit_rate"]), percent(report["tt_cutoff_rate"]),
+                 report["tt_stores"]),
+             "  branching per ply: {}".format(" ".join("-" if b is None else "{:.1f}".format(b) for b in report["branching"]))]
+    slowest = report["slowest"]
+    if slowest:
+        lines.append("  slowest move {:.2f}s at {} empties, {} nodes, depths {}".format(
+            slowest["time"], slowest.get("empties"), slowest["nodes"],
+            " ".join("{}:{:.2f}s".format(depth, seconds) for depth, seconds, nodes in slowest["depths"]) or "-"))
+    return "\n".join(lines)
+
+
+def percent(rate):
+    return "-" if rate is None else "{:.1%}".format(rate)
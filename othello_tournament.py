@@ -0,0 +1,394 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Headless tournament runner: plays agents against each other without the GUI,
+several games at a time.
+
+Every pair of agents plays the given number of games. Colors alternate from
+one game to the next, and games cycle through the opening positions, so each
+opening is played from both sides. At the end a win/loss/draw matrix and
+per-move timing statistics are printed and, with -w, written as JSON. With
+--telemetry, the agents also report the counters of their searches (see
+othello_telemetry), which are added up per agent.
+With --profile, each agent of each game runs under a profiler (see
+othello_profile) and writes profile_<agent>_g<game>_<color>.prof.
+
+Every game is appended to a game record file (see othello_records) as it
+finishes, games.rec unless --record names another file or --no-record is
+given.
+
+With --cache-dir, each agent keeps its search cache in cache_<agent>_<dimension>.bin
+there (see othello_cache), so later games start with the positions searched
+in earlier ones.
+
+$python3 othello_tournament.py -d <dimension> [-n <games> -j <jobs> -l <depth-limit> -c -o -m]
+        [--openings <file> | --random-openings <plies>] [-w <results.json>] [--telemetry]
+        [--profile <cprofile|sample> --profile-threshold <seconds> --profile-dir <dir>]
+        [--record <games file> | --no-record] [--cache-dir <dir> --cache-entries <count>]
+        agentA.py agentB.py [agentC.py ...]
+
+An openings file has one opening per line, written as the moves to play from
+the start position: "2,3 2,2 3,2". Empty lines and lines starting with # are
+skipped.
+"""
+import sys, getopt
+import contextlib
+import json
+import os
+import random
+import statistics
+from concurrent.futures import ProcessPoolExecutor
+
+from othello_game import OthelloGameManager, AiPlayerInterface, InvalidMoveError, play_game, check_options
+from othello_records import GameWriter, MAX_DIMENSION
+from othello_shared import get_score
+from othello_telemetry import summarize_game, format_report
+
+
+def load_openings(filename):
+    openings = []
+    with open(filename) as f:
+        for line in f:
+            line = line.strip()
+            if not line or line.startswith("#"):
+                continue
+            openings.append([tuple(int(x) for x in move.split(",")) for move in line.split()])
+    return openings
+
+
+def random_openings(dimension, plies, count, seed = 0):
+    """
+    Return count different openings of plies random moves each (fewer if
+    there are not that many).
+    """
+    rng = random.Random(seed)
+    openings = []
+    seen = set()
+    for attempt in range(count * 20):
+        if len(openings) == count:
+            break
+        game = OthelloGameManager(dimension)
+        moves = []
+        for ply in range(plies):
+            possible = game.get_possible_moves()
+            if not possible:
+                break
+            move = rng.choice(possible)
+            game.play(*move)
+            moves.append(move)
+        key = tuple(tuple(row) for row in game.board)
+        if len(moves) == plies and key not in seen:
+            seen.add(key)
+            openings.append(moves)
+    return openings
+
+
+def play_match(task):
+    """
+    Play one game in this process. task is a dict with the agents, settings
+    and opening (see schedule). Returns a result dict.
+    """
+    result = {"dark": task["dark"], "light": task["light"], "opening": task["opening_index"],
+              "score": None, "timed_out": None, "forfeit": None,
+              "move_times": {"dark": [], "light": []}, "moves": [], "times": [], "final": None}
+
+    def on_move(color, move, seconds):
+        result["move_times"]["dark" if color == 1 else "light"].append(seconds)
+        result["times"].append(seconds)
+
+    game = OthelloGameManager(task["dimension"])
+    for i, j in task["opening"]:
+        game.play(i, j)
+    players = []
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        try:
+            for color, agent in ((1, task["dark"]), (2, task["light"])):
+                profiling = {}
+                if task["profiler"] is not None:
+                    # e.g. profile_agent_g3_dark.prof for the dark side of game 3
+                    name = "profile_{}_g{}_{}.prof".format(os.path.splitext(os.path.basename(agent))[0],
+                                                           task["game"], ["dark", "light"][color - 1])
+                    profiling = {"profiler": task["profiler"], "profile_threshold": task["profile_threshold"],
+                                 "profile_file": os.path.join(task["profile_dir"], name)}
+                options = task["options"]
+                if task["cache_dir"] is not None:
+                    # one cache file per agent, shared by all its games, e.g. cache_agent_8.bin
+                    name = "cache_{}_{}.bin".format(os.path.splitext(os.path.basename(agent))[0], task["dimension"])
+                    options = dict(options, cache_file=os.path.join(task["cache_dir"], name))
+                players.append(AiPlayerInterface(agent, color, task["limit"], task["minimax"],
+                                                 task["caching"], task["ordering"], options,
+                                                 interpreter=sys.executable, stderr=devnull, **profiling))
+            dark_score, light_score, timed_out = play_game(game, players[0], players[1], on_move)
+            result["score"] = [dark_score, light_score]
+            result["timed_out"] = timed_out
+        except InvalidMoveError:
+            result["forfeit"] = game.current_player
+        except (ValueError, OSError, EOFError) as error:
+            # the agent crashed or quit: the one being started, else the one to move
+            result["forfeit"] = len(players) + 1 if len(players) < 2 else game.current_player
+            result["error"] = "{}: {}".format(type(error).__name__, error)
+        finally:
+            for player in players:
+                if player.process.poll() is None:
+                    player.process.kill()
+    result["moves"] = [[i, j] for player, i, j in game.moves]
+    result["final"] = list(get_score(game.board))
+    if task["options"].get("telemetry"):
+        result["telemetry"] = {side: player.telemetry for side, player in zip(("dark", "light"), players)}
+    return result
+
+
+def winner(result):
+    """
+    Return the color that won the game in result (1 or 2), or 0 for a draw.
+    """
+    loser = result["timed_out"] or result["forfeit"]
+    if loser:
+        return 3 - loser
+    dark_score, light_score = result["score"]
+    if dark_score == light_score:
+        return 0
+    return 1 if dark_score > light_score else 2
+
+
+def schedule(agents, games, openings, settings):
+    tasks = []
+    for a in range(len(agents)):
+        for b in range(a + 1, len(agents)):
+            for k in range(games):
+                dark, light = (agents[a], agents[b]) if k % 2 == 0 else (agents[b], agents[a])
+                # each opening is played twice in a row, once with each coloring
+                index = (k // 2) % len(openings)
+                task = dict(settings, dark=dark, light=light, opening=openings[index], opening_index=index,
+                            game=len(tasks))
+                tasks.append(task)
+    return tasks
+
+
+def summarize(agents, results):
+    """
+    Return (matrix, timing). matrix[a][b] is [wins, losses, draws] of agent a
+    against agent b. timing[a] holds move time statistics in seconds.
+    """
+    matrix = {a: {b: [0, 0, 0] for b in agents} for a in agents}    # [a][a]: an agent listed twice plays itself
+    times = {a: [] for a in agents}
+    for result in results:
+        dark, light = result["dark"], result["light"]
+        won = winner(result)
+        if won == 0:
+            matrix[dark][light][2] += 1
+            matrix[light][dark][2] += 1
+        else:
+            first, second = (dark, light) if won == 1 else (light, dark)
+            matrix[first][second][0] += 1
+            matrix[second][first][1] += 1
+        times[dark].extend(result["move_times"]["dark"])
+        times[light].extend(result["move_times"]["light"])
+    timing = {}
+    for agent, samples in times.items():
+        if not samples:
+            timing[agent] = {"moves": 0}
+            continue
+        samples.sort()
+        timing[agent] = {"moves": len(samples),
+                         "mean": statistics.mean(samples),
+                         "median": statistics.median(samples),
+                         "p95": samples[min(len(samples) - 1, int(len(samples) * 0.95))],
+                         "max": samples[-1]}
+    return matrix, timing
+
+
+def summarize_telemetry(agents, results):
+    """
+    Return a dict of agent -> telemetry report (see othello_telemetry) over
+    all its moves in results.
+    """
+    records = {agent: [] for agent in agents}
+    for result in results:
+        for side, moves in result.get("telemetry", {}).items():
+            records[result[side]].extend(moves)
+    return {agent: summarize_game(moves) for agent, moves in records.items()}
+
+
+def record_game(writer, task, result):
+    """
+    Append the game in result to a GameWriter, with the times of the moves
+    the agents chose (NaN for the opening moves).
+    """
+    settings = {key: task[key] for key in ("limit", "minimax", "caching", "ordering", "options")}
+    opening = len(task["opening"])
+    times = ([float("nan")] * opening + result["times"])[:len(result["moves"])]    # not the invalid move of a forfeit
+    writer.write(task["dimension"], task["dark"], task["light"], result["moves"], result["final"], settings,
+                 times, loser=result["timed_out"] or result["forfeit"], opening=opening)
+
+
+def run_tournament(agents, dimension, games, openings = None, jobs = None, limit = -1,
+                   minimax = False, caching = False, ordering = False, options = None,
+                   profiler = None, profile_threshold = 0, profile_dir = ".", record = None, cache_dir = None):
+    """
+    Play the tournament with up to jobs games at a time and return the list
+    of game results. With a profiler (see othello_profile), every agent of
+    every game writes a profile file to profile_dir. With a record file,
+    every game is appended to it (see othello_records) as soon as it is over.
+    With cache_dir, every agent keeps its search cache in a file there from
+    game to game (see othello_cache).
+    """
+    settings = {"dimension": dimension, "limit": limit, "minimax": minimax, "caching": caching,
+                "ordering": ordering, "options": options or {}, "profiler": profiler,
+                "profile_threshold": profile_threshold, "profile_dir": profile_dir, "cache_dir": cache_dir}
+    tasks = schedule(agents, games, openings or [[]], settings)
+    results = []
+    with ProcessPoolExecutor(max_workers=jobs) as pool, \
+            (GameWriter(record) if record else contextlib.nullcontext()) as writer:
+        for task, result in zip(tasks, pool.map(play_match, tasks)):
+            if writer is not None:
+                record_game(writer, task, result)
+            results.append(result)
+    return results
+
+
+def print_report(agents, matrix, timing):
+    width = max(len(agent) for agent in agents) + 2
+    print("W/L/D".ljust(width) + "".join(agent.ljust(width) for agent in agents))
+    for a in agents:
+        cells = ["-" if a == b and not any(matrix[a][b]) else "{}/{}/{}".format(*matrix[a][b]) for b in agents]
+        print(a.ljust(width) + "".join(cell.ljust(width) for cell in cells))
+    print()
+    for agent in agents:
+        stats = timing[agent]
+        if stats["moves"]:
+            print("{}: {} moves, mean {:.3f}s, median {:.3f}s, p95 {:.3f}s, max {:.3f}s".format(
+                agent, stats["moves"], stats["mean"], stats["median"], stats["p95"], stats["max"]))
+
+
+def main(argv):
+    usage = ('othello_tournament.py -d <dimension> [-n <games> -j <jobs> -l <depth-limit> -c -o -m '
+             '--openings <file> --random-openings <plies> -w <results.json> --telemetry --profile <cprofile|sample> '
+             '--profile-threshold <seconds> --profile-dir <dir> --record <file> --no-record --cache-dir <dir>] '
+             'agentA.py agentB.py [...]')
+    size = 0
+    games = 2
+    jobs = None
+    limit = -1
+    ordering = False
+    caching = False
+    minimax = False
+    openings = None
+    random_plies = 0
+    output = None
+    options = {}
+    profiler = None
+    profile_threshold = 0
+    profile_dir = "."
+    record = "games.rec"
+    cache_dir = None
+
+    try:
+        opts, args = getopt.getopt(argv, "hcmol:d:n:j:w:", ["openings=", "random-openings=", "time=", "tt-mb=",
+                                                          "pvs", "mtdf", "workers=", "ponder", "book=",
+                                                          "endgame=", "wld=", "heuristic", "weights=", "symmetry=",
+                                                          "telemetry", "profile=", "profile-threshold=",
+                                                          "profile-dir=", "record=", "no-record",
+                                                          "cache-dir=", "cache-entries="])
+    except getopt.GetoptError:
+        print(usage)
+        sys.exit(2)
+    for opt, arg in opts:
+        if opt == '-h':
+            print(usage)
+            sys.exit()
+        elif opt == "-d":
+            size = int(arg)
+        elif opt == "-n":
+            games = int(arg)
+        elif opt == "-j":
+            jobs = int(arg)
+        elif opt == "-w":
+            output = arg
+        elif opt == "-c":
+            caching = True
+        elif opt == "-m":
+            minimax = True
+        elif opt == "-o":
+            ordering = True
+        elif opt == "-l":
+            limit = int(arg)
+        elif opt == "--openings":
+            openings = load_openings(arg)
+        elif opt == "--random-openings":
+            random_plies = int(arg)
+        elif opt == "--time":
+            options["time"] = float(arg)
+        elif opt == "--tt-mb":
+            options["tt_mb"] = float(arg)
+        elif opt == "--pvs":
+            options["pvs"] = 1
+        elif opt == "--mtdf":
+            options["mtdf"] = 1
+        elif opt == "--workers":
+            options["workers"] = int(arg)
+        elif opt == "--ponder":
+            options["ponder"] = 1
+        elif opt == "--book":
+            options["book"] = arg
+        elif opt == "--endgame":
+            options["endgame"] = int(arg)
+        elif opt == "--wld":
+            options["wld"] = int(arg)
+        elif opt == "--heuristic":
+            options["heuristic"] = 1
+        elif opt == "--weights":
+            options["weights"] = arg
+        elif opt == "--telemetry":
+            options["telemetry"] = 1
+        elif opt == "--symmetry":
+            options["symmetry"] = int(arg)
+        elif opt == "--profile":
+            profiler = arg
+        elif opt == "--profile-threshold":
+            profile_threshold = float(arg)
+        elif opt == "--profile-dir":
+            profile_dir = arg
+        elif opt == "--record":
+            record = arg
+        elif opt == "--no-record":
+            record = None
+        elif opt == "--cache-dir":
+            cache_dir = arg
+        elif opt == "--cache-entries":
+            options["cache_entries"] = int(arg)
+
+    if size <= 0 or len(args) < 2:
+        print(usage)
+        sys.exit(2)
+    if random_plies:
+        openings = random_openings(size, random_plies, max(1, (games + 1) // 2))
+
+    try:    # fail now rather than in every game
+        check_options(dict(options, cache_file=os.path.join(cache_dir, "cache.bin")) if cache_dir else options)
+    except ValueError as error:
+        print(error)
+        sys.exit(2)
+
+    if record and size > MAX_DIMENSION:
+        print("Game records hold boards of up to {0}x{0}, not recording".format(MAX_DIMENSION))
+        record = None
+
+    results = run_tournament(args, size, games, openings, jobs, limit, minimax, caching, ordering, options,
+                             profiler, profile_threshold, profile_dir, record, cache_dir)
+    agents = list(dict.fromkeys(args))     # an agent given twice plays itself
+    matrix, timing = summarize(agents, results)
+    print_report(agents, matrix, timing)
+    report = {"dimension": size, "agents": agents, "matrix": matrix, "timing": timing, "games": results}
+    if options.get("telemetry"):
+        report["telemetry"] = summarize_telemetry(agents, results)
+        for agent in agents:
+            print()
+            print(format_report(agent, report["telemetry"][agent]))
+    if output:
+        with open(output, "w") as f:
+            json.dump(report, f, indent=1)
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
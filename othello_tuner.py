@@ -0,0 +1,237 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Fits the pattern tables of othello_patterns to self-play data (see
+othello_selfplay.py) and writes them as a weights file for agent.py's
+--weights option.
+
+The pattern evaluation is linear: the value of a position is the sum of one
+table entry per line (edge, corner block, diagonal), so each entry is a
+weight and a position's features are the table index of each of its lines.
+The indices are computed for all positions at once with NumPy, then the
+weights are fitted by full-batch gradient descent:
+  - least-squares (default): the value (in discs, for dark) should predict
+    the target, the final disc differential (-y result) or the search
+    score (-y score);
+  - logistic: sigmoid(value / scale) should predict the game result, 1 for
+    a win, 0.5 for a draw and 0 for a loss. The values stay in disc units
+    (scale discs make a logit of 1).
+Each step moves every weight by its gradient divided by the number of
+positions that use it, so rare and common table entries learn at the same
+rate. Regularization (-r) pulls entries towards the default weights, which
+keeps patterns that hardly occur in the data near a sensible value.
+
+The last tenth of the data (by chunk) is held out. The error on it (the
+loss being minimized: mean squared error, or log loss for logistic) is
+printed for the default weights and every 10 iterations, and the weights of
+the check with the lowest held-out error are the ones written.
+
+$python3 othello_tuner.py -i <dataset directory> -o <weights file> [-n <iterations> -m <least-squares|logistic>
+        -y <result|score> -r <regularization> --scale <discs> --min-ply <ply>]
+"""
+import sys, getopt
+import time
+
+import numpy as np
+
+from othello_patterns import KINDS, pattern_squares, default_weights, save_weights
+from othello_selfplay import load_dataset
+
+BATCH = 1 << 16     # positions per batch when computing indices
+
+
+def table_layout(n):
+    """
+    Return (offsets, instances): the offset of each kind's table in the
+    weight vector (plus the total length under None), and the list of
+    (kind, squares) of every line on the board.
+    """
+    offsets = {}
+    total = 0
+    instances = []
+    for kind, lines in pattern_squares(n).items():
+        offsets[kind] = total
+        total += 3 ** len(lines[0])
+        instances.extend((kind, squares) for squares in lines)
+    offsets[None] = total
+    return offsets, instances
+
+
+def line_indices(boards, offsets, instances):
+    """
+    Return a (B, lines) int32 array: for each board of the (B, n, n) array
+    and each line, the position of its table entry in the weight vector.
+    """
+    result = np.empty((boards.shape[0], len(instances)), dtype=np.int32)
+    for line, (kind, squares) in enumerate(instances):
+        index = np.full(boards.shape[0], offsets[kind], dtype=np.int32)
+        for k, (i, j) in enumerate(squares):
+            # the square's value is its base-3 digit: 1 for dark, 2 for light
+            index += boards[:, j, i].astype(np.int32) * 3 ** k
+        result[:, line] = index
+    return result
+
+
+def load_features(directory, target = "result", min_ply = 0):
+    """
+    Return (n, indices, targets, split): the line indices and the targets
+    (for dark) of every usable position in the dataset, and the number of
+    positions that come before the held-out chunks.
+    """
+    chunks = load_dataset(directory)
+    if not chunks:
+        raise ValueError("no data in {}".format(directory))
+    n = chunks[0].dtype["board"].shape[0]
+    offsets, instances = table_layout(n)
+    held_out = max(1, len(chunks) // 10) if len(chunks) > 1 else 0
+    indices, targets = [], []
+    for number, chunk in enumerate(chunks):
+        for start in range(0, len(chunk), BATCH):
+            batch = chunk[start:start + BATCH]
+            keep = (batch["ply"] >= min_ply) & np.isfinite(batch["score"])
+            batch = batch[keep]
+            sign = np.where(batch["player"] == 1, 1.0, -1.0).astype(np.float32)
+            indices.append(line_indices(batch["board"], offsets, instances))
+            targets.append(batch[target].astype(np.float32) * sign)
+        if number == len(chunks) - held_out - 1:
+            split = sum(len(x) for x in targets)
+    return n, np.concatenate(indices), np.concatenate(targets), split
+
+
+def predict(weights, indices):
+    return weights[indices].sum(axis=1)
+
+
+def loss(weights, indices, targets, method, scale):
+    """
+    Return the error that fit minimizes: the mean squared error, or for
+    logistic the mean log loss of the predicted result.
+    """
+    values = predict(weights, indices)
+    if method == "logistic":
+        logits = values / scale
+        result = outcome(targets)
+        # -log(p) = log(1 + e^-z) and -log(1 - p) = log(1 + e^z), without overflow
+        return float(np.mean(result * np.logaddexp(0, -logits) + (1 - result) * np.logaddexp(0, logits)))
+    return float(np.mean((values - targets) ** 2))
+
+
+def outcome(targets):
+    return (np.sign(targets) + 1) / 2    # 1 win, 0.5 draw, 0 loss
+
+
+def fit(indices, targets, initial, method = "least-squares", iterations = 200, regularization = 100.0, scale = 8.0,
+        report = None):
+    """
+    Fit the weight vector to (indices, targets), starting from and
+    regularized towards initial. report(iteration, weights) is called every
+    10 iterations.
+    """
+    weights = initial.astype(np.float64)
+    flat = indices.ravel()
+    lines = indices.shape[1]
+    counts = np.bincount(flat, minlength=len(weights))
+    step = 1.0 / (lines * (counts + regularization))
+    if method == "logistic":
+        result = outcome(targets)
+    for iteration in range(1, iterations + 1):
+        values = predict(weights, indices)
+        if method == "logistic":
+            p = 1 / (1 + np.exp(-values / scale))
+            # gradient of the log loss in disc units, times scale^2 so the step matches least squares
+            residual = (p - result) * scale
+        else:
+            residual = values - targets
+        gradient = np.bincount(flat, weights=np.repeat(residual, lines), minlength=len(weights))
+        gradient += regularization * (weights - initial)
+        weights -= step * gradient
+        if report is not None and iteration % 10 == 0:
+            report(iteration, weights)
+    return weights
+
+
+def tables_from_weights(n, weights):
+    offsets, instances = table_layout(n)
+    patterns = pattern_squares(n)
+    return {kind: weights[offsets[kind]:offsets[kind] + 3 ** len(patterns[kind][0])].round(4).tolist()
+            for kind in KINDS}
+
+
+def tune(directory, output, iterations = 200, method = "least-squares", target = "result", regularization = 100.0,
+         scale = 8.0, min_ply = 0):
+    start = time.perf_counter()
+    n, indices, targets, split = load_features(directory, target, min_ply)
+    print("{} positions ({} held out), features in {:.1f}s".format(
+        len(targets), len(targets) - split, time.perf_counter() - start))
+    defaults = default_weights(n)
+    initial = np.concatenate([np.asarray(defaults[kind], dtype=np.float64) for kind in KINDS])
+    train = indices[:split], targets[:split]
+    test = indices[split:], targets[split:]
+
+    def errors(weights):
+        return "train {:.4f}, test {}".format(
+            loss(weights, *train, method, scale),
+            "{:.4f}".format(loss(weights, *test, method, scale)) if len(test[1]) else "-")
+
+    best = [float("inf"), initial]     # held-out error and weights of the best iteration so far
+
+    def report(iteration, weights):
+        print("iteration {}: {} ({:.1f}s)".format(iteration, errors(weights), time.perf_counter() - start))
+        if len(test[1]):
+            error = loss(weights, *test, method, scale)
+            if error < best[0]:
+                best[:] = error, weights.copy()
+
+    print("default weights: {}".format(errors(initial)))
+    weights = fit(*train, initial, method, iterations, regularization, scale, report)
+    if len(test[1]):    # stop where the held-out error was lowest
+        weights = best[1]
+    save_weights(output, n, tables_from_weights(n, weights))
+    print("Wrote {}x{} weights to {}".format(n, n, output))
+
+
+def main(argv):
+    usage = ('othello_tuner.py -i <dataset directory> -o <weights file> [-n <iterations> '
+             '-m <least-squares|logistic> -y <result|score> -r <regularization> --scale <discs> --min-ply <ply>]')
+    directory = None
+    output = None
+    iterations = 200
+    method = "least-squares"
+    target = "result"
+    regularization = 100.0
+    scale = 8.0
+    min_ply = 0
+    try:
+        opts, args = getopt.getopt(argv, "hi:o:n:m:y:r:", ["scale=", "min-ply="])
+    except getopt.GetoptError:
+        print(usage)
+        sys.exit(2)
+    for opt, arg in opts:
+        if opt == '-h':
+            print(usage)
+            sys.exit()
+        elif opt == "-i":
+            directory = arg
+        elif opt == "-o":
+            output = arg
+        elif opt == "-n":
+            iterations = int(arg)
+        elif opt == "-m":
+            method = arg
+        elif opt == "-y":
+            target = arg
+        elif opt == "-r":
+            regularization = float(arg)
+        elif opt == "--scale":
+            scale = float(arg)
+        elif opt == "--min-ply":
+            min_ply = int(arg)
+    if directory is None or output is None or method not in ("least-squares", "logistic") \
+            or target not in ("result", "score"):
+        print(usage)
+        sys.exit(2)
+    tune(directory, output, iterations, method, target, regularization, scale, min_ply)
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
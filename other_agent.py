@@ -7,9 +7,14 @@ import sys
 import time
 
 # You can use the functions in othello_shared to write your AI
-from othello_shared import find_lines, get_possible_moves, get_score, play_move
+from othello_bitboard import find_lines, get_possible_moves, get_score, play_move, to_bitboard
+from othello_protocol import intro, BoardReader
+from transposition import TranspositionTable, node_key, bound_flag, EXACT, LOWER, UPPER, NO_MOVE
+from othello_telemetry import SearchStats, emit
+from othello_cache import load_cache, save_cache, signature, DEFAULT_ENTRIES
 
-cache_dict = {}
+cache_table = TranspositionTable()
+stats = None # SearchStats of the current move when telemetry is on
 
 def eprint(*args, **kwargs): #you can use this for debugging, as it will print to sterr and not stdout
     print(*args, file=sys.stderr, **kwargs)
@@ -62,21 +67,58 @@ def compute_heuristic(board, color): #not implemented, optional
 
     return score
 
+def empty_squares(board):
+    return len(board) * len(board) - sum(get_score(board))
+
+def cache_lookup(board, to_move, color, alpha, beta, limit):
+    # returns (key, (move, value) or None)
+    key = node_key(board.zobrist, to_move, color)
+    entry = cache_table.probe(key)
+    if entry is not None and entry[1] >= limit:
+        value, flag, index = entry[0], entry[2], entry[3]
+        if flag == EXACT or (flag == LOWER and value >= beta) or (flag == UPPER and value <= alpha):
+            move = None if index == NO_MOVE else divmod(index, len(board))
+            if stats is not None:
+                stats.probe(entry, True)
+            return key, (move, value)
+    if stats is not None:
+        stats.probe(entry, False)
+    return key, None
+
+def cache_signature(minimax):
+    # minimax scores leaves with compute_utility, alpha-beta with
+    # compute_heuristic: their values must not share a cache file
+    return signature("other_agent.py", minimax)
+
+def cache_store(board, key, limit, alpha, beta, move, value):
+    if stats is not None:
+        stats.stores += 1
+    index = NO_MOVE if move is None else move[0] * len(board) + move[1]
+    cache_table.store(key, limit, bound_flag(value, alpha, beta), value, index)
+
 ############ MINIMAX ###############################
 def minimax_min_node(board, color, limit, caching = 0):
     #IMPLEMENT
-    if caching == 1:
-        if (board, color) in cache_dict:
-            return cache_dict[(board, color)]
+    if stats is not None:
+        stats.nodes += 1
 
     if color == 1:
         opp_color = 2
     else:
         opp_color = 1
 
+    if caching == 1:
+        key, cached = cache_lookup(board, opp_color, color, float('-inf'), float('inf'), limit)
+        if cached is not None:
+            return cached
+
     possible_moves = get_possible_moves(board, opp_color)
     if len(possible_moves) == 0 or limit == 0:
+        if stats is not None:
+            stats.leaves += 1
         return (None, compute_utility(board, color))
+    if stats is not None:
+        stats.expand(empty_squares(board), len(possible_moves))
 
     next_move = None
     next_move_val = float('inf')
@@ -88,7 +130,7 @@ def minimax_min_node(board, color, limit, caching = 0):
             next_move_val = new_val
 
     if caching == 1:
-        cache_dict[(board, color)] = (next_move, next_move_val)
+        cache_store(board, key, limit, float('-inf'), float('inf'), next_move, next_move_val)
 
     return (next_move, next_move_val)
 
@@ -96,13 +138,21 @@ def minimax_min_node(board, color, limit, caching = 0):
 
 def minimax_max_node(board, color, limit, caching = 0): #returns highest possible utility
     #IMPLEMENT
+    if stats is not None:
+        stats.nodes += 1
+
     if caching == 1:
-        if (board, color) in cache_dict:
-            return cache_dict[(board, color)]
+        key, cached = cache_lookup(board, color, color, float('-inf'), float('inf'), limit)
+        if cached is not None:
+            return cached
 
     possible_moves = get_possible_moves(board, color)
     if len(possible_moves) == 0 or limit == 0:
+        if stats is not None:
+            stats.leaves += 1
         return (None, compute_utility(board, color))
+    if stats is not None:
+        stats.expand(empty_squares(board), len(possible_moves))
 
     next_move = None
     next_move_val = float('-inf')
@@ -114,7 +164,7 @@ def minimax_max_node(board, color, limit, caching = 0): #returns highest possibl
             next_move_val = new_val
 
     if caching == 1:
-        cache_dict[(board, color)] = (next_move, next_move_val)
+        cache_store(board, key, limit, float('-inf'), float('inf'), next_move, next_move_val)
 
     return (next_move, next_move_val)
 
@@ -136,26 +186,38 @@ def select_move_minimax(board, color, limit, caching = 0):
     If caching is OFF (i.e. 0), do NOT use state caching to reduce the number of state evaluations.
     """
     #IMPLEMENT
-    cache_dict.clear()
-    return minimax_max_node(tuple([tuple(row) for row in board]), color, limit, caching)[0]
+    cache_table.new_search()
+    board = to_bitboard(board)
+    if limit < 0: # no depth limit, the game ends before every square is filled
+        limit = empty_squares(board)
+    return minimax_max_node(board, color, limit, caching)[0]
     #return (0,0) #change this!
 
 ############ ALPHA-BETA PRUNING #####################
 def alphabeta_min_node(board, color, alpha, beta, limit, caching = 0, ordering = 0):
     #IMPLEMENT
-    if caching == 1:
-        if (board, color) in cache_dict:
-            return cache_dict[(board, color)]
+    if stats is not None:
+        stats.nodes += 1
 
     if color == 1:
         opp_color = 2
     else:
         opp_color = 1
 
+    if caching == 1:
+        key, cached = cache_lookup(board, opp_color, color, alpha, beta, limit)
+        if cached is not None:
+            return cached
+    beta_orig = beta
+
     possible_moves = get_possible_moves(board, opp_color)
     if len(possible_moves) == 0 or limit == 0:
+        if stats is not None:
+            stats.leaves += 1
         # return (None, compute_utility(board, color))
         return (None, compute_heuristic(board, color))
+    if stats is not None:
+        stats.expand(empty_squares(board), len(possible_moves))
 
     if ordering == 1:
         move_value = {}
@@ -175,23 +237,34 @@ def alphabeta_min_node(board, color, alpha, beta, limit, caching = 0, ordering =
                 next_move = move
                 next_move_val = new_val
                 beta = new_val
+            if stats is not None and beta <= alpha:
+                stats.cutoff(move == possible_moves[0])
 
     if caching == 1:
-        cache_dict[(board, color)] = (next_move, next_move_val)
+        cache_store(board, key, limit, alpha, beta_orig, next_move, next_move_val)
 
     return (next_move, next_move_val)
     # return ((0,0),0) #change this!
 
 def alphabeta_max_node(board, color, alpha, beta, limit, caching = 0, ordering = 0):
     #IMPLEMENT
+    if stats is not None:
+        stats.nodes += 1
+
     if caching == 1:
-        if (board, color) in cache_dict:
-            return cache_dict[(board, color)]
+        key, cached = cache_lookup(board, color, color, alpha, beta, limit)
+        if cached is not None:
+            return cached
+    alpha_orig = alpha
 
     possible_moves = get_possible_moves(board, color)
     if len(possible_moves) == 0 or limit == 0:
+        if stats is not None:
+            stats.leaves += 1
         # return (None, compute_utility(board, color))
         return (None, compute_heuristic(board, color))
+    if stats is not None:
+        stats.expand(empty_squares(board), len(possible_moves))
 
 
     if ordering == 1:
@@ -214,9 +287,11 @@ def alphabeta_max_node(board, color, alpha, beta, limit, caching = 0, ordering =
                 next_move = move
                 next_move_val = new_val
                 alpha = new_val
+            if stats is not None and beta <= alpha:
+                stats.cutoff(move == possible_moves[0])
 
     if caching == 1:
-        cache_dict[(board, color)] = (next_move, next_move_val)
+        cache_store(board, key, limit, alpha_orig, beta, next_move, next_move_val)
 
     return (next_move, next_move_val)
 
@@ -238,8 +313,11 @@ def select_move_alphabeta(board, color, limit, caching = 0, ordering = 0):
     If ordering is OFF (i.e. 0), do NOT use node ordering to expedite pruning and reduce the number of state evaluations.
     """
     #IMPLEMENT
-    cache_dict.clear()
-    return alphabeta_max_node(tuple([tuple(row) for row in board]), color, float('-inf'), float('inf'), limit, caching, ordering)[0]
+    cache_table.new_search()
+    board = to_bitboard(board)
+    if limit < 0: # no depth limit, the game ends before every square is filled
+        limit = empty_squares(board)
+    return alphabeta_max_node(board, color, float('-inf'), float('inf'), limit, caching, ordering)[0]
 
 ####################################################
 def run_ai():
@@ -249,7 +327,8 @@ def run_ai():
     Then it repeatedly receives the current score and current board state
     until the game is over.
     """
-    print("Other agent") # First line is the name of this AI
+    global stats
+    print(intro("Other agent")) # First line is the name of this AI (and the protocols it reads)
     arguments = input().split(",")
 
     color = int(arguments[0]) #Player color: 1 for dark (goes first), 2 for light.
@@ -257,6 +336,15 @@ def run_ai():
     minimax = int(arguments[2]) #Minimax or alpha beta
     caching = int(arguments[3]) #Caching
     ordering = int(arguments[4]) #Node-ordering (for alpha-beta only)
+    options = dict(arg.split("=", 1) for arg in arguments[5:]) #Extra key=value settings
+    reader = BoardReader(options) #Board protocol agreed on the handshake
+    telemetry = int(options.get("telemetry", 0)) #Write search counters for every move to stderr
+    cache_file = options.get("cache_file") #Keep the cache in this file from game to game (see othello_cache.py)
+    cache_entries = int(options.get("cache_entries", DEFAULT_ENTRIES)) #Most entries kept in the cache file
+    cache_settings = cache_signature(minimax) #Only load cache entries scored the same way
+
+    if "tt_mb" in options: #Transposition table size in megabytes
+        cache_table.resize(int(float(options["tt_mb"]) * 1024 * 1024))
 
     if (minimax == 1): eprint("Running MINIMAX")
     else: eprint("Running ALPHA-BETA")
@@ -267,11 +355,18 @@ def run_ai():
     if (ordering == 1): eprint("Node Ordering is ON")
     else: eprint("Node Ordering is OFF")
 
+    if (caching == 1): eprint("Cache holds", cache_table.size, "entries")
+
     if (limit == -1): eprint("Depth Limit is OFF")
     else: eprint("Depth Limit is ", limit)
 
+    if (telemetry == 1): eprint("Telemetry is ON")
+
+    if (cache_file is not None and caching == 1): eprint("Cache file is", cache_file, "with up to", cache_entries, "entries")
+
     if (minimax == 1 and ordering == 1): eprint("Node Ordering should have no impact on Minimax")
 
+    dimension = None
     while True: # This is the main loop
         # Read in the current game status, for example:
         # "SCORE 2 2" or "FINAL 33 31" if the game is over.
@@ -282,14 +377,27 @@ def run_ai():
         light_score = int(light_score_s)
 
         if status == "FINAL": # Game is over.
-            print
+            if cache_file is not None and caching == 1 and dimension is not None:
+                eprint("Saved", save_cache(cache_table, cache_file, dimension, cache_settings,
+                                           cache_entries), "entries to", cache_file)
+            break
         else:
-            board = eval(input()) # Read in the input and turn it into a Python
-                                  # object. The format is a list of rows. The
-                                  # squares in each row are represented by
-                                  # 0 : empty square
-                                  # 1 : dark disk (player 1)
-                                  # 2 : light disk (player 2)
+            board = reader.read(input()) # Read in the board. With the text protocol
+                                         # it is a list of rows, the squares in
+                                         # each row are represented by
+                                         # 0 : empty square
+                                         # 1 : dark disk (player 1)
+                                         # 2 : light disk (player 2)
+                                         # See othello_protocol for the packed one.
+
+            if dimension is None: #first board: warm the cache up with the entries of earlier games
+                dimension = len(board)
+                if cache_file is not None and caching == 1:
+                    eprint("Loaded", load_cache(cache_table, cache_file, dimension, cache_settings),
+                           "entries from", cache_file)
+
+            if telemetry == 1:
+                stats = SearchStats(empty_squares(to_bitboard(board)))
 
             # Select the move and send it to the manager
             if (minimax == 1): #run this if the minimax flag is given
@@ -297,6 +405,9 @@ def run_ai():
             else: #else run alphabeta
                 movei, movej = select_move_alphabeta(board, color, limit, caching, ordering)
 
+            if stats is not None: #one JSON line on stderr, before the move
+                emit(stats, color=color, empties=stats.root_empties, mode="minimax" if minimax == 1 else "alphabeta",
+                     move=[movei, movej])
             print("{} {}".format(movei, movej))
 
 if __name__ == "__main__":
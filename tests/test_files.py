@@ -0,0 +1,173 @@
+"""
+Game records, opening books and search cache files must read back what was
+written.
+"""
+import multiprocessing
+import os
+import random
+
+import agent
+import other_agent
+import othello_bitboard
+from othello_benchmark import fixed_positions, start_board
+from othello_records import GameWriter, read_games
+from opening_book import OpeningBook, write_book, position_key, start_position, book_signature
+from othello_cache import load_cache, save_cache, read_cache, MIN_DEPTH
+from transposition import TranspositionTable, EXACT, LOWER, UPPER, NO_MOVE
+
+
+def random_game(dimension, seed):
+    """
+    Return the moves and final (dark, light) score of a seeded random game.
+    """
+    rng = random.Random(seed)
+    board, player, moves = start_board(dimension), 1, []
+    while True:
+        legal = othello_bitboard.get_possible_moves(board, player)
+        if not legal:
+            return moves, othello_bitboard.get_score(board)
+        move = rng.choice(legal)
+        moves.append(move)
+        board = othello_bitboard.play_move(board, player, *move).to_rows()
+        player = 3 - player
+
+
+def test_records_round_trip(tmp_path):
+    filename = str(tmp_path / "games.rec")
+    games = []
+    with GameWriter(filename) as writer:
+        for k, (dimension, settings) in enumerate([(8, {"depth": 4}), (8, {"depth": 4}), (6, None), (18, None)]):
+            moves, score = random_game(dimension, k)
+            times = [0.25 * (m % 5) for m in range(len(moves))] if k % 2 == 0 else None
+            evals = [None if m % 3 == 0 else float(m) for m in range(len(moves))] if k < 2 else None
+            dark, light = ("a", "b") if k % 2 == 0 else ("b", "c")
+            writer.write(dimension, dark, light, moves, score, settings, times, evals, loser=k % 3, opening=k)
+            games.append((dimension, dark, light, settings or {}, moves, score, k % 3, k, times, evals))
+    records = list(read_games(filename))
+    assert [tuple(record) for record in records] == [tuple(game) for game in games]
+
+
+def test_records_skip_cut_off_game(tmp_path):
+    filename = str(tmp_path / "games.rec")
+    with GameWriter(filename) as writer:
+        for k in range(2):
+            moves, score = random_game(6, k)
+            writer.write(6, "a", "b", moves, score)
+    with open(filename, "rb") as f:
+        data = f.read()
+    with open(filename, "wb") as f:
+        f.write(data[:-5])
+    assert len(list(read_games(filename))) == 1
+
+
+def test_records_skip_cut_off_header(tmp_path):
+    filename = str(tmp_path / "games.rec")
+    with GameWriter(filename) as writer:
+        moves, score = random_game(6, 0)
+        writer.write(6, "a", "b", moves, score)
+        second = os.path.getsize(filename)
+        writer.write(6, "a", "c", moves, score)    # a new agent: a second header
+    with open(filename, "rb") as f:
+        data = f.read()
+    for damaged in (data[:second + 12], data[:second + 5] + b"{" * (len(data) - second - 5)):
+        with open(filename, "wb") as f:
+            f.write(damaged)
+        assert len(list(read_games(filename))) == 1
+
+
+def test_book_round_trip(tmp_path):
+    filename = str(tmp_path / "book.bin")
+    rng = random.Random(0)
+    positions = [(othello_bitboard.to_bitboard(board), player) for board, player in fixed_positions(8, 20, seed=5)]
+    entries = {position_key(board, player): rng.choice(othello_bitboard.get_possible_moves(board, player))
+               for board, player in positions}
+    write_book(filename, 8, entries, book_signature(0))
+    book = OpeningBook(filename, book_signature(0))
+    try:
+        for board, player in positions:
+            assert book.lookup(board, player) == entries[position_key(board, player)]
+        assert book.lookup(start_position(8), 1) is None
+        assert book.lookup(start_position(6), 1) is None
+    finally:
+        book.close()
+    # an agent with the heuristic ON does not play moves searched without it
+    book = OpeningBook(filename, book_signature(1))
+    try:
+        assert not book.matches
+        assert all(book.lookup(board, player) is None for board, player in positions)
+    finally:
+        book.close()
+
+
+def filled_table(seed, count = 500):
+    table = TranspositionTable(64 * 1024)
+    rng = random.Random(seed)
+    for _ in range(count):
+        move = rng.choice([NO_MOVE, rng.randrange(64)])
+        table.store(rng.getrandbits(63), rng.randrange(8), rng.choice([EXACT, LOWER, UPPER]),
+                    rng.randrange(-64, 65) / 4, move)
+    return table
+
+
+def test_cache_round_trip(tmp_path):
+    filename = str(tmp_path / "cache.bin")
+    table = filled_table(1)
+    expected = {key: (depth, flag, value, move) for key, depth, flag, value, move in table.entries(MIN_DEPTH)}
+    assert save_cache(table, filename, 8, 12345) == len(expected)
+    loaded = TranspositionTable(64 * 1024)
+    assert load_cache(loaded, filename, 8, 12345) == len(expected)
+    assert {key: (depth, flag, value, move) for key, depth, flag, value, move in loaded.entries()} == expected
+    # another dimension or other evaluation settings: nothing is loaded
+    assert load_cache(TranspositionTable(64 * 1024), filename, 6, 12345) == 0
+    assert load_cache(TranspositionTable(64 * 1024), filename, 8, 54321) == 0
+
+
+def test_cache_other_agent_modes(tmp_path, monkeypatch):
+    # minimax and alpha-beta score leaves differently: neither loads the other's entries
+    filename = str(tmp_path / "cache.bin")
+    monkeypatch.setattr(other_agent, "cache_table", TranspositionTable())
+    board, color = fixed_positions(6, 1, seed=7)[0]
+    other_agent.select_move_alphabeta(othello_bitboard.to_bitboard(board), color, 4, caching=1)
+    save_cache(other_agent.cache_table, filename, 6, other_agent.cache_signature(0))
+    assert load_cache(TranspositionTable(64 * 1024), filename, 6, other_agent.cache_signature(1)) == 0
+    assert load_cache(TranspositionTable(64 * 1024), filename, 6, other_agent.cache_signature(0)) > 0
+
+
+def test_cache_merge_keeps_deepest(tmp_path):
+    filename = str(tmp_path / "cache.bin")
+    first, second = filled_table(2), filled_table(3)
+    save_cache(first, filename, 8, 1)
+    save_cache(second, filename, 8, 1, max_entries=100)
+    entries = read_cache(filename, 8, 1)[2]
+    assert len(entries) == 100
+    depths = sorted((depth for table in (first, second) for key, depth, flag, value, move in table.entries(MIN_DEPTH)),
+                    reverse=True)
+    assert sorted((depth for key, depth, flag, value, move in entries), reverse=True) == depths[:100]
+
+
+def save_filled_table(task):
+    # worker: save a table of its own into the shared file
+    filename, seed = task
+    table = filled_table(seed)
+    save_cache(table, filename, 8, 1)
+    return {key for key, depth, flag, value, move in table.entries(MIN_DEPTH)}
+
+
+def test_cache_concurrent_saves(tmp_path):
+    filename = str(tmp_path / "cache.bin")
+    with multiprocessing.Pool(4) as pool:
+        saved = pool.map(save_filled_table, [(filename, seed) for seed in range(10, 18)])
+    assert {key for key, depth, flag, value, move in read_cache(filename, 8, 1)[2]} == set().union(*saved)
+
+
+def test_cache_after_search(tmp_path, monkeypatch):
+    filename = str(tmp_path / "cache.bin")
+    monkeypatch.setattr(agent, "transposition_table", TranspositionTable())
+    board, color = fixed_positions(6, 1, seed=6)[0]
+    move = agent.select_move_alphabeta(board, color, 5, caching=1, ordering=1)
+    save_cache(agent.transposition_table, filename, 6, 0)
+    agent.transposition_table.clear()
+    assert load_cache(agent.transposition_table, filename, 6, 0) > 0
+    key, result, hash_move = agent.probe_cache(agent.new_search_board(board), color, color,
+                                               float("-inf"), float("inf"), 5)
+    assert hash_move == move
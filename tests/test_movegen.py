@@ -0,0 +1,77 @@
+"""
+The bitboard and NumPy move generators must agree with othello_shared, the
+reference implementation, on moves, resulting boards and scores.
+"""
+import random
+
+import pytest
+
+import othello_shared
+import othello_bitboard
+from othello_benchmark import start_board
+
+
+def random_positions(dimension, count, seed):
+    """
+    Return count (board, player) pairs from random games played with
+    othello_shared, at every stage of the game including the end.
+    """
+    rng = random.Random(seed)
+    positions = []
+    while len(positions) < count:
+        board, player = start_board(dimension), 1
+        while True:
+            positions.append((board, player))
+            moves = othello_shared.get_possible_moves(board, player)
+            if not moves:
+                break
+            board = othello_shared.play_move(board, player, *rng.choice(moves))
+            player = 3 - player
+    return positions[:count]
+
+
+@pytest.mark.parametrize("dimension", [4, 6, 8, 10])
+def test_bitboard_matches_shared(dimension):
+    for board, player in random_positions(dimension, 200, seed=dimension):
+        moves = othello_shared.get_possible_moves(board, player)
+        assert othello_bitboard.get_possible_moves(board, player) == moves
+        assert othello_bitboard.get_score(board) == othello_shared.get_score(board)
+        for i, j in moves:
+            expected = othello_shared.play_move(board, player, i, j)
+            assert [list(row) for row in othello_bitboard.play_move(board, player, i, j).to_rows()] == \
+                [list(row) for row in expected]
+
+
+@pytest.mark.parametrize("dimension", [6, 8])
+def test_search_board_make_undo(dimension):
+    for board, player in random_positions(dimension, 100, seed=dimension + 1):
+        search_board = othello_bitboard.SearchBoard.from_board(board)
+        before = (search_board.dark, search_board.light, search_board.zobrist)
+        for i, j in othello_shared.get_possible_moves(board, player):
+            flips = search_board.make_move(player, i, j)
+            after = othello_bitboard.to_bitboard(othello_shared.play_move(board, player, i, j))
+            assert (search_board.dark, search_board.light, search_board.zobrist) == \
+                (after.dark, after.light, after.zobrist)
+            search_board.undo_move(player, i, j, flips)
+            assert (search_board.dark, search_board.light, search_board.zobrist) == before
+
+
+@pytest.mark.parametrize("dimension", [4, 6, 8])
+def test_numpy_matches_shared(dimension):
+    pytest.importorskip("numpy")
+    import othello_numpy
+    positions = random_positions(dimension, 150, seed=dimension + 2)
+    boards = othello_numpy.to_array([board for board, player in positions])
+    players = [player for board, player in positions]
+    all_moves = othello_numpy.get_possible_moves(boards, players)
+    for (board, player), moves in zip(positions, all_moves):
+        assert moves == othello_shared.get_possible_moves(board, player)
+    assert othello_numpy.get_scores(boards).tolist() == \
+        [list(othello_shared.get_score(board))
+         for board, player in positions]
+    playable = [k for k, moves in enumerate(all_moves) if moves]
+    chosen = [all_moves[k][len(all_moves[k]) // 2] for k in playable]
+    played = othello_numpy.play_moves(boards[playable], [players[k] for k in playable], chosen)
+    for k, move, result in zip(playable, chosen, played):
+        board, player = positions[k]
+        assert result.tolist() == [list(row) for row in othello_shared.play_move(board, player, *move)]
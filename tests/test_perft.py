@@ -0,0 +1,22 @@
+"""
+Perft: the number of move sequences from the start position, which depends
+only on the rules, so any change to it is a move generation bug.
+"""
+import pytest
+
+import othello_shared
+import othello_bitboard
+from othello_benchmark import KNOWN_PERFT_8, perft, start_board
+
+
+@pytest.mark.parametrize("module, depth", [(othello_shared, 5), (othello_bitboard, 6)])
+def test_perft_8x8(module, depth):
+    board = start_board(8)
+    assert [perft(module, board, 1, d) for d in range(1, depth + 1)] == KNOWN_PERFT_8[:depth]
+
+
+@pytest.mark.parametrize("dimension", [4, 6])
+def test_perft_backends_agree(dimension):
+    board = start_board(dimension)
+    for depth in range(1, 6):
+        assert perft(othello_bitboard, board, 1, depth) == perft(othello_shared, board, 1, depth)
@@ -0,0 +1,174 @@
+"""
+Every search mode must find the same root value as plain minimax: the
+alpha-beta variants (caching, ordering, PVS, aspiration windows, MTD(f),
+symmetry-canonical caching) only save work, and the endgame solver must
+agree with a search to the end of the game.
+"""
+import random
+
+import pytest
+
+import agent
+import othello_bitboard
+from othello_benchmark import fixed_positions, reset_agent, start_board
+from othello_endgame import solve
+from othello_patterns import default_weights, save_weights
+
+DEPTH = 4
+
+
+@pytest.fixture(params=[0, 1], ids=["discs", "heuristic"])
+def evaluation(request, monkeypatch):
+    monkeypatch.setattr(agent, "heuristic", request.param)
+    return request.param
+
+
+def root_search(search, board, color):
+    reset_agent()
+    return search(agent.new_search_board(board), color)
+
+
+def minimax_value(board, color, depth = DEPTH):
+    reset_agent()
+    return agent.minimax_max_node(agent.new_search_board(board), color, depth)[1]
+
+
+def check_result(board, color, result, expected):
+    """
+    Check that result, the (move, value) of a root search, has the
+    expected value and that its move is legal and reaches that value.
+    """
+    move, value = result
+    assert value == expected
+    assert move in othello_bitboard.get_possible_moves(board, color)
+    after = othello_bitboard.play_move(board, color, *move).to_rows()
+    reset_agent()
+    assert agent.minimax_min_node(agent.new_search_board(after), color, DEPTH - 1)[1] == expected
+
+
+def alphabeta(caching, ordering, pvs):
+    return lambda board, color: agent.alphabeta_max_node(
+        board, color, float("-inf"), float("inf"), DEPTH, caching, ordering, pvs)
+
+
+MODES = {
+    "alphabeta": alphabeta(0, 0, 0),
+    "caching": alphabeta(1, 0, 0),
+    "ordering": alphabeta(1, 1, 0),
+    "pvs": alphabeta(1, 1, 1),
+    "aspiration": lambda board, color: agent.aspiration_search(board, color, DEPTH, 0, 1, 1, 1),
+    "mtdf": lambda board, color: agent.mtdf_search(board, color, DEPTH, 0, 1, 1, 0),
+    "mtdf pvs": lambda board, color: agent.mtdf_search(board, color, DEPTH, 0, 1, 1, 1),
+}
+
+
+@pytest.mark.parametrize("dimension", [6, 8])
+def test_modes_match_minimax(dimension, evaluation):
+    for board, color in fixed_positions(dimension, 4, seed=3):
+        expected = minimax_value(board, color)
+        for name, search in MODES.items():
+            check_result(board, color, root_search(search, board, color), expected)
+
+
+def test_symmetry_matches_minimax(evaluation, monkeypatch):
+    monkeypatch.setattr(agent, "symmetry", 64)
+    for board, color in fixed_positions(8, 4, seed=4):
+        expected = minimax_value(board, color)
+        check_result(board, color, root_search(MODES["mtdf"], board, color), expected)
+        result = root_search(MODES["pvs"], board, color)
+        # the mirrored board hits the root entry of that search, with the
+        # move mapped back to the mirrored board
+        mirrored = [list(row) for row in zip(*board)]
+        mirrored_result = agent.probe_cache(agent.new_search_board(mirrored), color, color,
+                                            float("-inf"), float("inf"), DEPTH)[1]
+        check_result(board, color, result, expected)
+        assert mirrored_result is not None
+        check_result(mirrored, color, mirrored_result, expected)
+
+
+def endgame_positions(empties, count, seed):
+    """
+    Return count (board, color) pairs from seeded random 6x6 games, with
+    empties empty squares and color to move.
+    """
+    rng = random.Random(seed)
+    positions = []
+    while len(positions) < count:
+        board, color = start_board(6), 1
+        for ply in range(32 - empties):
+            moves = othello_bitboard.get_possible_moves(board, color)
+            if not moves:
+                break
+            board = othello_bitboard.play_move(board, color, *rng.choice(moves)).to_rows()
+            color = 3 - color
+        else:
+            if othello_bitboard.get_possible_moves(board, color):
+                positions.append((board, color))
+    return positions
+
+
+@pytest.mark.parametrize("empties", [6, 9])
+def test_endgame_matches_full_search(empties, monkeypatch):
+    monkeypatch.setattr(agent, "heuristic", 0)
+    for board, color in endgame_positions(empties, 5, seed=empties):
+        reset_agent()
+        # a depth limit past the last empty square never cuts the search off
+        expected = agent.alphabeta_max_node(agent.new_search_board(board), color, float("-inf"), float("inf"),
+                                            empties + 1, 1, 1)[1]
+        move, value = solve(board, color)
+        assert value == expected
+        reset_agent()
+        after = othello_bitboard.play_move(board, color, *move).to_rows()
+        assert -agent.alphabeta_max_node(agent.new_search_board(after), 3 - color, float("-inf"), float("inf"),
+                                         empties, 1, 1)[1] == expected
+        assert solve(board, color, wld=True)[1] == (expected > 0) - (expected < 0)
+
+
+def winning_positions(count, seed):
+    """
+    Return count (board, color, winning moves) from seeded random 6x6 games:
+    positions where color can end the game at once with more discs, and
+    also has other moves.
+    """
+    rng = random.Random(seed)
+    positions = []
+    while len(positions) < count:
+        board, color = start_board(6), 1
+        while True:
+            moves = othello_bitboard.get_possible_moves(board, color)
+            if not moves:
+                break
+            winning = [move for move in moves if is_win(othello_bitboard.play_move(board, color, *move), color)]
+            if winning and len(winning) < len(moves):
+                positions.append((board, color, winning))
+                break
+            board = othello_bitboard.play_move(board, color, *rng.choice(moves)).to_rows()
+            color = 3 - color
+    return positions
+
+
+def is_win(board, color):
+    # the game is over (the opponent cannot move) and color has more discs
+    return not othello_bitboard.get_possible_moves(board, 3 - color) and agent.compute_utility(board, color) > 0
+
+
+def test_win_beats_heuristic(tmp_path, monkeypatch):
+    # weights ten times the defaults rate ordinary positions far above a small win
+    filename = str(tmp_path / "weights.json")
+    save_weights(filename, 6, {kind: [10 * value for value in table] for kind, table in default_weights(6).items()})
+    monkeypatch.setattr(agent, "heuristic", 1)
+    monkeypatch.setattr(agent, "weights_file", filename)
+    searches = [lambda board, color: agent.alphabeta_max_node(board, color, float("-inf"), float("inf"), 1),
+                lambda board, color: agent.alphabeta_max_node(board, color, float("-inf"), float("inf"), 1, 1, 1, 1),
+                lambda board, color: agent.mtdf_search(board, color, 1, 0, 1, 1)]
+    outrated = 0
+    for board, color, winning in winning_positions(10, seed=8):
+        after = {move: othello_bitboard.play_move(board, color, *move)
+                 for move in othello_bitboard.get_possible_moves(board, color)}
+        best_win = max(agent.compute_utility(after[move], color) for move in winning)
+        outrated += max(agent.compute_heuristic(after[move], color) for move in after if move not in winning) > best_win
+        for search in searches:
+            move, value = root_search(search, board, color)
+            assert move in winning
+            assert agent.disc_value(value, 6) == best_win
+    assert outrated     # the heuristic alone would have played another move
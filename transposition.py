@@ -0,0 +1,203 @@
+"""
+A fixed-size transposition table for the alpha-beta agents.
+
+Entries are keyed by a 63-bit Zobrist hash and stored in flat arrays, so the
+memory used is set once when the table is created and never grows. Each
+entry records the search depth, whether the value is exact or only a
+lower/upper bound, and the best move found. When two positions map to the
+same slot, the deeper search is kept; entries left over from an earlier
+root search are always replaced.
+
+SharedTranspositionTable is the same table kept in shared memory, for
+searches that run in several processes.
+"""
+import struct
+from array import array
+from multiprocessing import shared_memory
+
+EXACT = 0
+LOWER = 1   # value is a lower bound (the search failed high)
+UPPER = 2   # value is an upper bound (the search failed low)
+
+NO_MOVE = -1
+
+# key, value, move, depth, flag, generation
+ENTRY_BYTES = 8 + 8 + 2 + 2 + 1 + 1
+DEFAULT_MEMORY = 16 * 1024 * 1024
+
+# Mixed into the board hash so the same discs are stored separately for each
+# side to move and for each color the values are scored for.
+TO_MOVE_KEYS = (0, 0x2D358DCCAA6C78A5, 0x6A09E667F3BCC908)
+COLOR_KEYS = (0, 0x3C6EF372FE94F82B, 0x510E527FADE682D1)
+
+
+def node_key(zobrist, to_move, color):
+    return zobrist ^ TO_MOVE_KEYS[to_move] ^ COLOR_KEYS[color]
+
+
+def bound_flag(value, alpha, beta):
+    """
+    Return the flag for a value found with the window (alpha, beta).
+    """
+    if value <= alpha:
+        return UPPER
+    if value >= beta:
+        return LOWER
+    return EXACT
+
+
+class TranspositionTable(object):
+
+    def __init__(self, memory = DEFAULT_MEMORY):
+        self.resize(memory)
+
+    def resize(self, memory):
+        """
+        Reallocate the table with as many slots (a power of two) as fit in
+        memory bytes. All entries are dropped.
+        """
+        size = 1
+        while size * 2 * ENTRY_BYTES <= memory:
+            size *= 2
+        self.size = size
+        self.mask = size - 1
+        self.generation = 0
+        self.keys = array("q", [0]) * size
+        self.values = array("d", [0.0]) * size
+        self.moves = array("h", [NO_MOVE]) * size
+        self.depths = array("h", [-1]) * size
+        self.flags = array("b", [EXACT]) * size
+        self.generations = array("B", [0]) * size
+
+    def clear(self):
+        self.resize(self.size * ENTRY_BYTES)
+
+    def new_search(self):
+        """
+        Call once per root search. Entries stored before this call may be
+        overwritten by shallower ones.
+        """
+        self.generation = (self.generation + 1) & 0xFF
+
+    def probe(self, key):
+        """
+        Return (value, depth, flag, move) stored for key, or None. move is a
+        bit index (see othello_bitboard) or NO_MOVE.
+        """
+        slot = key & self.mask
+        if self.keys[slot] != key or self.depths[slot] < 0:
+            return None
+        return (self.values[slot], self.depths[slot], self.flags[slot],
+                self.moves[slot])
+
+    def entries(self, min_depth = 0):
+        """
+        Yield (key, depth, flag, value, move) for every entry searched to
+        at least min_depth.
+        """
+        keys, values, moves, depths, flags = self.keys, self.values, self.moves, self.depths, self.flags
+        for slot in range(self.size):
+            if depths[slot] >= min_depth:
+                yield keys[slot], depths[slot], flags[slot], values[slot], moves[slot]
+
+    def store(self, key, depth, flag, value, move = NO_MOVE):
+        slot = key & self.mask
+        if self.depths[slot] > depth and self.generations[slot] == self.generation:
+            return
+        self.keys[slot] = key
+        self.values[slot] = value
+        self.moves[slot] = move
+        self.depths[slot] = depth
+        self.flags[slot] = flag
+        self.generations[slot] = self.generation
+
+
+class SharedTranspositionTable(object):
+    """
+    A transposition table in a multiprocessing.shared_memory block, so that
+    every search process of one agent probes and stores into the same
+    entries. It has the same probe/store/new_search interface as
+    TranspositionTable.
+
+    Entries are three packed 64-bit words: (key ^ value ^ data, value, data),
+    where value holds the bits of the float value and data packs the move,
+    depth, flag, generation and an in-use bit. There are no locks. An entry that another
+    process was half-way through writing fails the key check and reads as a
+    miss. The block starts with a header holding the shared generation
+    counter and the number of slots.
+    """
+
+    HEADER = struct.Struct("<QQ")       # generation, size
+    ENTRY = struct.Struct("<qqq")
+    VALUE = struct.Struct("<d")
+    BITS = struct.Struct("<q")
+    USED = 1 << 48                      # set in data for every stored entry
+
+    def __init__(self, memory = DEFAULT_MEMORY, name = None):
+        """
+        Create a new table of at most memory bytes, or attach to the existing
+        block called name (memory is then ignored).
+        """
+        if name is None:
+            size = 1
+            while size * 2 * self.ENTRY.size <= memory:
+                size *= 2
+            self.shm = shared_memory.SharedMemory(create=True,
+                                                  size=self.HEADER.size + size * self.ENTRY.size)
+            self.owner = True
+            self.HEADER.pack_into(self.shm.buf, 0, 0, size)
+        else:
+            try:    # Python 3.13+: do not let this process unlink the block
+                self.shm = shared_memory.SharedMemory(name=name, track=False)
+            except TypeError:
+                self.shm = shared_memory.SharedMemory(name=name)
+            self.owner = False
+            size = self.HEADER.unpack_from(self.shm.buf, 0)[1]
+        self.name = self.shm.name
+        self.size = size
+        self.mask = size - 1
+
+    @property
+    def generation(self):
+        return self.HEADER.unpack_from(self.shm.buf, 0)[0]
+
+    def new_search(self):
+        self.HEADER.pack_into(self.shm.buf, 0, (self.generation + 1) & 0xFF, self.size)
+
+    def clear(self):
+        self.shm.buf[self.HEADER.size:] = bytes(self.size * self.ENTRY.size)
+
+    def close(self):
+        self.shm.close()
+        if self.owner:
+            self.shm.unlink()
+
+    def probe(self, key):
+        offset = self.HEADER.size + (key & self.mask) * self.ENTRY.size
+        check, bits, data = self.ENTRY.unpack_from(self.shm.buf, offset)
+        if check ^ bits ^ data != key or not data:
+            return None
+        value = self.VALUE.unpack(self.BITS.pack(bits))[0]
+        move = data & 0xFFFF
+        return (value, (data >> 16) & 0xFFFF, (data >> 32) & 0xFF,
+                NO_MOVE if move == 0xFFFF else move)
+
+    def entries(self, min_depth = 0):
+        end = self.HEADER.size + self.size * self.ENTRY.size
+        for check, bits, data in self.ENTRY.iter_unpack(self.shm.buf[self.HEADER.size:end]):
+            depth = (data >> 16) & 0xFFFF
+            if data and depth >= min_depth:
+                move = data & 0xFFFF
+                yield (check ^ bits ^ data, depth, (data >> 32) & 0xFF, self.VALUE.unpack(self.BITS.pack(bits))[0],
+                       NO_MOVE if move == 0xFFFF else move)
+
+    def store(self, key, depth, flag, value, move = NO_MOVE):
+        offset = self.HEADER.size + (key & self.mask) * self.ENTRY.size
+        old = self.ENTRY.unpack_from(self.shm.buf, offset)[2]
+        generation = self.generation
+        if old and (old >> 16) & 0xFFFF > depth and (old >> 40) & 0xFF == generation:
+            return
+        bits = self.BITS.unpack(self.VALUE.pack(value))[0]
+        data = ((move & 0xFFFF) | (depth << 16) | (flag << 32) | (generation << 40)
+                | self.USED)
+        self.ENTRY.pack_into(self.shm.buf, offset, key ^ bits ^ data, bits, data)